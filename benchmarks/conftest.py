@@ -0,0 +1,46 @@
+"""Common fixtures for the benchmarks in this directory.
+
+The benchmarks need pytest-benchmark (`pip install -e '.[bench]'`), and are
+skipped without it. They do not need RDFox: queries are answered by a
+:py:class:`~probs_runner.stub.StubSPARQLServer`.
+"""
+
+import pytest
+from rdflib import Graph
+
+pytest.importorskip("pytest_benchmark")
+
+from probs_runner import connect_to_endpoint
+from probs_runner.stub import StubSPARQLServer, graph_answerer
+from probs_runner.synthetic import SyntheticDataset
+
+
+# Number of observations in the synthetic data
+NUM_OBSERVATIONS = 5000
+
+
+@pytest.fixture(scope="session")
+def dataset():
+    return SyntheticDataset(NUM_OBSERVATIONS, num_regions=2, num_years=2)
+
+
+@pytest.fixture(scope="session")
+def stub_endpoint(dataset):
+    """PRObsEndpoint connected to a stub server with the synthetic data.
+
+    Responses are cached by the stub server, so after the first round the
+    benchmarks time the Python side of each query rather than rdflib.
+    """
+    graph = Graph()
+    for triple in dataset.triples():
+        graph.add(triple)
+    with StubSPARQLServer(graph_answerer(graph), cache=True) as server:
+        yield connect_to_endpoint(server.url)
+
+
+@pytest.fixture(scope="session")
+def code_index_endpoint(stub_endpoint):
+    """Like `stub_endpoint`, but looking up codes with the code index."""
+    endpoint = connect_to_endpoint(stub_endpoint.server)
+    endpoint.use_code_index = True
+    return endpoint
@@ -0,0 +1,76 @@
+"""Benchmarks of preparing datasources and input files for RDFox."""
+
+import gzip
+import shutil
+
+import pytest
+
+from probs_runner import Datasource
+from probs_runner.runners import _prepare_datasources_arg, _standard_input_files
+from probs_runner.utils import copy_maybe_gzipped
+
+
+NUM_FILES = 1000
+
+
+@pytest.fixture(scope="module")
+def data_files(tmp_path_factory):
+    """Many small data files of the kinds found in datasources."""
+    d = tmp_path_factory.mktemp("data_files")
+    paths = []
+    for i in range(NUM_FILES):
+        ext = [".ttl", ".nt.gz", ".dlog"][i % 3]
+        path = d / f"file{i}{ext}"
+        path.write_text(f"# file {i}\n")
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture(scope="module")
+def large_ntriples(tmp_path_factory, dataset):
+    """The synthetic dataset as plain and gzipped N-Triples."""
+    d = tmp_path_factory.mktemp("ntriples")
+    dataset.write_ntriples(d / "data.nt")
+    with open(d / "data.nt", "rb") as fin, gzip.open(d / "data.nt.gz", "wb") as fout:
+        shutil.copyfileobj(fin, fout)
+    return d / "data.nt", d / "data.nt.gz"
+
+
+@pytest.fixture(scope="module")
+def module_dir(tmp_path_factory):
+    """Directory with scripts for a module and many data files."""
+    d = tmp_path_factory.mktemp("module")
+    (d / "scripts" / "endpoint").mkdir(parents=True)
+    (d / "scripts" / "endpoint" / "master.rdfox").write_text("")
+    (d / "data").mkdir()
+    for i in range(NUM_FILES):
+        (d / "data" / f"data{i}.ttl").write_text(f"# data {i}\n")
+    return d
+
+
+def test_datasource_from_files(benchmark, data_files):
+    ds = benchmark(Datasource.from_files, data_files)
+    assert len(ds.input_files) == NUM_FILES
+
+
+def test_prepare_datasources_arg(benchmark, data_files):
+    datasources = benchmark(_prepare_datasources_arg, data_files)
+    assert len(datasources) == NUM_FILES
+
+
+def test_standard_input_files(benchmark, module_dir):
+    input_files = benchmark(_standard_input_files, [module_dir], "endpoint")
+    assert len(input_files) >= NUM_FILES + 1
+
+
+@pytest.mark.parametrize("compress", ["none", "compress", "decompress"])
+def test_copy_maybe_gzipped(benchmark, tmp_path, large_ntriples, compress):
+    plain, gzipped = large_ntriples
+    source, source_is_compressed, want_target_compressed = {
+        "none": (plain, False, False),
+        "compress": (plain, False, True),
+        "decompress": (gzipped, True, False),
+    }[compress]
+    target = tmp_path / "target"
+    benchmark(copy_maybe_gzipped, source, target, source_is_compressed, want_target_compressed)
+    assert target.stat().st_size > 0
@@ -0,0 +1,96 @@
+"""Benchmarks of converting query results and rendering `inspect` output."""
+
+import io
+from contextlib import redirect_stdout
+
+from probs_runner import PROBS, QUANTITYKIND
+from probs_runner.cli import (
+    _inspect_observations_data,
+    _inspect_observation_graphviz,
+    _inspect_observation_html,
+)
+from probs_runner.synthetic import SYNTHETIC, classification_code
+
+
+OBSERVATION_ARGS = (
+    PROBS.TimePeriod_YearOf2000,
+    SYNTHETIC["Region-0"],
+    QUANTITYKIND.Mass,
+    PROBS.SoldProduction,
+)
+
+
+def test_get_observations(benchmark, stub_endpoint):
+    stub_endpoint.get_observations(*OBSERVATION_ARGS)
+    observations = benchmark(stub_endpoint.get_observations, *OBSERVATION_ARGS)
+    assert observations
+
+
+def test_get_observations_frame(benchmark, stub_endpoint):
+    stub_endpoint.get_observations_frame(*OBSERVATION_ARGS)
+    df = benchmark(stub_endpoint.get_observations_frame, *OBSERVATION_ARGS)
+    assert len(df) > 0
+
+
+CODE_OBSERVATION_ARGS = OBSERVATION_ARGS[:3] + (PROBS.ProcessOutput,)
+
+
+def _code_args(dataset):
+    """Codes of the object and process of an observation matching CODE_OBSERVATION_ARGS."""
+    _, _, _, _, object_, process, _, _ = next(
+        row for row in dataset.rows()
+        if row[1:4] == (2000, "Region-0", "ProcessOutput")
+    )
+    return dict(object_code=classification_code(object_), process_code=process)
+
+
+def test_get_observations_by_code(benchmark, stub_endpoint, dataset):
+    codes = _code_args(dataset)
+    stub_endpoint.get_observations(*CODE_OBSERVATION_ARGS, **codes)
+    observations = benchmark(stub_endpoint.get_observations, *CODE_OBSERVATION_ARGS, **codes)
+    assert observations
+
+
+def test_get_observations_by_code_index(benchmark, code_index_endpoint, dataset):
+    codes = _code_args(dataset)
+    code_index_endpoint.get_observations(*CODE_OBSERVATION_ARGS, **codes)
+    observations = benchmark(code_index_endpoint.get_observations,
+                             *CODE_OBSERVATION_ARGS, **codes)
+    assert observations
+
+
+def test_refresh_code_index(benchmark, code_index_endpoint, dataset):
+    code_index_endpoint.refresh_code_index()
+    benchmark(code_index_endpoint.refresh_code_index)
+    code = classification_code(dataset.objects[0])
+    assert code_index_endpoint.lookup_code("object", code) == [SYNTHETIC[dataset.objects[0]]]
+
+
+def test_inspect_observations_data(benchmark, stub_endpoint, dataset):
+    list(_inspect_observations_data(stub_endpoint))
+    data = benchmark(lambda: list(_inspect_observations_data(stub_endpoint)))
+    assert len(data) == dataset.num_observations
+
+
+def test_inspect_graphviz(benchmark, stub_endpoint):
+    data = list(_inspect_observations_data(stub_endpoint))
+
+    def _render():
+        with redirect_stdout(io.StringIO()) as f:
+            for subject, values, labels in data:
+                _inspect_observation_graphviz(subject, values, labels)
+        return f.getvalue()
+
+    assert benchmark(_render)
+
+
+def test_inspect_html(benchmark, stub_endpoint):
+    data = list(_inspect_observations_data(stub_endpoint))
+
+    def _render():
+        with redirect_stdout(io.StringIO()) as f:
+            for subject, values, labels in data:
+                _inspect_observation_html(subject, values, labels)
+        return f.getvalue()
+
+    assert benchmark(_render)
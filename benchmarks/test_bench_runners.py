@@ -0,0 +1,46 @@
+"""Benchmarks of the orchestration around RDFox, using the stub RDFox.
+
+These time staging the input files, starting the process, and collecting the
+output of each module, rather than anything done by RDFox itself. The stub
+RDFox loads data with rdflib, so the data is kept small.
+"""
+
+import pytest
+
+from probs_runner import probs_convert_data, probs_endpoint
+from probs_runner.stub import write_stub_executable
+from probs_runner.synthetic import SyntheticDataset
+
+
+@pytest.fixture(scope="module")
+def stub_rdfox(tmp_path_factory):
+    """Use the stub RDFox, with empty module scripts; returns the script source dir."""
+    d = tmp_path_factory.mktemp("stub_rdfox")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("PROBS_RDFOX_EXECUTABLE", str(write_stub_executable(d / "bin")))
+        for module in ("data-conversion", "endpoint"):
+            (d / "modules" / "scripts" / module).mkdir(parents=True)
+            (d / "modules" / "scripts" / module / "master.rdfox").write_text("")
+        yield d / "modules"
+
+
+@pytest.fixture(scope="module")
+def observations(tmp_path_factory):
+    path = tmp_path_factory.mktemp("observations") / "observations.nt.gz"
+    SyntheticDataset(200).write_ntriples(path)
+    return path
+
+
+def test_convert_data(benchmark, stub_rdfox, observations, tmp_path):
+    output = tmp_path / "converted.nt.gz"
+    benchmark.pedantic(probs_convert_data, args=([observations], output),
+                       kwargs={"script_source_dir": stub_rdfox}, rounds=3)
+    assert output.stat().st_size > 0
+
+
+def test_endpoint_start_and_query(benchmark, stub_rdfox, observations):
+    def _run():
+        with probs_endpoint([observations], port="auto", script_source_dir=stub_rdfox) as rdfox:
+            return rdfox.query_one_record("SELECT (COUNT(*) AS ?n) WHERE { ?s ?p ?o }")
+
+    assert benchmark.pedantic(_run, rounds=3)["n"] > 0
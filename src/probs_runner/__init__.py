@@ -1,26 +1,76 @@
-from .runners import (
-    probs_convert_ontology,
-    probs_convert_data,
-    probs_validate_data,
-    probs_enhance_data,
-    probs_kbc_hierarchy,
-    probs_endpoint,
-    answer_queries,
-    connect_to_endpoint,
-)
-from .endpoint import PRObsEndpoint, Observation
-from .datasource import Datasource, load_datasource
-from .namespace import PROBS, PROV, QUANTITYKIND, NAMESPACES
+"""Tools to run the PRObs ontology scripts with RDFox.
+
+The names below are imported from their submodules when first used, so that
+importing `probs_runner` (e.g. for the command line) does not have to import
+pandas, rdflib and rdfox_runner straight away.
+"""
+
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .runners import (
+        probs_convert_ontology,
+        probs_convert_data,
+        probs_validate_data,
+        probs_enhance_data,
+        probs_kbc_hierarchy,
+        probs_endpoint,
+        probs_endpoints,
+        answer_queries,
+        connect_to_endpoint,
+    )
+    from .endpoint import PRObsEndpoint, Observation
+    from .cube import ObservationCube
+    from .datasource import Datasource, load_datasource
+    from .namespace import PROBS, PROV, QUANTITYKIND, NAMESPACES
+
+# {name: submodule it is defined in}
+_LAZY_IMPORTS = {
+    "probs_convert_ontology": "runners",
+    "probs_convert_data": "runners",
+    "probs_validate_data": "runners",
+    "probs_enhance_data": "runners",
+    "probs_kbc_hierarchy": "runners",
+    "probs_endpoint": "runners",
+    "probs_endpoints": "runners",
+    "answer_queries": "runners",
+    "connect_to_endpoint": "runners",
+    "PRObsEndpoint": "endpoint",
+    "Observation": "endpoint",
+    "ObservationCube": "cube",
+    "Datasource": "datasource",
+    "load_datasource": "datasource",
+    "PROBS": "namespace",
+    "PROV": "namespace",
+    "QUANTITYKIND": "namespace",
+    "NAMESPACES": "namespace",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        value = getattr(import_module(f".{_LAZY_IMPORTS[name]}", __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_IMPORTS))
+
 
 __all__ = [
     "PRObsEndpoint",
     "Observation",
+    "ObservationCube",
     "probs_convert_ontology",
     "probs_convert_data",
     "probs_validate_data",
     "probs_enhance_data",
     "probs_kbc_hierarchy",
     "probs_endpoint",
+    "probs_endpoints",
     "answer_queries",
     "Datasource",
     "load_datasource",
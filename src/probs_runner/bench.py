@@ -0,0 +1,277 @@
+"""End-to-end benchmarks of the PRObs pipeline stages.
+
+:py:func:`run_benchmarks` generates synthetic data of the given sizes (see
+:py:mod:`probs_runner.synthetic`), and runs each pipeline stage on it a number of times:
+
+- ``convert``: :py:func:`probs_convert_data` on the generated data;
+- ``kbc``: :py:func:`probs_kbc_hierarchy` on the converted data;
+- ``endpoint``: :py:func:`probs_endpoint` on the enhanced data, up to the point
+  where it is answering queries.
+
+Each stage uses the output of the previous stage if that was run, or else the
+generated data directly. For each stage and size the results record the wall
+time of each repetition, the input triples per second (based on the median
+time), the peak memory use of RDFox and the size of the output.
+
+The results are plain JSON-serialisable dicts, so they can be saved and used as
+the baseline for a later run with :py:func:`compare_to_baseline`.
+
+"""
+
+import glob
+import gzip
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from importlib import metadata
+from pathlib import Path
+from statistics import median
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+STAGE_NAMES = ("convert", "kbc", "endpoint")
+
+
+def count_triples(path) -> int:
+    """Count the triples (non-blank lines) in an N-Triples file, maybe gzipped."""
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def peak_rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Peak memory use (MB) of process `pid`, or of the finished child processes.
+
+    For child processes this is the high-water mark of any child so far, so it
+    only increases between stages; see :py:class:`_ChildPeakRSS` for the peak
+    of one stage. Returns None if this is not available on this platform.
+    """
+    if pid is not None:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return None
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def _child_pids() -> Set[int]:
+    """Process IDs of the running children of this process (Linux only)."""
+    pids = set()
+    for path in glob.glob(f"/proc/{os.getpid()}/task/*/children"):
+        try:
+            with open(path) as f:
+                pids.update(int(pid) for pid in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+class _ChildPeakRSS:
+    """Measure the peak memory use of the child processes started in a block.
+
+    On Linux, the children's VmHWM is read every `interval` seconds while they
+    run. The lifetime high-water mark of all children is also checked: if it
+    rises during the block, the new value must come from one of its children,
+    which covers peaks reached just before a child exits. Otherwise (and on
+    other platforms) `peak_mb` is only what was seen by polling, or None.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak_mb: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._before: Optional[float] = None
+
+    def _sample(self):
+        for pid in _child_pids():
+            rss = peak_rss_mb(pid)
+            if rss is not None and (self.peak_mb is None or rss > self.peak_mb):
+                self.peak_mb = rss
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._before = peak_rss_mb()
+        if os.path.isdir(f"/proc/{os.getpid()}/task"):
+            self._thread = threading.Thread(target=self._poll, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._sample()
+        after = peak_rss_mb()
+        if after is not None and self._before is not None and after > self._before:
+            self.peak_mb = after
+
+
+def _stage_convert(input_path: Path, output_dir: Path, script_source_dir):
+    from .runners import probs_convert_data
+    output = output_dir / "probs_original_data.nt.gz"
+    with _ChildPeakRSS() as memory:
+        probs_convert_data([input_path], output, script_source_dir=script_source_dir)
+    return output, memory.peak_mb
+
+
+def _stage_kbc(input_path: Path, output_dir: Path, script_source_dir):
+    from .runners import probs_kbc_hierarchy
+    output = output_dir / "probs_enhanced_data.nt.gz"
+    with _ChildPeakRSS() as memory:
+        probs_kbc_hierarchy([input_path], output, script_source_dir=script_source_dir)
+    return output, memory.peak_mb
+
+
+def _stage_endpoint(input_path: Path, output_dir: Path, script_source_dir):
+    from .runners import probs_endpoint
+    with probs_endpoint([input_path], port="auto", script_source_dir=script_source_dir) as rdfox:
+        rdfox.query_one_record("SELECT (COUNT(*) AS ?n) WHERE { ?s ?p ?o }")
+        pid = rdfox.runner.pid
+        rss = peak_rss_mb(pid) if pid is not None else None
+    return None, rss
+
+
+# Functions to run each stage: (input path, output dir, script_source_dir) ->
+# (output path or None, peak RSS in MB or None)
+STAGES: Dict[str, Callable[..., Tuple[Optional[Path], Optional[float]]]] = {
+    "convert": _stage_convert,
+    "kbc": _stage_kbc,
+    "endpoint": _stage_endpoint,
+}
+
+
+def environment_info() -> Dict[str, str]:
+    """Describe the software and hardware the benchmarks ran on."""
+    try:
+        version = metadata.version("probs_runner")
+    except metadata.PackageNotFoundError:
+        version = "unknown"
+    return {
+        "probs_runner": version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": str(os.cpu_count()),
+    }
+
+
+def run_benchmarks(sizes: Iterable[int],
+                   stages: Iterable[str] = STAGE_NAMES,
+                   repeats: int = 3,
+                   working_dir=None,
+                   script_source_dir=None,
+                   seed: int = 0) -> Dict:
+    """Run the pipeline `stages` on synthetic data of each size.
+
+    :param sizes: numbers of observations to generate
+    :param stages: stages to run, from :py:data:`STAGE_NAMES`
+    :param repeats: number of times to run each stage
+    :param working_dir: directory for generated data and outputs, defaults to
+        a temporary directory
+    :param script_source_dir: Path to copy scripts from
+    :param seed: random seed for the generated data
+
+    :returns: dict with the `environment` (see :py:func:`environment_info`)
+        and a list of `results`, one per stage and size.
+
+    """
+    from .synthetic import SyntheticDataset
+
+    selected = set(stages)
+    unknown = selected - set(STAGE_NAMES)
+    if unknown:
+        raise ValueError("Unknown stages: " + ", ".join(sorted(unknown)))
+    stages = [stage for stage in STAGE_NAMES if stage in selected]
+    if repeats < 1:
+        raise ValueError("repeats must be at least 1")
+
+    results: List[Dict] = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        base_dir = Path(working_dir) if working_dir is not None else Path(tmp_dir)
+        for size in sizes:
+            size_dir = base_dir / f"size-{size}"
+            size_dir.mkdir(parents=True, exist_ok=True)
+            input_path = size_dir / "observations.nt.gz"
+            input_triples = SyntheticDataset(size, seed=seed).write_ntriples(input_path)
+
+            for stage in stages:
+                times = []
+                output, rss = None, None
+                for _ in range(repeats):
+                    output_dir = size_dir / stage
+                    output_dir.mkdir(exist_ok=True)
+                    start = time.perf_counter()
+                    output, rss = STAGES[stage](input_path, output_dir, script_source_dir)
+                    times.append(time.perf_counter() - start)
+
+                median_time = median(times)
+                result = {
+                    "stage": stage,
+                    "size": size,
+                    "input_triples": input_triples,
+                    "wall_time": times,
+                    "median_time": median_time,
+                    "triples_per_second": input_triples / median_time if median_time > 0 else None,
+                    "peak_rss_mb": rss,
+                    "output_bytes": output.stat().st_size if output is not None else None,
+                    "output_triples": count_triples(output) if output is not None else None,
+                }
+                results.append(result)
+
+                # The next stage runs on this stage's output
+                if output is not None:
+                    input_path = output
+                    input_triples = result["output_triples"]
+
+    return {"environment": environment_info(), "results": results}
+
+
+def compare_to_baseline(results: Dict, baseline: Dict,
+                        tolerance: float = 0.1) -> List[Dict]:
+    """Compare benchmark results to a baseline run.
+
+    :param results: from :py:func:`run_benchmarks`
+    :param baseline: earlier results from :py:func:`run_benchmarks`
+    :param tolerance: fraction by which the median time may increase before
+        it counts as a regression
+
+    :returns: list of comparisons for each stage and size in both, with the
+        `baseline_time`, `median_time`, `ratio` and whether it is a
+        `regression`.
+
+    """
+    baseline_times = {
+        (r["stage"], r["size"]): r["median_time"] for r in baseline.get("results", [])
+    }
+    comparisons = []
+    for r in results["results"]:
+        key = (r["stage"], r["size"])
+        if key not in baseline_times:
+            continue
+        ratio = r["median_time"] / baseline_times[key] if baseline_times[key] > 0 else None
+        comparisons.append({
+            "stage": r["stage"],
+            "size": r["size"],
+            "baseline_time": baseline_times[key],
+            "median_time": r["median_time"],
+            "ratio": ratio,
+            "regression": ratio is not None and ratio > 1 + tolerance,
+        })
+    return comparisons
@@ -0,0 +1,225 @@
+"""Persistent on-disk cache of query answers.
+
+An :py:class:`AnswerCache` keeps the answers to SELECT queries in a directory,
+so that they can be reused after an endpoint is restarted with the same data.
+Each answer is keyed on a fingerprint of everything loaded into RDFox (the
+datasource files and scripts, the module scripts and data, and the version of
+probs_runner), the query text and any bindings. If any of these change, the
+old answers are simply not found again, and are eventually evicted.
+
+Files up to :py:data:`CONTENT_HASH_MAX_BYTES` are fingerprinted by their
+contents. Larger files are identified by their path, size and modification
+time instead, to avoid reading them all each time RDFox is started: so if a
+large file is changed without changing its size or modification time (or its
+modification time is restored afterwards), stale answers will be returned.
+Call :py:meth:`AnswerCache.clear` after changing data like that.
+
+Each answer is stored as a NumPy .npz file with one dictionary-encoded column
+per variable, in the same way as :py:class:`~probs_runner.cube.ObservationCube`.
+The total size of the cache is bounded: when it grows beyond `max_bytes`, the
+least recently used answers are deleted. The size is tracked as answers are
+stored, so the directory is only scanned when it may be over the limit.
+
+Use it with :py:func:`probs_endpoint`::
+
+    with probs_endpoint(datasources, answer_cache="~/.cache/probs") as rdfox:
+        ...
+
+"""
+
+import os
+import re
+import logging
+import threading
+from hashlib import sha256
+from importlib import metadata
+from io import StringIO, BytesIO
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Any, Dict, List, Mapping, Optional, Union
+
+import numpy as np
+from rdflib.util import from_n3
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+# Files larger than this are fingerprinted by their size and modification time
+CONTENT_HASH_MAX_BYTES = 16 * 1024 ** 2
+
+_SPACE_PATTERN = re.compile(r"\s+")
+
+
+def _hash_source(h, source):
+    """Add a file, directory or file-like object to the hash `h`."""
+    if isinstance(source, (str, os.PathLike)):
+        source = Path(source)
+    if isinstance(source, StringIO):
+        h.update(source.getvalue().encode("utf-8"))
+    elif isinstance(source, BytesIO):
+        h.update(source.getvalue())
+    elif isinstance(source, Path) and source.is_file():
+        stat = source.stat()
+        if stat.st_size <= CONTENT_HASH_MAX_BYTES:
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(chunk)
+        else:
+            # Large data files are identified by their size and modification
+            # time, rather than reading them all.
+            h.update(f"{source.resolve()}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    elif hasattr(source, "iterdir"):
+        for child in sorted(source.iterdir(), key=lambda p: p.name):
+            h.update(child.name.encode("utf-8") + b"/")
+            _hash_source(h, child)
+    elif hasattr(source, "read_bytes"):
+        h.update(source.read_bytes())
+    else:
+        raise TypeError(f"Cannot fingerprint input {source!r}")
+    h.update(b"\0")
+
+
+def input_fingerprint(input_files: Mapping[str, Any], script: str = "") -> str:
+    """Fingerprint the inputs used to start RDFox.
+
+    :param input_files: dict of {target path: source}, as passed to
+        `RDFoxRunner`, including the module scripts and data.
+    :param script: the RDFox script run at startup
+
+    """
+    try:
+        version = metadata.version("probs_runner")
+    except metadata.PackageNotFoundError:
+        version = "unknown"
+
+    h = sha256()
+    h.update(f"probs_runner {version}\0{script}\0".encode("utf-8"))
+    for target in sorted(input_files):
+        h.update(target.encode("utf-8") + b"\0")
+        _hash_source(h, input_files[target])
+    return h.hexdigest()
+
+
+class AnswerCache:
+    """Size-bounded on-disk cache of query answers.
+
+    :param directory: directory to keep the answers in (created if needed)
+    :param fingerprint: identifies the data being queried, see
+        :py:func:`input_fingerprint`
+    :param max_bytes: maximum total size of the cached answers
+
+    """
+
+    def __init__(self,
+                 directory: Union[os.PathLike, str],
+                 fingerprint: str,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory).expanduser()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fingerprint = fingerprint
+        self.max_bytes = max_bytes
+        # Estimated total size of the answers, or None until evict() scans
+        self._total_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _path(self, query: str, bindings: Optional[Mapping[str, Any]]) -> Path:
+        h = sha256()
+        h.update(self.fingerprint.encode() + b"\0")
+        h.update(_SPACE_PATTERN.sub(" ", query).strip().encode("utf-8") + b"\0")
+        for var, value in sorted((bindings or {}).items()):
+            h.update(f"{var}={value.n3()}\0".encode("utf-8"))
+        return self.directory / f"{h.hexdigest()}.npz"
+
+    def get(self, query: str,
+            bindings: Optional[Mapping[str, Any]] = None) -> Optional[List[Dict[str, Any]]]:
+        """Return the cached rows for `query`, or None if not cached.
+
+        Rows are dicts of rdflib terms, with None for unbound values.
+        """
+        path = self._path(query, bindings)
+        try:
+            with np.load(path) as data:
+                variables = [str(v) for v in data["variables"]]
+                columns = [
+                    [from_n3(str(x)) if x else None for x in data[f"values_{i}"]]
+                    for i in range(len(variables))
+                ]
+                codes = [data[f"codes_{i}"] for i in range(len(variables))]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as err:
+            logger.warning("Ignoring unreadable cached answer %s: %s", path, err)
+            return None
+        # Mark as recently used
+        os.utime(path)
+        num_rows = len(codes[0]) if codes else 0
+        return [
+            {var: column[code[i]] for var, column, code in zip(variables, columns, codes)}
+            for i in range(num_rows)
+        ]
+
+    def put(self, query: str, bindings: Optional[Mapping[str, Any]],
+            rows: List[Dict[str, Any]]):
+        """Store `rows` (dicts of rdflib terms) as the answer to `query`."""
+        variables = list(rows[0]) if rows else []
+        arrays = {"variables": np.array(variables, dtype=str)}
+        for i, var in enumerate(variables):
+            cells = np.array(
+                [row[var].n3() if row[var] is not None else "" for row in rows], dtype=str
+            )
+            values, codes = np.unique(cells, return_inverse=True)
+            arrays[f"values_{i}"] = values
+            arrays[f"codes_{i}"] = codes.astype(np.int32)
+
+        path = self._path(query, bindings)
+        # A unique temporary file, since other threads or processes may be
+        # storing the same answer at the same time
+        with NamedTemporaryFile(dir=path.parent, prefix=path.stem, suffix=".tmp",
+                                delete=False) as f:
+            try:
+                np.savez_compressed(f, **arrays)
+            except BaseException:
+                f.close()
+                os.remove(f.name)
+                raise
+        size = os.path.getsize(f.name)
+        try:
+            size -= path.stat().st_size
+        except FileNotFoundError:
+            pass
+        os.replace(f.name, path)
+
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += size
+            within_limit = self._total_bytes is not None and self._total_bytes <= self.max_bytes
+        if not within_limit:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used answers until within `max_bytes`."""
+        entries = []
+        for path in self.directory.glob("*.npz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            logger.debug("Evicting cached answer %s", path)
+            path.unlink(missing_ok=True)
+            total -= size
+        with self._lock:
+            self._total_bytes = total
+
+    def clear(self):
+        """Delete all cached answers."""
+        for path in self.directory.glob("*.npz"):
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self._total_bytes = 0
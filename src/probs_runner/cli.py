@@ -1,19 +1,118 @@
-"""Command-line tool for probs_runner."""
+"""Command-line tool for probs_runner.
 
+The command line is often run many times in scripts, so this module only
+imports what is needed to parse the arguments. pandas, rdflib and rdfox_runner
+(through :py:mod:`probs_runner.runners`) are imported by the commands that use
+them.
+"""
+
+import io
+import os
 import sys
+import csv
+import json
 import time
+import signal
 import urllib.parse
 import pathlib
 import logging
 import hashlib
+import threading
+from itertools import groupby
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
 import click
-import rdflib
-from rdflib import URIRef
-from rdflib.namespace import RDF, RDFS
 
-from .namespace import PROBS
-from .runners import NAMESPACES, probs_convert_data, probs_convert_ontology, probs_validate_data, probs_kbc_hierarchy, probs_endpoint
 from .datasource import load_datasource
+from .profiling import QueryProfiler
+from .bench import STAGE_NAMES, run_benchmarks, compare_to_baseline
+from .export import (
+    EXPORT_FORMATS, FILE_EXTENSIONS, write_tsv_lines, _import_pyarrow, _replace_when_done
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class PortParamType(click.ParamType):
+    """A port number, or "auto" to choose a free port."""
+
+    name = "port"
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, int) or value == "auto":
+            return value
+        try:
+            return int(value)
+        except ValueError:
+            self.fail(f"{value!r} is not a port number or 'auto'", param, ctx)
+
+
+PORT = PortParamType()
+
+
+# Where `serve` records the running endpoint, for use with --connect
+DEFAULT_STATE_FILE = ".probs-runner-serve.json"
+
+CONNECT_OPTION = click.option(
+    "--connect",
+    help=("Use a running endpoint instead of loading INPUTS: its URL, or a state "
+          f"file written by 'serve' (default {DEFAULT_STATE_FILE})"),
+    metavar="URL",
+    is_flag=False,
+    flag_value=DEFAULT_STATE_FILE,
+)
+
+
+def _write_state(state_file, url, inputs):
+    """Record the endpoint started by `serve` in `state_file`."""
+    state = {
+        "url": url,
+        "pid": os.getpid(),
+        "inputs": [str(p) for p in inputs],
+        "started": datetime.now(timezone.utc).isoformat(),
+    }
+    state_file.write_text(json.dumps(state, indent=2))
+
+
+def _connect_url(connect):
+    """Return the endpoint URL for --connect, reading a state file if needed."""
+    if connect.startswith(("http://", "https://")):
+        return connect.rstrip("/")
+    try:
+        with open(connect) as f:
+            return json.load(f)["url"]
+    except FileNotFoundError:
+        raise click.ClickException(
+            f"No endpoint state file '{connect}': start one with 'probs-runner serve'"
+        )
+    except (ValueError, KeyError):
+        raise click.ClickException(f"Invalid endpoint state file '{connect}'")
+
+
+@contextmanager
+def _endpoint_context(obj, inputs, port, connect):
+    """Start an endpoint for `inputs`, or connect to the one given by --connect."""
+    import requests
+    from .runners import probs_endpoint, connect_to_endpoint
+
+    if connect is None:
+        click.echo("Starting endpoint...", err=True)
+        with probs_endpoint(inputs,
+                            port=port,
+                            script_source_dir=obj["script_source_dir"]) as rdfox:
+            yield rdfox
+        return
+
+    if inputs:
+        raise click.UsageError("Cannot pass both INPUTS and --connect")
+    url = _connect_url(connect)
+    try:
+        rdfox = connect_to_endpoint(url)
+    except requests.ConnectionError:
+        raise click.ClickException(f"Cannot connect to endpoint at {url}")
+    yield rdfox
 
 
 LOG_LEVELS = {
@@ -38,8 +137,22 @@ LOG_LEVELS = {
     type=click.Path(file_okay=False,
                     path_type=pathlib.Path),
 )
+@click.option(
+    "--profile",
+    help=("Profile the command, writing PATH.prof (cProfile) and PATH.collapsed "
+          "(sampled stacks, labelled by whether waiting for RDFox)"),
+    metavar="PATH",
+    type=click.Path(dir_okay=False, path_type=pathlib.Path),
+)
+@click.option(
+    "--profile-interval",
+    help="Seconds between stack samples for --profile, or 0 for only cProfile",
+    type=click.FloatRange(min=0),
+    default=0.005,
+    show_default=True,
+)
 @click.pass_context
-def cli(ctx, verbose, scripts, working_dir):
+def cli(ctx, verbose, scripts, working_dir, profile, profile_interval):
     """Command-line tool for probs-runner"""
 
     if verbose:
@@ -58,6 +171,26 @@ def cli(ctx, verbose, scripts, working_dir):
     ctx.obj['script_source_dir'] = scripts
     ctx.obj['working_dir'] = working_dir
 
+    if profile is not None:
+        # Profile the subcommand, which runs before the context is closed
+        ctx.with_resource(_profiled(profile, profile_interval))
+
+
+@contextmanager
+def _profiled(path, sample_interval):
+    """Profile the block, and write the results to `path`."""
+    from .pyprofile import RunProfiler
+
+    profiler = RunProfiler(sample_interval or None)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        written = profiler.write(path)
+        click.echo(profiler.report(), err=True)
+        click.echo("Profile written to " + ", ".join(str(p) for p in written), err=True)
+
 
 @cli.command()
 @click.argument("inputs", nargs=-1, type=click.Path(exists=True, path_type=pathlib.Path))
@@ -66,6 +199,7 @@ def cli(ctx, verbose, scripts, working_dir):
 @click.pass_obj
 def convert_data(obj, inputs, output, fact_domain):
     "Convert input data into PRObs RDF format."
+    from .runners import probs_convert_data
 
     click.echo(f"Converting {len(inputs)} inputs...", err=True)
 
@@ -84,6 +218,7 @@ def convert_data(obj, inputs, output, fact_domain):
 @click.pass_obj
 def convert_ontology(obj, ontology, output):
     "Convert PRObs ontology to Datalog rules."
+    from .runners import probs_convert_ontology
 
     click.echo(f"Converting ontology...", err=True)
 
@@ -101,6 +236,7 @@ def convert_ontology(obj, ontology, output):
 @click.pass_obj
 def validate_data(obj, inputs, debug_files):
     "Validate converted RDF data."
+    from .runners import probs_validate_data
 
     click.echo(f"Checking {len(inputs)} input{'s' if len(inputs) > 1 else ''}...", err=True)
 
@@ -123,6 +259,7 @@ def validate_data(obj, inputs, debug_files):
 @click.pass_obj
 def kbc_hierarchy(obj, inputs, output):
     "Run enhancement scripts on PRObs RDF data."
+    from .runners import probs_kbc_hierarchy
 
     click.echo(f"Enhancing {len(inputs)} inputs with kbc-hierarchy...", err=True)
 
@@ -145,6 +282,8 @@ ORDER BY ?Observation ?p ?o
 
 def _default_query():
     """Define some useful prefixes and a test query."""
+    from .namespace import NAMESPACES
+
     prefixes = [
         f"PREFIX {p}: <{v}>"
         for p, v in NAMESPACES.items()
@@ -158,8 +297,8 @@ def _default_query():
 @click.option(
     "-p",
     "--port",
-    help="RDFox endpoint port",
-    type=click.INT,
+    help="RDFox endpoint port, or 'auto' to choose a free port",
+    type=PORT,
 )
 @click.option(
     "-q",
@@ -169,15 +308,41 @@ def _default_query():
     type=click.File("r"),
     multiple=True,
 )
+@click.option(
+    "--store",
+    "stores",  # Python argument name
+    help="Load PATH into a separate data store NAME (can be repeated)",
+    metavar="NAME=PATH",
+    multiple=True,
+)
 @click.option(
     "--console/--no-console",
     help="Whether to launch endpoint console",
     default=True,
 )
+@CONNECT_OPTION
 @click.pass_obj
-def endpoint(obj, inputs, port, query_files, console):
-    "Start an RDFox endpoint based on DATA_PATH"
-    click.echo("Starting endpoint...", err=True)
+def endpoint(obj, inputs, port, query_files, stores, console, connect):
+    """Start an RDFox endpoint based on INPUTS.
+
+    With --store, several datasets are loaded into separate data stores of
+    the same endpoint instead. With --connect, open the console of an
+    endpoint which is already running.
+    """
+    from .runners import probs_endpoints
+
+    if inputs and stores:
+        raise click.UsageError("Cannot pass both INPUTS and --store")
+    if stores and connect is not None:
+        raise click.UsageError("Cannot pass both --store and --connect")
+    store_inputs = {}
+    for spec in stores:
+        name, sep, path = spec.partition("=")
+        if not sep or not name or not path:
+            raise click.BadParameter(f"expected NAME=PATH, got '{spec}'", param_hint="--store")
+        if not pathlib.Path(path).exists():
+            raise click.BadParameter(f"path '{path}' does not exist", param_hint="--store")
+        store_inputs.setdefault(name, []).append(pathlib.Path(path))
 
     queries = [f.read() for f in query_files]
     if not queries:
@@ -186,20 +351,197 @@ def endpoint(obj, inputs, port, query_files, console):
 
     script_source_dir = obj["script_source_dir"]
 
+    if store_inputs:
+        click.echo("Starting endpoint...", err=True)
+        context = probs_endpoints(store_inputs,
+                                  port=port,
+                                  script_source_dir=script_source_dir)
+    else:
+        context = _endpoint_context(obj, inputs, port, connect)
+
+    with context as rdfox:
+        endpoints = rdfox if store_inputs else {"default": rdfox}
+        if connect is None:
+            click.echo("Started endpoint", err=True)
+        for i, (name, store) in enumerate(endpoints.items()):
+            url = f"{store.server}/console/{name}?query={query}"
+            if console and i == 0:
+                click.launch(url)
+            click.echo(f"Open {url} in your browser.", err=True)
+        if connect is not None:
+            return
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            click.echo("Stopping endpoint")
+
+
+@cli.command()
+@click.argument("output", nargs=1, type=click.Path(path_type=pathlib.Path))
+@click.option(
+    "-n",
+    "--observations",
+    help="Number of observations",
+    type=click.IntRange(min=0),
+    default=1000,
+    show_default=True,
+)
+@click.option("--seed", help="Random seed", type=int, default=0, show_default=True)
+@click.option(
+    "--format",
+    "output_format",  # Python argument name
+    help="N-Triples file (gzipped if OUTPUT ends in .gz), or a directory with a CSV datasource",
+    type=click.Choice(["nt", "csv"]),
+    default="nt",
+    show_default=True,
+)
+@click.option("--regions", help="Number of regions", type=click.IntRange(min=1), default=50, show_default=True)
+@click.option("--years", help="Number of years", type=click.IntRange(min=1), default=20, show_default=True)
+@click.option("--depth", help="Depth of object/process hierarchies", type=click.IntRange(min=0), default=3, show_default=True)
+@click.option("--branching", help="Children per object/process", type=click.IntRange(min=1), default=4, show_default=True)
+@click.option("--chain-length", help="Length of wasDerivedFrom chains", type=click.IntRange(min=1), default=5, show_default=True)
+def generate_data(output, observations, seed, output_format, regions, years, depth,
+                  branching, chain_length):
+    "Generate a synthetic PRObs dataset for scaling tests."
+    from .synthetic import SyntheticDataset
+
+    dataset = SyntheticDataset(
+        num_observations=observations,
+        seed=seed,
+        num_regions=regions,
+        num_years=years,
+        hierarchy_depth=depth,
+        hierarchy_branching=branching,
+        derived_chain_length=chain_length,
+    )
+    if output_format == "nt":
+        num_triples = dataset.write_ntriples(output)
+        click.echo(f"Wrote {num_triples} triples to {click.format_filename(output)}.", err=True)
+    else:
+        dataset.write_datasource(output)
+        click.echo(f"Wrote datasource to {click.format_filename(output)}.", err=True)
+
+
+@cli.command()
+@click.option(
+    "--size",
+    "sizes",  # Python argument name
+    help="Number of synthetic observations to generate (can be repeated)",
+    type=click.IntRange(min=1),
+    multiple=True,
+    default=[1000],
+    show_default=True,
+)
+@click.option(
+    "--stage",
+    "stages",  # Python argument name
+    help="Pipeline stage to run (can be repeated; default all)",
+    type=click.Choice(STAGE_NAMES),
+    multiple=True,
+)
+@click.option(
+    "-n",
+    "--repeats",
+    help="Number of times to run each stage",
+    type=click.IntRange(min=1),
+    default=3,
+    show_default=True,
+)
+@click.option(
+    "-o",
+    "--output",
+    help="File to write the results to as JSON (default: stdout)",
+    type=click.Path(dir_okay=False, path_type=pathlib.Path),
+)
+@click.option(
+    "--baseline",
+    help="Results of an earlier run to compare with",
+    type=click.Path(exists=True, dir_okay=False, path_type=pathlib.Path),
+)
+@click.option(
+    "--tolerance",
+    help="Fractional slow-down from the baseline which counts as a regression",
+    type=float,
+    default=0.1,
+    show_default=True,
+)
+@click.pass_obj
+def bench(obj, sizes, stages, repeats, output, baseline, tolerance):
+    """Benchmark the pipeline stages on synthetic data.
+
+    Reports wall time, triples per second, peak RSS and output sizes for each
+    stage as JSON. With --baseline, the exit status is 1 if any stage is
+    slower than the baseline by more than --tolerance.
+    """
+    results = run_benchmarks(sizes,
+                             stages=stages or STAGE_NAMES,
+                             repeats=repeats,
+                             working_dir=obj["working_dir"],
+                             script_source_dir=obj["script_source_dir"])
+
+    regressions = []
+    if baseline is not None:
+        comparisons = compare_to_baseline(results, json.loads(baseline.read_text()), tolerance)
+        results["baseline"] = {"path": str(baseline), "comparisons": comparisons}
+        for c in comparisons:
+            click.echo("{stage:>8} {size:>10}: {median_time:8.2f}s vs {baseline_time:8.2f}s"
+                       .format(**c) + ("  REGRESSION" if c["regression"] else ""), err=True)
+        regressions = [c for c in comparisons if c["regression"]]
+
+    text = json.dumps(results, indent=2)
+    if output is not None:
+        output.write_text(text)
+    else:
+        click.echo(text)
+
+    if regressions:
+        sys.exit(1)
+
+
+@cli.command()
+@click.argument("inputs", nargs=-1, type=click.Path(exists=True, path_type=pathlib.Path))
+@click.option(
+    "-p",
+    "--port",
+    help="RDFox endpoint port (default: choose a free port)",
+    type=PORT,
+    default="auto",
+)
+@click.option(
+    "--state-file",
+    help="File to write the endpoint URL and process ID to",
+    type=click.Path(dir_okay=False, path_type=pathlib.Path),
+    default=DEFAULT_STATE_FILE,
+    show_default=True,
+)
+@click.pass_obj
+def serve(obj, inputs, port, state_file):
+    """Start an RDFox endpoint based on INPUTS and keep it running.
+
+    The endpoint URL and process ID are written to the state file, so that
+    other commands can use the endpoint with --connect instead of loading the
+    data again. Stop the server with Ctrl-C or by sending it SIGTERM; the
+    state file is removed when it stops.
+    """
+    from .runners import probs_endpoint
+
+    # Stop cleanly on SIGTERM, as for Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    click.echo("Starting endpoint...", err=True)
     with probs_endpoint(inputs,
                         port=port,
-                        script_source_dir=script_source_dir) as rdfox:
-
-        url = f"{rdfox.server}/console/default?query={query}"
-        click.echo("Started endpoint", err=True)
-        if console:
-            click.launch(url)
-        click.echo(f"Open {url} in your browser.", err=True)
+                        script_source_dir=obj["script_source_dir"]) as rdfox:
+        _write_state(state_file, rdfox.server, inputs)
+        click.echo(f"Serving at {rdfox.server} (state in {state_file})", err=True)
         try:
             while True:
                 time.sleep(1)
         except KeyboardInterrupt:
-            click.echo("Stopping endpoint")
+            click.echo("Stopping endpoint", err=True)
+        finally:
+            state_file.unlink(missing_ok=True)
 
 
 @cli.command()
@@ -207,8 +549,8 @@ def endpoint(obj, inputs, port, query_files, console):
 @click.option(
     "-p",
     "--port",
-    help="RDFox endpoint port",
-    type=click.INT,
+    help="RDFox endpoint port, or 'auto' to choose a free port",
+    type=PORT,
 )
 @click.option(
     "-q",
@@ -219,53 +561,177 @@ def endpoint(obj, inputs, port, query_files, console):
 @click.option(
     "-Q",
     "--query-file",
-    "query_file",  # Python argument name
-    help="File to load query from",
-    type=click.File("r"),
+    "query_files",  # Python argument name
+    help="File to load query from, or directory of .rq files, or - for stdin (can be repeated)",
+    type=click.Path(exists=True, allow_dash=True, path_type=pathlib.Path),
+    multiple=True,
 )
 @click.option(
     "-f",
     "--format",
     "output_format",  # Python argument name
-    help="Output format",
+    help="Output format: an RDFox answer format (e.g. ttl, csv, tsv), or parquet or arrow (needs pyarrow)",
     default="ttl",
 )
+@click.option(
+    "-o",
+    "--output-dir",
+    help="Write the answer to each query to a file in this directory, named after the query file",
+    type=click.Path(file_okay=False, path_type=pathlib.Path),
+)
+@click.option(
+    "-j",
+    "--jobs",
+    help="Number of queries to answer at once (with --output-dir)",
+    type=click.IntRange(min=1),
+    default=1,
+)
+@click.option(
+    "--page-size",
+    help="Fetch results in pages of this many rows (query must end with ORDER BY; tsv or csv format only)",
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--profile-queries",
+    help="Record query timings and print the slowest queries to stderr.",
+    is_flag=True,
+)
+@CONNECT_OPTION
 @click.pass_obj
-def query(obj, inputs, port, query_text, query_file, output_format):
+def query(obj, inputs, port, query_text, query_files, output_format, output_dir, jobs,
+          page_size, profile_queries, connect):
     """Start an RDFox endpoint based on INPUTS and answer SPARQL queries.
 
-    If --query or --query-file is not specified, read query from stdin.
+    If --query or --query-file is not specified, read query from stdin. The
+    answer is written to stdout, unless --output-dir is given; this is needed
+    to answer more than one query.
     """
 
-    if query_text is not None and query_file is not None:
+    if output_format in EXPORT_FORMATS:
+        try:
+            _import_pyarrow()
+        except RuntimeError as err:
+            raise click.ClickException(str(err))
+
+    if page_size is not None and output_format not in ("tsv", "csv"):
+        raise click.UsageError("--page-size can only be used with tsv or csv format")
+
+    if query_text is not None and query_files:
         raise click.UsageError("Cannot pass both --query and --query-file")
     elif query_text is not None:
-        pass
-    elif query_file is not None:
-        query_text = query_file.read()
+        queries = {"query": query_text}
+    elif query_files:
+        queries = _read_query_files(query_files)
     else:
-        query_text = sys.stdin.read()
+        queries = {"query": sys.stdin.read()}
 
-    script_source_dir = obj["script_source_dir"]
-    click.echo("Starting endpoint...", err=True)
-    with probs_endpoint(inputs,
-                        port=port,
-                        script_source_dir=script_source_dir) as rdfox:
+    if len(queries) > 1 and output_dir is None:
+        raise click.UsageError("--output-dir is needed to answer more than one query")
+
+    with _endpoint_context(obj, inputs, port, connect) as rdfox:
+        if profile_queries:
+            rdfox.profiler = QueryProfiler()
+
+        if output_dir is None:
+            [query_text] = queries.values()
+            _write_answer(rdfox, query_text, output_format, page_size, sys.stdout.buffer)
+        else:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            extension = FILE_EXTENSIONS.get(
+                output_format, "." + output_format if output_format.isalnum() else ".out"
+            )
 
+            def _answer_to_file(name):
+                path = output_dir / f"{name}{extension}"
+                # Don't leave a partly-written file if the answer fails
+                with _replace_when_done(path) as tmp_path, open(tmp_path, "wb") as f:
+                    _write_answer(rdfox, queries[name], output_format, page_size, f)
+                click.echo(f"Wrote {click.format_filename(path)}", err=True)
+
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                # Consume the results to raise any errors
+                list(executor.map(_answer_to_file, queries))
+
+        if profile_queries:
+            _print_profile(rdfox.profiler)
+
+
+def _read_query_files(paths):
+    """Read queries from files and directories of .rq files, by name."""
+    queries = {}
+    for path in paths:
+        if str(path) == "-":
+            if "query" in queries:
+                raise click.UsageError("More than one query named 'query'")
+            queries["query"] = sys.stdin.read()
+            continue
+        files = sorted(path.glob("*.rq")) if path.is_dir() else [path]
+        for query_file in files:
+            if query_file.stem in queries:
+                raise click.UsageError(f"More than one query named '{query_file.stem}'")
+            queries[query_file.stem] = query_file.read_text()
+    if not queries:
+        raise click.UsageError("No .rq query files found")
+    return queries
+
+
+def _write_answer(rdfox, query_text, output_format, page_size, out):
+    """Answer `query_text`, writing the result to the binary file `out`."""
+    if page_size is not None:
+        pages = rdfox.iter_pages(query_text, page_size, terms=True, with_variables=True)
+        _write_pages(pages, output_format, out)
+    elif output_format in EXPORT_FORMATS:
+        start = time.perf_counter()
+        response = rdfox.query_raw(query_text, answer_format="tsv")
+        with response:
+            lines = rdfox._response_lines(query_text, response, start)
+            write_tsv_lines(lines, out, output_format)
+    else:
+        start = time.perf_counter()
         response = rdfox.query_raw(query_text, answer_format=output_format)
+        nbytes = 0
         for chunk in response.iter_content(chunk_size=8192):
-            sys.stdout.buffer.write(chunk)
+            out.write(chunk)
+            nbytes += len(chunk)
+        if rdfox.profiler is not None:
+            rdfox.profiler.record(query_text, time.perf_counter() - start,
+                                  first_byte_time=response.elapsed.total_seconds(),
+                                  bytes=nbytes)
+
+
+def _print_profile(profiler):
+    """Print the slowest queries recorded by `profiler` to stderr."""
+    click.echo("\nSlowest queries:", err=True)
+    click.echo(profiler.report(), err=True)
+
+
+def _write_pages(pages, output_format, out):
+    """Write `(variables, rows)` pages of rdflib-term records to the binary
+    file `out` as SPARQL TSV or CSV. The header is taken from the first page,
+    so it is written even if there are no rows."""
+    from .results import tsv_term
+
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text, lineterminator="\r\n")
+    header_written = False
+    try:
+        for variables, page in pages:
+            if not header_written:
+                if output_format == "tsv":
+                    text.write("\t".join(f"?{v}" for v in variables) + "\n")
+                else:
+                    writer.writerow(variables)
+                header_written = True
+            for row in page:
+                if output_format == "tsv":
+                    text.write("\t".join(tsv_term(row[v]) for v in variables) + "\n")
+                else:
+                    writer.writerow([str(row[v]) if row[v] is not None else "" for v in variables])
+    finally:
+        # Leave `out` open for the caller
+        text.detach()
 
 
-INSPECT_QUERY = """
-SELECT ?p ?o ?label
-WHERE {
-    ?s ?p ?o .
-    OPTIONAL { ?o rdfs:label ?label }
-}
-ORDER BY ?p ?o
-"""
-
 INSPECT_OBSERVATIONS_COUNT = """
 SELECT (COUNT(DISTINCT ?Observation) AS ?count) (SUM(COALESCE(?DirectCounter, 0)) AS ?direct)
 WHERE {
@@ -274,8 +740,15 @@ WHERE {
 }
 """
 
-INSPECT_OBSERVATIONS_ID = """
-SELECT ?Observation WHERE { ?Observation a :Observation }
+# All properties of all observations, for the graphviz and html summaries.
+# Ordered by subject so that each observation's rows arrive together.
+INSPECT_OBSERVATIONS_PROPERTIES = """
+SELECT ?s ?p ?o ?label
+WHERE {
+    ?s a :Observation ; ?p ?o .
+    OPTIONAL { ?o rdfs:label ?label }
+}
+ORDER BY ?s
 """
 
 INSPECT_OBSERVATIONS_SUMMARY = """
@@ -289,19 +762,182 @@ ORDER BY ?p
 """
 
 
-def _inspect(rdfox, subject):
-    result = rdfox.query_records(INSPECT_QUERY,
-                                n3=True,
-                                initBindings={"s": URIRef(subject)})
+# Properties of several subjects at once: `{subjects}` is replaced by the
+# subjects' IRIs. Ordered so that each subject's rows arrive together.
+INSPECT_SUBJECTS_QUERY = """
+SELECT ?s ?p ?o ?label
+WHERE {{
+    VALUES ?s {{ {subjects} }}
+    ?s ?p ?o .
+    OPTIONAL {{ ?o rdfs:label ?label }}
+}}
+ORDER BY ?s ?p ?o
+"""
+
+# Values of these properties are likely to be inspected next, so they are
+# fetched in the background (as local names in the PROBS and PROV namespaces)
+INSPECT_NEIGHBOUR_PROPERTIES = {
+    "probs": ("objectDefinedBy", "objectDirectlyDefinedBy", "objectInferredDefinedBy",
+              "processDefinedBy", "processDirectlyDefinedBy", "processInferredDefinedBy",
+              "objectComposedOf", "processComposedOf"),
+    "prov": ("wasDerivedFrom",),
+}
+
+
+class _SubjectCache:
+    """Properties of subjects viewed by `inspect`, fetched at most once.
+
+    After a subject is fetched, the subjects it refers to through
+    :py:data:`INSPECT_NEIGHBOUR_PROPERTIES` are fetched in a background
+    thread, `prefetch_hops` steps out, using one query per step, so that they
+    are ready if they are inspected next.
+
+    Rows are dicts of rdflib terms with keys `p`, `o` and `label`.
+    """
 
-    if not result:
+    def __init__(self, rdfox, prefetch_hops=2, max_batch=500):
+        from rdflib import URIRef
+        from .namespace import PROBS, PROV
+
+        self._URIRef = URIRef
+        self.rdfox = rdfox
+        self.prefetch_hops = prefetch_hops
+        self.max_batch = max_batch
+        self.neighbour_properties = {
+            namespace[name]
+            for namespace, names in ((PROBS, INSPECT_NEIGHBOUR_PROPERTIES["probs"]),
+                                     (PROV, INSPECT_NEIGHBOUR_PROPERTIES["prov"]))
+            for name in names
+        }
+        self._rows = {}
+        # {subject: future set when a background fetch including it finishes}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._submitted = []
+
+    def _fetch(self, subjects):
+        query = INSPECT_SUBJECTS_QUERY.format(subjects=" ".join(s.n3() for s in subjects))
+        rows = {s: [] for s in subjects}
+        for row in self.rdfox.iter_records(query, terms=True):
+            rows[row["s"]].append({"p": row["p"], "o": row["o"], "label": row["label"]})
+        return rows
+
+    def load(self, subjects):
+        """Fetch the properties of those `subjects` not already cached, in one query."""
+        with self._lock:
+            missing = [s for s in dict.fromkeys(subjects)
+                       if s not in self._rows and s not in self._pending]
+        if missing:
+            rows = self._fetch(missing)
+            with self._lock:
+                self._rows.update(rows)
+
+    def get(self, subject):
+        """Return the rows for `subject`, and start prefetching its neighbours."""
+        while True:
+            with self._lock:
+                rows = self._rows.get(subject)
+                pending = self._pending.get(subject)
+            if rows is not None or pending is None:
+                break
+            try:
+                pending.result()
+            except Exception:
+                # Fetched again below, so that the error is raised here
+                break
+        if rows is None:
+            rows = self._fetch([subject])[subject]
+            with self._lock:
+                self._rows[subject] = rows
+        if self.prefetch_hops > 0:
+            self._submitted = [f for f in self._submitted if not f.done()]
+            self._submitted.append(self._executor.submit(self._prefetch, [subject]))
+        return rows
+
+    def _neighbours(self, subjects):
+        """Subjects referred to by the cached `subjects` which are not cached
+        or being fetched. Call with the lock held."""
+        found = {}
+        for s in subjects:
+            for row in self._rows.get(s, ()):
+                o = row["o"]
+                if (row["p"] in self.neighbour_properties
+                        and isinstance(o, self._URIRef)
+                        and o not in self._rows and o not in self._pending):
+                    found[o] = None
+        return list(found)[:self.max_batch]
+
+    def _prefetch(self, subjects):
+        for _ in range(self.prefetch_hops):
+            done = Future()
+            with self._lock:
+                subjects = self._neighbours(subjects)
+                for s in subjects:
+                    self._pending[s] = done
+            if not subjects:
+                break
+            try:
+                rows = self._fetch(subjects)
+            except Exception as err:
+                logger.debug("Prefetching subjects failed: %s", err)
+                with self._lock:
+                    for s in subjects:
+                        del self._pending[s]
+                done.set_exception(err)
+                return
+            # Store the rows before they stop being pending, so that `get`
+            # always finds them in one or the other
+            with self._lock:
+                self._rows.update(rows)
+                for s in subjects:
+                    del self._pending[s]
+            done.set_result(None)
+
+    def close(self):
+        """Stop prefetching."""
+        # Not `shutdown(cancel_futures=True)`, which needs Python 3.9
+        for future in self._submitted:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _expand_subject(rdfox, subject):
+    """IRI for `subject` as typed by the user: a full IRI (maybe in angle
+    brackets) or a prefixed name using the endpoint's namespaces."""
+    from rdflib import URIRef
+
+    subject = subject.strip()
+    if subject.startswith("<") and subject.endswith(">"):
+        return URIRef(subject[1:-1])
+    prefix, sep, local = subject.partition(":")
+    if sep and not local.startswith("//") and prefix in rdfox.namespaces:
+        return URIRef(rdfox.namespaces[prefix] + local)
+    return URIRef(subject)
+
+
+def _inspect(rdfox, subject, cache=None):
+    if cache is None:
+        with _SubjectCache(rdfox, prefetch_hops=0) as cache:
+            return _inspect(rdfox, subject, cache)
+
+    rows = cache.get(_expand_subject(rdfox, subject))
+
+    if not rows:
         print("** Nothing found!")
         return
 
     values = {}
-    for x in result:
-        values.setdefault(x["p"], set())
-        values[x["p"]] |= {x["o"]}
+    for x in rows:
+        p = rdfox._convert_value(x["p"], n3=True)
+        values.setdefault(p, set())
+        values[p] |= {rdfox._convert_value(x["o"], n3=True)}
 
     # if PROBS.Observation in values[RDF.type]:
     #     print("OBSERVATION")
@@ -314,6 +950,13 @@ def _inspect(rdfox, subject):
 
 @cli.command()
 @click.argument("inputs", nargs=-1, type=click.Path(exists=True, path_type=pathlib.Path))
+@click.option(
+    "-p",
+    "--port",
+    help="RDFox endpoint port (default: choose a free port)",
+    type=PORT,
+    default="auto",
+)
 @click.option(
     "-s",
     "--subject",
@@ -329,22 +972,24 @@ def _inspect(rdfox, subject):
     help="Output format (Graphviz or plain text).",
     type=click.Choice(['text', 'graphviz', 'html'], case_sensitive=False)
 )
+@click.option(
+    "--profile-queries",
+    help="Record query timings and print the slowest queries to stderr.",
+    is_flag=True,
+)
 # @click.option(
 #     "-l",
 #     "--load",
 #     type=click.Path(exists=True, path_type=pathlib.Path),
 #     multiple=True,
 # )
+@CONNECT_OPTION
 @click.pass_obj
-def inspect(obj, inputs, subject, summary, format):
+def inspect(obj, inputs, port, subject, summary, format, profile_queries, connect):
     "Load facts and inspect a PRObs subject."
-    click.echo("Loading data...", err=True)
-
-    script_source_dir = obj["script_source_dir"]
-
-    with probs_endpoint(inputs,
-                        port=12130,
-                        script_source_dir=script_source_dir) as rdfox:
+    with _endpoint_context(obj, inputs, port, connect) as rdfox:
+        if profile_queries:
+            rdfox.profiler = QueryProfiler()
 
         if summary and format == "text" or format is None:
             print()
@@ -357,19 +1002,16 @@ def inspect(obj, inputs, subject, summary, format):
                 print("{p:40s} {count:3d}".format(**row))
 
         elif summary and format == "graphviz":
-            result = rdfox.query_records(INSPECT_OBSERVATIONS_ID)
             print("digraph G {")
-            for row in result:
-                _inspect_observation_graphviz(rdfox, row["Observation"])
+            for s, values, labels in _inspect_observations_data(rdfox):
+                _inspect_observation_graphviz(s, values, labels)
             print("}")
 
         elif summary and format == "html":
-            result = rdfox.query_records(INSPECT_OBSERVATIONS_ID)
             print('<html lang="en"><title>PRObs observations</title><body>')
             data = []
             labels = {}
-            for row in result:
-                s, d, l = _inspect_observation_data(rdfox, row["Observation"])
+            for s, d, l in _inspect_observations_data(rdfox):
                 data.append((s, d))
                 labels.update(l)
             data = sorted(
@@ -384,41 +1026,27 @@ def inspect(obj, inputs, subject, summary, format):
                                tuple(sorted(d[1].get("probs:measurement", []))))
             )
             for s, d in data:
-                _inspect_observation_html(rdfox, s, d, labels)
+                _inspect_observation_html(s, d, labels)
 
         elif subject:
-            for s in subject:
-                _inspect(rdfox, s)
+            with _SubjectCache(rdfox, prefetch_hops=0) as cache:
+                cache.load([_expand_subject(rdfox, s) for s in subject])
+                for s in subject:
+                    _inspect(rdfox, s, cache)
 
         else:
-            while True:
-                subject = input("Subject> ")
-                if not subject:
-                    break
-                _inspect(rdfox, subject)
+            with _SubjectCache(rdfox) as cache:
+                while True:
+                    subject = input("Subject> ")
+                    if not subject:
+                        break
+                    _inspect(rdfox, subject, cache)
 
+        if profile_queries:
+            _print_profile(rdfox.profiler)
 
-def _inspect_observation_graphviz(rdfox, subject):
-    result = rdfox.query_records(INSPECT_QUERY,
-                                 n3=True,
-                                 initBindings={"s": URIRef(subject)})
-
-    if not result:
-        return
-
-    if subject.startswith(PROBS):
-        subject = "probs:" + subject[len(PROBS):]
-    else:
-        subject = f"<{subject}>"
-
-    values = {}
-    labels = {}
-    for x in result:
-        values.setdefault(x["p"], set())
-        values[x["p"]] |= {x["o"]}
-        if x["label"] is not None:
-            labels[x["o"]] = x["label"]
 
+def _inspect_observation_graphviz(subject, values, labels):
     # print("  # Labels")
     # for k, v in labels.items():
     #     print(f'  "{k}" [label="{v}"];')
@@ -494,31 +1122,35 @@ def _inspect_observation_graphviz(rdfox, subject):
                 print(f'  "{subject}" -> "{v}" [{attrs}label="{p}"]')
 
 
-def _inspect_observation_data(rdfox, subject):
-    result = rdfox.query_records(INSPECT_QUERY,
-                                 n3=True,
-                                 initBindings={"s": URIRef(subject)})
+def _inspect_observations_data(rdfox):
+    """Yield (subject, values, labels) for every observation.
 
-    if not result:
-        raise ValueError()
+    All observations are fetched by one streamed query, rather than one query
+    per observation.
+    """
+    from .namespace import PROBS
 
-    if subject.startswith(PROBS):
-        subject = "probs:" + subject[len(PROBS):]
-    else:
-        subject = f"<{subject}>"
+    rows = rdfox.iter_records(INSPECT_OBSERVATIONS_PROPERTIES, terms=True)
+    for subject, group in groupby(rows, key=lambda x: x["s"]):
+        if subject.startswith(PROBS):
+            subject = "probs:" + subject[len(PROBS):]
+        else:
+            subject = f"<{subject}>"
 
-    values = {}
-    labels = {}
-    for x in result:
-        values.setdefault(x["p"], set())
-        values[x["p"]] |= {x["o"]}
-        if x["label"] is not None:
-            labels[x["o"]] = x["label"]
+        values = {}
+        labels = {}
+        for x in group:
+            p = rdfox._convert_value(x["p"], n3=True)
+            o = rdfox._convert_value(x["o"], n3=True)
+            values.setdefault(p, set())
+            values[p] |= {o}
+            if x["label"] is not None:
+                labels[o] = rdfox._convert_value(x["label"], n3=True)
 
-    return subject, values, labels
+        yield subject, values, labels
 
 
-def _inspect_observation_html(rdfox, subject, values, labels):
+def _inspect_observation_html(subject, values, labels):
     label_values = [
         "probs:hasRegion",
         "probs:hasTime",
@@ -0,0 +1,184 @@
+"""In-memory cube of observations for fast local lookups.
+
+An :py:class:`ObservationCube` holds every observation from an endpoint in
+compact columns: each dimension (time, region, etc.) is stored as an array of
+integer codes into a table of URIs, and the measurements as a float64 array.
+For each dimension there is also an inverted index from code to rows, so that
+:py:meth:`ObservationCube.get_observations` can answer the same lookups as
+:py:meth:`PRObsEndpoint.get_observations` without a round trip to RDFox.
+
+Create one with :py:meth:`PRObsEndpoint.load_cube`, and keep it with
+:py:meth:`ObservationCube.save` and :py:meth:`ObservationCube.load`.
+
+"""
+
+import os
+from typing import Dict, List, Mapping, Optional, Union
+
+import numpy as np
+import pandas as pd
+from rdflib import URIRef
+
+from .endpoint import Observation
+
+
+DIMENSIONS = ("obs", "time", "region", "metric", "role", "object", "process", "bound")
+
+
+def _as_categorical(values) -> pd.Categorical:
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.array if isinstance(values, pd.Series) else values
+    # e.g. a column with no values at all is decoded as numeric
+    return pd.Categorical([None if pd.isna(v) else str(v) for v in values])
+
+
+class ObservationCube:
+    """Columnar store of observations with an inverted index per dimension.
+
+    :param categories: dict of {dimension: array of URI strings}
+    :param codes: dict of {dimension: array of codes into `categories`, or -1
+        where there is no value}
+    :param measurement: array of measurements (NaN where there is no value)
+    :param code_index: dict of {"object"/"process": {code: [URI strings]}},
+        for lookups by classification code.
+
+    """
+
+    def __init__(self,
+                 categories: Mapping[str, np.ndarray],
+                 codes: Mapping[str, np.ndarray],
+                 measurement: np.ndarray,
+                 code_index: Optional[Mapping[str, Mapping[str, List[str]]]] = None):
+        self.categories = {dim: np.asarray(categories[dim], dtype=str) for dim in DIMENSIONS}
+        self.codes = {dim: np.asarray(codes[dim], dtype=np.int32) for dim in DIMENSIONS}
+        self.measurement = np.asarray(measurement, dtype=np.float64)
+        self.code_index = {
+            kind: dict((code_index or {}).get(kind, {})) for kind in ("object", "process")
+        }
+
+        self._lookup = {
+            dim: {uri: i for i, uri in enumerate(self.categories[dim])}
+            for dim in DIMENSIONS
+        }
+
+        # Inverted index: the rows with code `c` in dimension `dim` are
+        # `order[offsets[c + 1]:offsets[c + 2]]` (shifted by one so that
+        # missing values, -1, come first).
+        self._index = {}
+        for dim in DIMENSIONS[1:]:
+            codes_dim = self.codes[dim]
+            order = np.argsort(codes_dim, kind="stable").astype(np.int64)
+            counts = np.bincount(codes_dim + 1, minlength=len(self.categories[dim]) + 1)
+            offsets = np.concatenate([[0], np.cumsum(counts)])
+            self._index[dim] = (order, offsets)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame,
+                   code_index: Optional[Mapping[str, Mapping[str, List[str]]]] = None):
+        """Create from a DataFrame with a column for each dimension and `measurement`."""
+        categories = {}
+        codes = {}
+        for dim in DIMENSIONS:
+            values = _as_categorical(df[dim])
+            categories[dim] = np.array(values.categories, dtype=str)
+            codes[dim] = values.codes
+        measurement = pd.to_numeric(df["measurement"], errors="coerce").to_numpy(dtype=np.float64)
+        return cls(categories, codes, measurement, code_index)
+
+    def __len__(self):
+        return len(self.measurement)
+
+    def save(self, path: Union[os.PathLike, str]):
+        """Save the cube to `path` (a NumPy .npz file)."""
+        arrays = {"measurement": self.measurement}
+        for dim in DIMENSIONS:
+            arrays[f"categories_{dim}"] = self.categories[dim]
+            arrays[f"codes_{dim}"] = self.codes[dim]
+        for kind, index in self.code_index.items():
+            pairs = [(code, uri) for code, uris in index.items() for uri in uris]
+            arrays[f"code_index_{kind}"] = np.array(pairs, dtype=str).reshape(-1, 2)
+        with open(path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, path: Union[os.PathLike, str]) -> "ObservationCube":
+        """Load a cube saved by :py:meth:`save`."""
+        with np.load(path) as data:
+            categories = {dim: data[f"categories_{dim}"] for dim in DIMENSIONS}
+            codes = {dim: data[f"codes_{dim}"] for dim in DIMENSIONS}
+            code_index: Dict[str, Dict[str, List[str]]] = {}
+            for kind in ("object", "process"):
+                code_index[kind] = {}
+                for code, uri in data[f"code_index_{kind}"]:
+                    code_index[kind].setdefault(str(code), []).append(str(uri))
+            return cls(categories, codes, data["measurement"], code_index)
+
+    def _rows(self, dim: str, uris: List[str]) -> np.ndarray:
+        """Rows with any of `uris` in dimension `dim`."""
+        order, offsets = self._index[dim]
+        rows = []
+        for uri in uris:
+            code = self._lookup[dim].get(str(uri))
+            if code is not None:
+                rows.append(order[offsets[code + 1]:offsets[code + 2]])
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(rows)) if len(rows) > 1 else np.sort(rows[0])
+
+    def get_observations(self,
+                         time: URIRef,
+                         region: URIRef,
+                         metric: URIRef,
+                         role: URIRef,
+                         object_: Optional[URIRef] = None,
+                         process: Optional[URIRef] = None,
+                         object_code: Optional[str] = None,
+                         process_code: Optional[str] = None) -> List[Observation]:
+        """Look up observations matching the given dimensions.
+
+        The arguments and results are the same as
+        :py:meth:`PRObsEndpoint.get_observations`.
+
+        """
+        selections = [
+            ("time", [time]),
+            ("region", [region]),
+            ("metric", [metric]),
+            ("role", [role]),
+        ]
+        if object_ is not None:
+            selections.append(("object", [object_]))
+        elif object_code is not None:
+            selections.append(("object", self.code_index["object"].get(object_code, [])))
+        if process is not None:
+            selections.append(("process", [process]))
+        elif process_code is not None:
+            selections.append(("process", self.code_index["process"].get(process_code, [])))
+
+        # Intersect the smallest sets of rows first
+        row_sets = sorted((self._rows(dim, uris) for dim, uris in selections), key=len)
+        rows = row_sets[0]
+        for other in row_sets[1:]:
+            if len(rows) == 0:
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+
+        def _uri(dim, row):
+            code = self.codes[dim][row]
+            return URIRef(self.categories[dim][code]) if code >= 0 else None
+
+        return_process = process is not None or process_code is not None
+        return [
+            Observation(
+                uri=_uri("obs", row),
+                time=time,
+                region=region,
+                metric=metric,
+                role=role,
+                object_=_uri("object", row),
+                process=_uri("process", row) if return_process else None,
+                measurement=float(self.measurement[row]),
+                bound=_uri("bound", row),
+            )
+            for row in rows
+        ]
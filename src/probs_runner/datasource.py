@@ -7,14 +7,25 @@ The data can in general include:
 
 Each Datasource object bundles a set of these three data types together.
 
+Datasources can also be made from data generated in Python, with
+:py:meth:`Datasource.from_triples`, :py:meth:`Datasource.from_graph` and
+:py:meth:`Datasource.from_dataframe`. These write the data to a temporary file
+as it is generated, so that large datasets are never held in memory. The file
+is deleted by :py:meth:`Datasource.close` (or at the end of a `with` block),
+or else when the datasource is garbage collected.
+
 """
 
 import os
+import gzip
+import weakref
 from dataclasses import dataclass, field
 from hashlib import md5
 from pathlib import Path
 from io import StringIO
-from typing import Union, Optional, IO, List
+from itertools import islice
+from tempfile import NamedTemporaryFile
+from typing import Union, Optional, IO, Iterable, List, Tuple
 
 import logging
 _logger = logging.getLogger(__name__)
@@ -23,6 +34,66 @@ _logger = logging.getLogger(__name__)
 FileSpec = Union[os.PathLike, str, IO]
 FileSpecs = Union[List[FileSpec], FileSpec]
 
+# Number of DataFrame rows written to CSV at a time
+DATAFRAME_CHUNK_SIZE = 100_000
+
+# Number of triples serialised to N-Triples at a time
+TRIPLES_BATCH_SIZE = 10_000
+
+
+class _HashingWriter:
+    """Text file wrapper which writes UTF-8 to a binary file, keeping the md5
+    hash of what has been written."""
+
+    def __init__(self, f):
+        self._f = f
+        self.hash = md5()
+
+    def write(self, text: str) -> int:
+        data = text.encode("utf-8")
+        self.hash.update(data)
+        self._f.write(data)
+        return len(text)
+
+
+def _write_temporary_file(suffix: str, compress: bool, write) -> Tuple[Path, str]:
+    """Call `write` with a file to write text to, which is saved in a temporary
+    file (gzipped if `compress`).
+
+    :returns: the path to the temporary file, and the md5 hash of the
+        (uncompressed) text written.
+    """
+    if compress:
+        suffix += ".gz"
+    with NamedTemporaryFile(suffix=suffix, delete=False) as raw:
+        try:
+            if compress:
+                with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+                    writer = _HashingWriter(f)
+                    write(writer)
+            else:
+                writer = _HashingWriter(raw)
+                write(writer)
+        except BaseException:
+            raw.close()
+            os.remove(raw.name)
+            raise
+    return Path(raw.name), writer.hash.hexdigest()
+
+
+def _remove_when_collected(datasource: "Datasource", path: Path):
+    """Delete the temporary file `path` when `datasource` is garbage collected,
+    or closed."""
+    datasource._remove_temporary_file = weakref.finalize(datasource, _remove_quietly, path)
+
+
+def _remove_quietly(path: Path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
 @dataclass
 class Datasource:
     """Represent a set of inputs to RDFox.
@@ -41,6 +112,22 @@ class Datasource:
     load_data_script: str = ""
     load_rules_script: str = ""
 
+    def close(self):
+        """Delete the temporary file made by :py:meth:`from_triples`,
+        :py:meth:`from_graph` or :py:meth:`from_dataframe`, if any.
+
+        The datasource cannot be loaded afterwards.
+        """
+        remove = getattr(self, "_remove_temporary_file", None)
+        if remove is not None:
+            remove()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
     @classmethod
     def from_facts(cls, facts: str):
         """Create a datasource from explicit list of facts."""
@@ -51,6 +138,83 @@ class Datasource:
         import_statement = f"import {hash}.ttl\n"
         return cls(input_files, import_statement)
 
+    @classmethod
+    def from_triples(cls, triples: Iterable[Tuple], compress: bool = False):
+        """Create a datasource from an iterable of rdflib `(s, p, o)` triples.
+
+        The triples are written as N-Triples to a temporary file as they are
+        read from `triples`, so this can be used with a generator of more data
+        than fits in memory. The file is named by the hash of its contents,
+        and gzipped if `compress` is True. It is deleted by :py:meth:`close`, or
+        when the datasource is garbage collected.
+
+        """
+        from rdflib import Graph
+
+        def _write(f):
+            # Serialise through rdflib a batch at a time, since term.n3() is
+            # not always valid N-Triples (e.g. for multi-line strings)
+            iterator = iter(triples)
+            while True:
+                batch = Graph()
+                for triple in islice(iterator, TRIPLES_BATCH_SIZE):
+                    batch.add(triple)
+                if not batch:
+                    break
+                f.write(batch.serialize(format="nt"))
+
+        path, hash = _write_temporary_file(".nt", compress, _write)
+        filename = f"{hash}.nt.gz" if compress else f"{hash}.nt"
+        datasource = cls.from_files({filename: path})
+        _remove_when_collected(datasource, path)
+        return datasource
+
+    @classmethod
+    def from_graph(cls, graph, compress: bool = False):
+        """Create a datasource from the triples in an rdflib Graph.
+
+        See :py:meth:`from_triples`.
+        """
+        return cls.from_triples(graph, compress=compress)
+
+    @classmethod
+    def from_dataframe(cls,
+                       df,
+                       load_data_script: FileSpecs,
+                       load_rules_script: Optional[FileSpecs] = None,
+                       filename: str = "data.csv",
+                       index: bool = False):
+        """Create a datasource from a pandas DataFrame.
+
+        The DataFrame is written as CSV to a temporary file, a chunk of rows at
+        a time, and copied to `$(dir.datasource){filename}` for the
+        `load_data_script` to load, in a subdirectory named by the hash of its
+        contents. It is deleted by :py:meth:`close`, or when the datasource is
+        garbage collected.
+
+        `load_data_script` and `load_rules_script` are as for
+        :py:meth:`from_files`. The `index` is written as the first column if
+        `index` is True.
+
+        """
+        def _write(f):
+            for start in range(0, max(len(df), 1), DATAFRAME_CHUNK_SIZE):
+                df.iloc[start:start + DATAFRAME_CHUNK_SIZE].to_csv(
+                    f, header=(start == 0), index=index
+                )
+
+        path, hash = _write_temporary_file(".csv", False, _write)
+        try:
+            datasource = cls.from_files({filename: path},
+                                        load_data_script,
+                                        load_rules_script,
+                                        data_subdir=hash)
+        except Exception:
+            _remove_quietly(path)
+            raise
+        _remove_when_collected(datasource, path)
+        return datasource
+
     @classmethod
     def from_files(cls,
                    input_files: Union[dict, list],
@@ -2,13 +2,33 @@
 
 """
 
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional, List
+from io import StringIO
+from itertools import product, islice, chain
+from textwrap import indent
+from time import perf_counter
+from typing import Optional, List, Dict, Mapping, Iterable, Iterator, Any, Tuple, TYPE_CHECKING
 
-from rdflib import URIRef
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from rdflib import URIRef, Literal
+from rdflib.util import from_n3
 from rdfox_runner import RDFoxEndpoint
+from rdfox_runner.rdfox_endpoint import ParsingError, assert_reponse_ok
 
 from .namespace import PROBS
+from .results import decode_tsv_columns
+from .pagination import split_ordered_query, page_query, check_key_types
+from .profiling import QueryProfiler
+from .cache import AnswerCache, input_fingerprint
+
+if TYPE_CHECKING:
+    from .cube import ObservationCube
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -26,9 +46,150 @@ class Observation:
     bound: URIRef = PROBS.ExactBound
 
 
+# Extra patterns added to `query_obs_template` depending on whether the object
+# and process are given by URI ("uri"), by classification code ("code") or not
+# at all (None). The first item is added to the `?obs` triple patterns, the
+# second after them. All values are passed in as bindings, so that the query
+# text is the same for every call with the same variant. Codes are compared
+# with the string value of the label, ignoring any language tag or datatype;
+# this is done by joining on a BIND rather than with a FILTER, since the
+# bindings are appended as a VALUES clause after the WHERE clause, so they
+# are not in scope inside it.
+_OBS_OBJECT_PATTERNS = {
+    "uri": (":objectDefinedBy ?object ;", ""),
+    "code": (
+        ":objectDefinedBy ?object ;",
+        """
+            ?object :hasClassificationCode ?object_code_uri .
+            ?object_code_uri rdfs:label ?object_code_label .
+            BIND(STR(?object_code_label) AS ?object_code)""",
+    ),
+    None: ("", """
+            OPTIONAL { ?obs :objectDefinedBy ?object . }"""),
+}
+
+_OBS_PROCESS_PATTERNS = {
+    "uri": (":processDefinedBy ?process ;", ""),
+    "code": (
+        ":processDefinedBy ?process ;",
+        """
+            ?process rdfs:label ?process_code_label .
+            BIND(STR(?process_code_label) AS ?process_code)""",
+    ),
+    None: ("", """
+            OPTIONAL { ?obs :processDefinedBy ?process . }"""),
+}
+
+
+# Observation dimensions which can be used by `aggregate_observations`
+OBSERVATION_DIMENSIONS = {
+    "time": PROBS.hasTime,
+    "region": PROBS.hasRegion,
+    "metric": PROBS.hasMetric,
+    "role": PROBS.hasRole,
+    "object": PROBS.objectDefinedBy,
+    "process": PROBS.processDefinedBy,
+}
+
+AGGREGATES = {"sum", "avg", "min", "max", "count"}
+
+
+def _build_obs_queries(template):
+    """Build the `get_observations` query for every object/process variant."""
+    queries = {}
+    for object_variant, (object1, object2) in _OBS_OBJECT_PATTERNS.items():
+        for process_variant, (process1, process2) in _OBS_PROCESS_PATTERNS.items():
+            queries[object_variant, process_variant] = template % (
+                object1 + "\n                 " + process1,
+                object2 + process2,
+            )
+    return queries
+
+
+def _with_bindings(query: str, bindings: Optional[Mapping[str, Any]]) -> str:
+    """Append `bindings` to `query` as a VALUES clause, like rdflib does."""
+    if not bindings:
+        return query
+    return query + "\nVALUES ( %s )\n{ ( %s ) }\n" % (
+        " ".join("?" + str(k) for k in bindings),
+        " ".join(v.n3() for v in bindings.values()),
+    )
+
+
+def _parse_tsv_rows(lines: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """Parse SPARQL TSV results line by line into dicts of rdflib terms.
+
+    Unbound values are returned as None.
+    """
+    lines = iter(lines)
+    header = next(lines, None)
+    if header is None:
+        return
+    variables = [v.lstrip("?") for v in header.decode("utf-8").split("\t")]
+    for line in lines:
+        cells = line.decode("utf-8").split("\t")
+        yield {
+            var: (from_n3(cell) if cell else None)
+            for var, cell in zip(variables, cells)
+        }
+
+
 class PRObsEndpoint(RDFoxEndpoint):
     """Subclass of RDFoxEndpoint with additional query functions.
 
+    :param namespaces: dict of RDFlib namespaces to bind
+    :param use_code_index: if True, `object_code` and `process_code` in
+        :py:meth:`get_observations` are looked up in an index of codes to URIs
+        which is built by one query on first use, instead of being matched
+        within every observation query. Call :py:meth:`refresh_code_index`
+        if the data changes.
+    :param max_connections: number of keep-alive connections to RDFox to
+        keep open, for use by :py:meth:`query_raw` and :py:meth:`query_many`.
+    :param datastore: name of the RDFox data store to query.
+    :param profile_queries: if True, record timings for every query in
+        :py:attr:`profiler`; see :py:meth:`stats`. Profiling can also be
+        enabled later by setting :py:attr:`profiler` to a
+        :py:class:`~probs_runner.profiling.QueryProfiler`.
+    :param cache: :py:class:`~probs_runner.cache.AnswerCache` to answer
+        :py:meth:`query_records` and :py:meth:`query_many` from, if the same
+        query has been answered before on the same data. Usually set by
+        :py:func:`probs_endpoint`.
+
+    """
+
+    # Bulk queries for the classification code index: these match the same
+    # codes as the "code" variants of `query_obs_template`.
+    query_object_codes = """
+        SELECT DISTINCT ?code ?uri
+        WHERE {
+            ?uri :hasClassificationCode ?code_uri .
+            ?code_uri rdfs:label ?code .
+        }
+    """
+
+    query_process_codes = """
+        SELECT DISTINCT ?code ?uri
+        WHERE {
+            { SELECT DISTINCT ?uri WHERE { ?obs :processDefinedBy ?uri } }
+            ?uri rdfs:label ?code .
+        }
+    """
+
+    # Bulk query for `load_cube`: the same rows as `query_obs_template` with
+    # no object or process given, for all values of the other dimensions.
+    query_all_observations = """
+        SELECT ?obs ?time ?region ?metric ?role ?object ?process ?bound ?measurement
+        WHERE {
+            ?obs a :Observation ;
+                 :hasTime ?time ;
+                 :hasRegion ?region ;
+                 :hasMetric ?metric ;
+                 :hasRole ?role ;
+                 :hasBound ?bound .
+            OPTIONAL { ?obs :objectDefinedBy ?object . }
+            OPTIONAL { ?obs :processDefinedBy ?process . }
+            OPTIONAL { ?obs :measurement ?measurement . }
+        }
     """
 
     query_obs_template = """
@@ -46,6 +207,420 @@ class PRObsEndpoint(RDFoxEndpoint):
         }
     """
 
+    # Fixed query text for each (object variant, process variant)
+    obs_queries = _build_obs_queries(query_obs_template)
+
+    def __init__(self,
+                 namespaces: Optional[Mapping] = None,
+                 use_code_index: bool = False,
+                 max_connections: int = 10,
+                 datastore: str = "default",
+                 profile_queries: bool = False,
+                 cache: Optional[AnswerCache] = None):
+        super().__init__(namespaces)
+        self.datastore = datastore
+        self.profiler: Optional[QueryProfiler] = QueryProfiler() if profile_queries else None
+        self.cache = cache
+        # Set by `probs_endpoint` to allow updating the data
+        self.runner = None
+        self.use_code_index = use_code_index
+        self._code_index: Optional[Dict[str, Dict[str, List[URIRef]]]] = None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def connect(self, url: str):
+        """Connect to RDFox at given base URL, discarding any code index.
+
+        The SPARQL endpoint is at `{url}/datastores/{datastore}/sparql`.
+
+        """
+        self.server = url
+        sparql_url = f"{url}/datastores/{self.datastore}/sparql"
+        self.graph.open((sparql_url, sparql_url))
+        self.rdfox_version = self.server_info()["version"]
+        self._code_index = None
+
+    def facts(self, format="text/turtle") -> str:
+        """Fetch all facts from this endpoint's data store.
+
+        :param format: format for results send in Accept header.
+
+        """
+        if self.server is None:
+            raise RuntimeError("Need to connect to server first")
+        fact_domain = (
+            "all" if self.rdfox_version and self.rdfox_version.major >= 7
+            else "IDB"
+        )
+        response = self.session.get(
+            f"{self.server}/datastores/{self.datastore}/content",
+            params={"fact-domain": fact_domain},
+            headers={"accept": format},
+        )
+        assert_reponse_ok(response, "Failed to retrieve facts.")
+        return response.text
+
+    def add_triples(self, triples):
+        """Add triples to this endpoint's data store."""
+        if self.server is None:
+            raise RuntimeError("Need to connect to server first")
+        triples = ["%s %s %s ." % (s.n3(), p.n3(), o.n3()) for s, p, o in triples]
+        response = self.session.patch(
+            f"{self.server}/datastores/{self.datastore}/content",
+            params={"operation": "add-content"},
+            data="\n".join(triples).encode("utf-8"),
+        )
+        response.raise_for_status()
+        return response
+
+    def add_datasources(self, datasources, timeout: Optional[float] = None):
+        """Load more datasources into the running endpoint.
+
+        The datasources' files are copied into the RDFox working directory
+        and their `load_data_script` and `load_rules_script` are run in one
+        transaction, so RDFox updates the reasoning results incrementally
+        instead of starting again. Queries continue to be answered while the
+        update runs.
+
+        Only available for endpoints started by :py:func:`probs_endpoint` or
+        :py:func:`probs_endpoints`.
+
+        :param datasources: as for :py:func:`probs_endpoint`
+        :param timeout: seconds to wait for the update to finish
+        :raises RuntimeError: if RDFox reports an error
+
+        """
+        self._update_datasources(datasources, remove=False, timeout=timeout)
+
+    def remove_datasources(self, datasources, timeout: Optional[float] = None):
+        """Remove datasources previously loaded into the running endpoint.
+
+        This runs the datasources' scripts with every `import` command changed
+        to `import -`, removing the facts and rules they imported. Other
+        commands, such as registering data sources, are not undone. See
+        :py:meth:`add_datasources`.
+
+        """
+        self._update_datasources(datasources, remove=True, timeout=timeout)
+
+    def _update_datasources(self, datasources, remove, timeout):
+        if self.runner is None:
+            raise RuntimeError("Datasources can only be updated for an endpoint "
+                               "started by probs_endpoint")
+        staged = self.runner.update_datasources(self.datastore, datasources,
+                                                remove=remove, timeout=timeout)
+        self._code_index = None
+        if self.cache is not None:
+            # The data has changed, so earlier answers no longer apply
+            self.cache.fingerprint = input_fingerprint(
+                {"previous": StringIO(self.cache.fingerprint), **staged}
+            )
+
+    def refresh_code_index(self):
+        """Rebuild the index of object and process codes to URIs."""
+        index: Dict[str, Dict[str, List[URIRef]]] = {}
+        for kind, query in (("object", self.query_object_codes),
+                            ("process", self.query_process_codes)):
+            index[kind] = {}
+            for row in self.query_records(query):
+                index[kind].setdefault(str(row["code"]), []).append(row["uri"])
+        self._code_index = index
+
+    def lookup_code(self, kind: str, code: str) -> List[URIRef]:
+        """Return the URIs with classification code `code`.
+
+        :param kind: "object" or "process"
+        :param code: the code label to look up
+
+        """
+        if self._code_index is None:
+            self.refresh_code_index()
+        assert self._code_index is not None
+        return self._code_index[kind].get(code, [])
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return query timing statistics for each query template.
+
+        See :py:meth:`probs_runner.profiling.QueryProfiler.stats`.
+
+        :raises RuntimeError: if profiling is not enabled
+        """
+        if self.profiler is None:
+            raise RuntimeError("Query profiling is not enabled")
+        return self.profiler.stats()
+
+    def query(self, query_object, *args, **kwargs):
+        """Query the SPARQL endpoint, recording the time taken if profiling.
+
+        Only the wall time and number of rows are recorded, since rdflib
+        does not expose the response.
+        """
+        if self.profiler is None:
+            return super().query(query_object, *args, **kwargs)
+        start = perf_counter()
+        result = super().query(query_object, *args, **kwargs)
+        self.profiler.record(str(query_object), perf_counter() - start, rows=len(result))
+        return result
+
+    def _response_lines(self, query, response, start) -> Iterator[bytes]:
+        """Iterate over the lines of `response`, recording them if profiling.
+
+        :param start: `perf_counter()` value before the query was sent
+        """
+        lines = response.iter_lines()
+        if self.profiler is None:
+            return lines
+        return self._profiled_lines(query, response, lines, start)
+
+    def _profiled_lines(self, query, response, lines, start):
+        assert self.profiler is not None
+        rows = -1  # not counting the header
+        nbytes = 0
+        try:
+            for line in lines:
+                rows += 1
+                nbytes += len(line) + 1
+                yield line
+        finally:
+            # `elapsed` is the time until the response headers were received
+            elapsed = getattr(response, "elapsed", None)
+            self.profiler.record(
+                query,
+                perf_counter() - start,
+                first_byte_time=elapsed.total_seconds() if elapsed is not None else None,
+                rows=max(rows, 0),
+                bytes=nbytes,
+            )
+
+    def query_records(self, query_object, n3=False, *args, **kwargs) -> List[Dict[str, Any]]:
+        """Query the SPARQL endpoint, returning a list of dicts.
+
+        If :py:attr:`cache` is set, the answer is taken from the cache when
+        possible, and stored in it otherwise.
+
+        :param n3: whether to return results in N3 notation, defaults to False.
+
+        """
+        if self.cache is None or args or set(kwargs) - {"initBindings"}:
+            return super().query_records(query_object, n3, *args, **kwargs)
+
+        def _fetch():
+            res = self.query(query_object, **kwargs)
+            return [{str(c): value for c, value in zip(res.vars, row)} for row in res]
+
+        rows = self._cached_rows(query_object, kwargs.get("initBindings"), _fetch)
+        return [{k: self._convert_value(v, n3) for k, v in row.items()} for row in rows]
+
+    def _cached_rows(self, query, bindings, fetch) -> List[Dict[str, Any]]:
+        """Return rows of rdflib terms from the cache, or from `fetch()`."""
+        assert self.cache is not None
+        rows = self.cache.get(query, bindings)
+        if rows is None:
+            rows = fetch()
+            self.cache.put(query, bindings, rows)
+        return rows
+
+    def query_raw(self, query, answer_format=None, idle_timeout=None):
+        """Query the RDFox SPARQL endpoint directly.
+
+        Unlike `query`, the result is the raw response from RDFox, not an
+        `rdflib` Result object. Requests reuse the connections in
+        `self.session`.
+
+        :param idle_timeout: seconds to wait for the server to accept the
+            connection or to send more of the response, defaults to no
+            timeout. This is passed to `requests`: it is not a limit on the
+            time taken by the whole query, which may take longer as long as
+            the server keeps sending data.
+
+        :raises: ParsingError
+        """
+        query_prefixes = "\n".join([
+            f"PREFIX {k}: <{v}>"
+            for k, v in self.namespaces.items()
+        ])
+
+        headers = {}
+        if answer_format is not None:
+            headers["Accept"] = self._response_mime_types.get(answer_format, answer_format)
+
+        res = self.session.get(
+            url=f"{self.server}/datastores/{self.datastore}/sparql",
+            headers=headers,
+            params={"query": query_prefixes + query},
+            stream=True,
+            timeout=idle_timeout,
+        )
+
+        # Handle parsing errors specially
+        if res.status_code == 400:
+            msg = res.text
+            logger.error("Query error: %s", res)
+            logger.error(indent(msg, "    "))
+            if "ParsingException" in msg:
+                logger.error("Query:")
+                for i, line in enumerate(query.splitlines()):
+                    logger.error(f"Line {i+1}: {line}")
+                raise ParsingError(query=query, message=msg)
+
+        res.raise_for_status()
+        return res
+
+    def query_many(self, queries: Iterable[str], max_workers: Optional[int] = None,
+                   idle_timeout: Optional[float] = None,
+                   n3: bool = False) -> List[List[Dict[str, Any]]]:
+        """Answer several queries concurrently.
+
+        :param queries: query strings
+        :param max_workers: number of queries to run at once, defaults to
+            the `ThreadPoolExecutor` default.
+        :param idle_timeout: see :py:meth:`query_raw`.
+        :param n3: whether to return results in N3 notation, defaults to False.
+
+        :returns: list of results in the same order as `queries`; each result
+            is a list of dicts as from :py:meth:`query_records`.
+
+        """
+        def _answer(query):
+            if self.cache is None:
+                return list(self.iter_records(query, n3=n3, idle_timeout=idle_timeout))
+            rows = self._cached_rows(query, None, lambda: list(
+                self.iter_records(query, terms=True, idle_timeout=idle_timeout)
+            ))
+            return [{k: self._convert_value(v, n3) for k, v in row.items()} for row in rows]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_answer, queries))
+
+    def iter_records(self, query_object: str, batch_size: Optional[int] = None,
+                     n3: bool = False, terms: bool = False,
+                     idle_timeout: Optional[float] = None) -> Iterator:
+        """Query the SPARQL endpoint, yielding records as they are received.
+
+        Unlike :py:meth:`query_records`, the response is parsed incrementally
+        as it is streamed from RDFox, so the whole result is never held in
+        memory.
+
+        :param query_object: query string
+        :param batch_size: if given, yield lists of up to `batch_size` records
+            instead of individual records.
+        :param n3: whether to return results in N3 notation, defaults to False.
+        :param terms: if True, return rdflib terms without converting them.
+        :param idle_timeout: see :py:meth:`query_raw`.
+
+        """
+        start = perf_counter()
+        response = self.query_raw(query_object, answer_format="tsv",
+                                  idle_timeout=idle_timeout)
+        with response:
+            lines = self._response_lines(query_object, response, start)
+            records = _parse_tsv_rows(lines)
+            if not terms:
+                records = (
+                    {k: self._convert_value(v, n3) for k, v in row.items()}
+                    for row in records
+                )
+            if batch_size is None:
+                yield from records
+            else:
+                while True:
+                    batch = list(islice(records, batch_size))
+                    if not batch:
+                        break
+                    yield batch
+
+    def iter_pages(self, query_object: str, page_size: int,
+                   n3: bool = False, terms: bool = False,
+                   idle_timeout: Optional[float] = None,
+                   with_variables: bool = False) -> Iterator:
+        """Answer an ordered query in pages, yielding a list of records per page.
+
+        The query is rewritten to fetch one page at a time using keyset
+        pagination (see :py:mod:`probs_runner.pagination`), so very large
+        results do not have to be produced in a single response. The next page
+        is fetched in the background while the current one is being consumed.
+
+        :param query_object: query string, which must end with ORDER BY
+            variables that identify each row uniquely.
+        :param page_size: number of rows per page
+        :param n3: whether to return results in N3 notation, defaults to False.
+        :param terms: if True, return rdflib terms without converting them.
+        :param idle_timeout: see :py:meth:`query_raw`.
+        :param with_variables: if True, yield `(variables, records)` tuples
+            instead, starting with the first page even if it is empty, so that
+            the query's variables are always known.
+        :raises ValueError: if rows are ordered on literals of different
+            datatypes, which would make the pages unreliable (see
+            :py:func:`probs_runner.pagination.check_key_types`).
+
+        """
+        for variables, rows in self._iter_term_pages(query_object, page_size, idle_timeout):
+            if not terms:
+                rows = [
+                    {k: self._convert_value(v, n3) for k, v in row.items()}
+                    for row in rows
+                ]
+            if with_variables:
+                yield variables, rows
+            elif rows:
+                yield rows
+
+    def _iter_term_pages(self, query_object: str, page_size: int,
+                         idle_timeout: Optional[float] = None
+                         ) -> Iterator[Tuple[List[str], List[Dict[str, Any]]]]:
+        """Yield `(variables, rows)` for each page of :py:meth:`iter_pages`,
+        with rows of rdflib terms. The first page is always yielded, even if
+        it is empty, so that the variables are known."""
+        prologue, body, keys = split_ordered_query(query_object)
+
+        def _fetch(query):
+            start = perf_counter()
+            response = self.query_raw(query, answer_format="tsv", idle_timeout=idle_timeout)
+            with response:
+                lines = self._response_lines(query, response, start)
+                header = next(lines, b"")
+                variables = [v.lstrip("?") for v in header.decode("utf-8").split("\t")]
+                return variables, list(_parse_tsv_rows(chain([header], lines)))
+
+        last_row = None
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(_fetch, page_query(prologue, body, keys, page_size))
+            while future is not None:
+                variables, rows = future.result()
+                check_key_types(keys, rows, last_row)
+                last_row = rows[-1] if rows else None
+                if len(rows) < page_size:
+                    future = None
+                else:
+                    future = executor.submit(_fetch, page_query(
+                        prologue, body, keys, page_size, variables, rows[-1]
+                    ))
+                yield variables, rows
+
+    def query_frame(self, query_object: str,
+                    initBindings: Optional[Mapping[str, Any]] = None,
+                    idle_timeout: Optional[float] = None) -> pd.DataFrame:
+        """Query the SPARQL endpoint, decoding the results into typed columns.
+
+        This is much faster than :py:meth:`query_records` or
+        :py:meth:`query_dataframe` for large results, since values are not
+        converted one at a time through rdflib: numeric columns become float64
+        arrays and IRI columns become categoricals of the IRI strings. See
+        :py:mod:`probs_runner.results`.
+
+        :param query_object: query string
+        :param initBindings: values for query variables
+        :param idle_timeout: see :py:meth:`query_raw`.
+
+        """
+        query = _with_bindings(query_object, initBindings)
+        start = perf_counter()
+        response = self.query_raw(query, answer_format="tsv", idle_timeout=idle_timeout)
+        with response:
+            return decode_tsv_columns(self._response_lines(query, response, start))
+
     def get_observations(self,
                          time: URIRef,
                          region: URIRef,
@@ -64,68 +639,190 @@ class PRObsEndpoint(RDFoxEndpoint):
         :param role: value for `:hasRole`
         :param object\\_: value for `:objectDefinedBy` (optional, depending on `role`)
         :param process: value for `:processDefinedBy` (optional, depending on `role`)
+        :param object_code: label of the classification code of the object,
+            used if `object_` is not given
+        :param process_code: label of the process, used if `process` is not given
 
         :returns: list of :py:class:`Observation` objects
 
         """
+        def _convert_measurement(value):
+            return float(value) if value is not None else float("nan")
+        results = []
+        for query, bindings in self._observation_queries(
+                time, region, metric, role, object_, process, object_code, process_code):
+            for row in self.query_records(query, initBindings=bindings):
+                if object == None and object_code == None:
+                    return_object = None
+                else:
+                    return_object = row["object"]
+                if process == None and process_code == None:
+                    return_process = None
+                else:
+                    return_process = row["process"]
+                results.append(
+                    Observation(
+                        uri=row["obs"],
+                        time=time,
+                        region=region,
+                        metric=metric,
+                        role=role,
+                        object_=return_object,
+                        process=return_process,
+                        measurement=_convert_measurement(row["measurement"]),
+                        bound=row["bound"],
+                    )
+                )
+        return results
+
+    def get_observations_frame(self,
+                               time: URIRef,
+                               region: URIRef,
+                               metric: URIRef,
+                               role: URIRef,
+                               object_: Optional[URIRef] = None,
+                               process: Optional[URIRef] = None,
+                               object_code: Optional[str] = None,
+                               process_code: Optional[str] = None) -> pd.DataFrame:
+        """Query for observations matching the given dimensions, as a DataFrame.
+
+        The arguments are the same as :py:meth:`get_observations`. The result
+        is decoded by :py:meth:`query_frame`, so `measurement` is a float64
+        column and the URI columns are categorical.
+
+        :returns: DataFrame with columns `obs`, `measurement`, `bound`,
+            `process` and `object`.
+
+        """
+        frames = [
+            self.query_frame(query, initBindings=bindings)
+            for query, bindings in self._observation_queries(
+                time, region, metric, role, object_, process, object_code, process_code)
+        ]
+        if not frames:
+            return pd.DataFrame(columns=["obs", "measurement", "bound", "process", "object"])
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames, ignore_index=True)
+
+    def load_cube(self, idle_timeout: Optional[float] = None) -> "ObservationCube":
+        """Fetch all observations into an :py:class:`ObservationCube`.
+
+        The cube answers :py:meth:`get_observations` lookups locally, which
+        is much faster for repeated lookups on data that is not changing.
+
+        :param idle_timeout: see :py:meth:`query_raw`.
+
+        """
+        from .cube import ObservationCube
+
+        frame = self.query_frame(self.query_all_observations, idle_timeout=idle_timeout)
+        self.refresh_code_index()
+        assert self._code_index is not None
+        code_index = {
+            kind: {code: [str(uri) for uri in uris] for code, uris in index.items()}
+            for kind, index in self._code_index.items()
+        }
+        return ObservationCube.from_frame(frame, code_index)
+
+    def aggregate_observations(self,
+                               group_by: Iterable[str] = (),
+                               filters: Optional[Mapping[str, Any]] = None,
+                               agg: str = "sum",
+                               idle_timeout: Optional[float] = None) -> pd.DataFrame:
+        """Aggregate observation measurements on the server.
+
+        Only the aggregated values are returned, rather than every observation.
+        Note that if the data has been enhanced, an observation may be defined
+        by several objects or processes at different levels of a hierarchy,
+        and is counted in each of their groups.
+
+        :param group_by: dimensions to group by, from
+            `OBSERVATION_DIMENSIONS` (`time`, `region`, `metric`,
+            `role`, `object` or `process`).
+        :param filters: dict of {dimension: value} to restrict the
+            observations; the value can be a URI or a list of URIs.
+        :param agg: aggregate function: "sum", "avg", "min", "max" or "count".
+        :param idle_timeout: see :py:meth:`query_raw`.
+
+        :returns: DataFrame with a column for each of `group_by` and a `value`
+            column with the aggregated measurements.
+
+        """
+        group_by = list(group_by)
+        filters = dict(filters or {})
+        if agg.lower() not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate '{agg}', expected one of: "
+                             + ", ".join(sorted(AGGREGATES)))
+        unknown = (set(group_by) | set(filters)) - set(OBSERVATION_DIMENSIONS)
+        if unknown:
+            raise ValueError("Unknown observation dimensions: " + ", ".join(sorted(unknown)))
+
+        patterns = []
+        for dim in OBSERVATION_DIMENSIONS:
+            if dim not in group_by and dim not in filters:
+                continue
+            if dim in filters:
+                values = filters[dim]
+                if isinstance(values, (str, URIRef)):
+                    values = [values]
+                patterns.append("VALUES ?%s { %s }" % (
+                    dim, " ".join(URIRef(v).n3() for v in values)
+                ))
+            patterns.append(f"?obs {OBSERVATION_DIMENSIONS[dim].n3()} ?{dim} .")
+
+        variables = " ".join(f"?{dim}" for dim in group_by)
+        query = f"""
+        SELECT {variables} ({agg.upper()}(?measurement) AS ?value)
+        WHERE {{
+            ?obs a :Observation ;
+                 :measurement ?measurement .
+            {(chr(10) + "            ").join(patterns)}
+        }}
+        """
+        if group_by:
+            query += f"GROUP BY {variables}\n        ORDER BY {variables}\n"
+        return self.query_frame(query, idle_timeout=idle_timeout)
+
+    def _observation_queries(self, time, region, metric, role,
+                             object_, process, object_code, process_code
+                             ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Return the (query, bindings) pairs to run for `get_observations`."""
+        if self.use_code_index and (object_code is not None or process_code is not None):
+            objects = (
+                self.lookup_code("object", object_code)
+                if object_ is None and object_code is not None else [object_]
+            )
+            processes = (
+                self.lookup_code("process", process_code)
+                if process is None and process_code is not None else [process]
+            )
+            queries = []
+            for object_uri, process_uri in product(objects, processes):
+                queries += self._observation_queries(time, region, metric, role,
+                                                     object_uri, process_uri, None, None)
+            return queries
+
         bindings = {
             "time": time,
             "region": region,
             "metric": metric,
             "role": role
         }
-        other1 = ""
-        other2 = ""
         if object_ is not None:
-            other1 += ":objectDefinedBy ?object ;"
+            object_variant = "uri"
             bindings["object"] = object_
         elif object_code is not None:
-            other1 += """
-                 :objectDefinedBy ?object;""" 
-            other2 += """
-            ?object :hasClassificationCode ?code .
-            ?code rdfs:label ?cname .
-            FILTER (STR(?cname) = %s)""" % ("\"" + object_code + "\"")
+            object_variant = "code"
+            bindings["object_code"] = Literal(object_code)
         else:
-            other2 += """
-            OPTIONAL { ?obs :objectDefinedBy ?object . }"""
+            object_variant = None
         if process is not None:
-            other1 += """
-                 :processDefinedBy ?process ;"""
+            process_variant = "uri"
             bindings["process"] = process
         elif process_code is not None:
-            other1 += """
-                 :processDefinedBy ?process ;"""
-            other2 += """
-            ?process rdfs:label ?code .
-            FILTER (STR(?code) = %s)""" % ("\"" + process_code + "\"")
+            process_variant = "code"
+            bindings["process_code"] = Literal(process_code)
         else:
-            other2 += """
-            OPTIONAL { ?obs :processDefinedBy ?process . }"""
-        query = self.query_obs_template % (other1, other2)
-        def _convert_measurement(value):
-            return float(value) if value is not None else float("nan")
-        results = []
-        for row in self.query_records(query, initBindings=bindings):
-            if object == None and object_code == None:
-                return_object = None
-            else:
-                return_object = row["object"]
-            if process == None and process_code == None:
-                return_process = None
-            else:
-                return_process = row["process"]
-            results.append(
-                Observation(
-                    uri=row["obs"],
-                    time=time,
-                    region=region,
-                    metric=metric,
-                    role=role,
-                    object_=return_object,
-                    process=return_process,
-                    measurement=_convert_measurement(row["measurement"]),
-                    bound=row["bound"],
-                )
-            )
-        return results 
+            process_variant = None
+        return [(self.obs_queries[object_variant, process_variant], bindings)]
@@ -0,0 +1,228 @@
+"""Streaming export of query results to Parquet or Arrow IPC files.
+
+Results are read from RDFox as SPARQL TSV and written in row groups, so that
+only one row group is held in memory at a time. Each column gets a fixed type,
+chosen from the first row group in the same way as
+:py:mod:`probs_runner.results`:
+
+- columns of numeric literals are written as float64 (null where unbound);
+- columns of IRIs are written as dictionary-encoded strings;
+- anything else is written as strings of the literal values.
+
+If a later row group does not match the type chosen for a column (for example
+an optional variable which is only sometimes an IRI), the column is widened to
+strings and the file is written again from the start. For this, the TSV lines
+are also kept in a temporary file on disk as they are read.
+
+The file is written to a temporary path first, and only moved into place (or
+copied to the file object given) once the whole result has been written, so a
+failed export does not leave a truncated file behind.
+
+This needs the optional dependency `pyarrow`. This module can be imported
+without it (or pandas), for the command line to check the format names.
+
+"""
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from itertools import chain, islice
+from uuid import uuid4
+from typing import Dict, Iterable, Iterator, List, Union
+
+
+EXPORT_FORMATS = ("parquet", "arrow")
+
+DEFAULT_ROW_GROUP_SIZE = 100_000
+
+FILE_EXTENSIONS = {
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("pyarrow is needed to export Parquet or Arrow files: "
+                           "install it with `pip install pyarrow`") from None
+    return pyarrow
+
+
+def _decode_strings(cells: List[str]) -> List:
+    from rdflib.util import from_n3
+    return [str(from_n3(cell)) if cell else None for cell in cells]
+
+
+def _decoder(kind: str):
+    from .results import _decode_numeric, _decode_iris
+    return {
+        "numeric": _decode_numeric,
+        "iri": _decode_iris,
+        "string": _decode_strings,
+    }[kind]
+
+
+def column_kind(cells: List[str]) -> str:
+    """Choose how to store a column, from its first cells."""
+    if not any(cells):
+        return "string"
+    for kind in ("numeric", "iri"):
+        try:
+            _decoder(kind)(cells)
+            return kind
+        except ValueError:
+            pass
+    return "string"
+
+
+class _ColumnKindError(ValueError):
+    def __init__(self, variable, kind):
+        super().__init__(f"Values of ?{variable} do not all have the same type as in "
+                         f"the first row group ({kind})")
+        self.variable = variable
+
+
+def decode_batch(variables: List[str], columns: List[List[str]],
+                 kinds: Dict[str, str]) -> Dict[str, object]:
+    """Decode a batch of TSV cells with the given column kinds.
+
+    :raises ValueError: if a column does not match its kind
+    """
+    result = {}
+    for var, cells in zip(variables, columns):
+        try:
+            result[var] = _decoder(kinds[var])(cells)
+        except ValueError:
+            raise _ColumnKindError(var, kinds[var]) from None
+    return result
+
+
+def _arrow_table(pa, decoded, kinds, schema=None):
+    arrays = []
+    for var, values in decoded.items():
+        if kinds[var] == "numeric":
+            arrays.append(pa.array(values, type=pa.float64(), from_pandas=True))
+        elif kinds[var] == "iri":
+            arrays.append(pa.DictionaryArray.from_arrays(
+                pa.array(values.codes, type=pa.int32(), mask=values.codes < 0),
+                pa.array(list(values.categories), type=pa.string()),
+            ))
+        else:
+            arrays.append(pa.array(values, type=pa.string()))
+    if schema is not None:
+        return pa.Table.from_arrays(arrays, schema=schema)
+    return pa.Table.from_arrays(arrays, names=list(decoded))
+
+
+@contextmanager
+def _replace_when_done(path):
+    """Yield a temporary path next to `path`, which is moved to `path` if the
+    block succeeds, or deleted if it fails."""
+    path = os.fspath(path)
+    tmp_path = f"{path}.{uuid4().hex}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_tsv_lines(lines: Iterable[bytes],
+                    sink: Union[os.PathLike, str, object],
+                    format: str = "parquet",
+                    row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> int:
+    """Write SPARQL TSV results to a Parquet or Arrow IPC stream file.
+
+    :param lines: lines of the response, including the header line.
+    :param sink: path or binary file object to write to
+    :param format: "parquet" or "arrow"
+    :param row_group_size: number of rows to decode and write at a time
+
+    :returns: the number of rows written
+
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{format}', expected one of: "
+                         + ", ".join(EXPORT_FORMATS))
+    pa = _import_pyarrow()
+    if isinstance(sink, (os.PathLike, str)):
+        with _replace_when_done(sink) as tmp_path:
+            return _write_tsv_lines(pa, lines, tmp_path, format, row_group_size)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_path = os.path.join(tmp_dir, "export")
+        num_rows = _write_tsv_lines(pa, lines, tmp_path, format, row_group_size)
+        with open(tmp_path, "rb") as f:
+            shutil.copyfileobj(f, sink)
+    return num_rows
+
+
+def _spooled(lines: Iterator[bytes], spool) -> Iterator[bytes]:
+    """Yield `lines`, also appending them to the file `spool`."""
+    for line in lines:
+        spool.write(line + b"\n")
+        yield line
+
+
+def _write_tsv_lines(pa, lines, path, format, row_group_size) -> int:
+    lines = iter(lines)
+    header = next(lines, None)
+    variables = [v.lstrip("?") for v in header.decode("utf-8").split("\t")] if header else []
+
+    kinds: Dict[str, str] = {}
+    with tempfile.TemporaryFile() as spool:
+        while True:
+            # Read back the lines from any earlier attempt before the rest
+            spool.seek(0)
+            replayed = (line.rstrip(b"\n") for line in iter(spool.readline, b""))
+            try:
+                return _write_batches(pa, variables, chain(replayed, _spooled(lines, spool)),
+                                      path, format, row_group_size, kinds)
+            except _ColumnKindError as err:
+                kinds[err.variable] = "string"
+
+
+def _write_batches(pa, variables, lines, path, format, row_group_size, kinds) -> int:
+    """Write `lines` to `path` in row groups. Column kinds are chosen from the
+    first row group unless already given in `kinds`, which is updated."""
+    schema = None
+    writer = None
+    num_rows = 0
+    try:
+        while True:
+            batch = list(islice(lines, row_group_size))
+            if writer is not None and not batch:
+                break
+            columns: List[List[str]] = [[] for _ in variables]
+            for line in batch:
+                cells = line.decode("utf-8").split("\t")
+                for column, cell in zip(columns, cells):
+                    column.append(cell)
+
+            if writer is None:
+                for var, cells in zip(variables, columns):
+                    kinds.setdefault(var, column_kind(cells))
+                table = _arrow_table(pa, decode_batch(variables, columns, kinds), kinds)
+                schema = table.schema
+                if format == "parquet":
+                    writer = pa.parquet.ParquetWriter(path, table.schema)
+                else:
+                    writer = pa.ipc.new_stream(path, table.schema)
+            else:
+                table = _arrow_table(pa, decode_batch(variables, columns, kinds), kinds,
+                                     schema=schema)
+            if batch:
+                writer.write_table(table)
+                num_rows += len(batch)
+            if len(batch) < row_group_size:
+                break
+    finally:
+        if writer is not None:
+            writer.close()
+    return num_rows
@@ -0,0 +1,212 @@
+"""Keyset pagination of ordered SPARQL SELECT queries.
+
+A query such as::
+
+    SELECT ?s ?p ?o WHERE { ?s ?p ?o } ORDER BY ?s ?p ?o
+
+is answered in pages of `page_size` rows. The first page is the query with a
+LIMIT; each following page keeps only the rows which sort after the last row
+of the previous page::
+
+    SELECT ?s ?p ?o WHERE {
+        ?s ?p ?o
+        FILTER (<?s ?p ?o after the last row>)
+    } ORDER BY ?s ?p ?o LIMIT 1000
+
+This bounds the size of each response, and the memory needed to handle it,
+but not the total work done by the server: every page evaluates the query
+pattern again, so the total cost grows with the number of pages. Where it is
+safe, the FILTER is added to the query's own WHERE clause so that only the
+remaining rows are sorted; otherwise (for example with GROUP BY) the query is
+wrapped in a subquery and the whole result is sorted for every page. Use
+pages as large as memory allows.
+
+The ORDER BY variables must be projected by the query, must be in ascending
+order, and together must identify each row uniquely. Among rows which agree
+on the earlier keys, the literal values of a key must have the same datatype
+(or language tag), since SPARQL does not compare literals of different types
+consistently; see :py:func:`check_key_types`.
+
+"""
+
+import re
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from rdflib import BNode, Literal, URIRef
+from rdflib.namespace import XSD
+
+
+_PROLOGUE_PATTERN = re.compile(
+    r"^(\s*(?:(?:PREFIX\s+[^\s:]*:\s*<[^>]*>|BASE\s+<[^>]*>)\s*|#[^\n]*\n\s*)*)",
+    re.IGNORECASE,
+)
+
+_ORDER_BY_PATTERN = re.compile(
+    r"\bORDER\s+BY\s+((?:(?:ASC\s*\(\s*)?\?\w+\s*\)?\s*)+)$",
+    re.IGNORECASE,
+)
+
+_LIMIT_PATTERN = re.compile(r"\b(LIMIT|OFFSET)\s+\d+\s*$", re.IGNORECASE)
+
+# Queries whose WHERE clause cannot simply take an extra FILTER
+_GROUPED_PATTERN = re.compile(r"\b(GROUP\s+BY|HAVING)\b", re.IGNORECASE)
+_VALUES_PATTERN = re.compile(
+    r"\bVALUES\s+(?:\?\w+|\([^)]*\))\s*\{[^{}]*\}$", re.IGNORECASE
+)
+
+
+def split_ordered_query(query: str) -> Tuple[str, str, List[str]]:
+    """Split `query` into its prologue, body and ORDER BY variables.
+
+    :raises ValueError: if the query does not end with an ORDER BY clause of
+        plain (ascending) variables, or already has a LIMIT or OFFSET.
+
+    """
+    query = query.strip()
+    match = _PROLOGUE_PATTERN.match(query)
+    prologue = match.group(1) if match else ""
+    body = query[len(prologue):]
+
+    if _LIMIT_PATTERN.search(body):
+        raise ValueError("Cannot paginate a query which already has LIMIT or OFFSET")
+
+    match = _ORDER_BY_PATTERN.search(body)
+    if not match:
+        raise ValueError(
+            "Cannot paginate query: it must end with ORDER BY one or more ascending variables"
+        )
+    keys = re.findall(r"\?(\w+)", match.group(1))
+    body = body[:match.start()].rstrip()
+    return prologue, body, keys
+
+
+def _after(var: str, value) -> str:
+    """SPARQL condition for `?var` sorting after `value` in ORDER BY."""
+    if value is None:
+        # Unbound sorts first
+        return f"BOUND(?{var})"
+    elif isinstance(value, URIRef):
+        # Then blank nodes, IRIs (by their string), and literals
+        return f"(isLiteral(?{var}) || (isIRI(?{var}) && STR(?{var}) > {Literal(str(value)).n3()}))"
+    elif isinstance(value, Literal):
+        # Literals of another type are kept, so that check_key_types sees them
+        if value.language:
+            other_type = f"LANG(?{var}) != {Literal(value.language).n3()}"
+            greater = f"STR(?{var}) > {Literal(str(value)).n3()}"
+        else:
+            other_type = f"DATATYPE(?{var}) != <{value.datatype or XSD.string}>"
+            greater = f"?{var} > {value.n3()}"
+        return f"(isLiteral(?{var}) && ({other_type} || {greater}))"
+    raise ValueError(f"Cannot paginate on blank node value for ?{var}")
+
+
+def _same(var: str, value) -> str:
+    """SPARQL condition for `?var` being equal to `value`."""
+    if value is None:
+        return f"!BOUND(?{var})"
+    return f"sameTerm(?{var}, {value.n3()})"
+
+
+def _literal_type(term: Literal) -> Tuple[str, str]:
+    if term.language:
+        return ("", term.language)
+    return (str(term.datatype or XSD.string), "")
+
+
+def check_key_types(keys: List[str], rows: List[Mapping],
+                    last_row: Optional[Mapping] = None) -> None:
+    """Check that consecutive rows do not order on literals of different types.
+
+    Rows are compared in order, starting from `last_row` of the previous
+    page. Where two rows first differ in a key, and both values are literals,
+    they must have the same datatype (or language tag).
+
+    :param keys: ORDER BY variables, from :py:func:`split_ordered_query`
+    :param rows: dicts of rdflib terms from one page
+    :param last_row: last row of the previous page, if any
+    :raises ValueError: if the rows are ordered on literals of different
+        types, which cannot be paged reliably.
+
+    """
+    previous = last_row
+    for row in rows:
+        if previous is not None:
+            for key in keys:
+                a, b = previous.get(key), row.get(key)
+                if a == b:
+                    continue
+                if (isinstance(a, Literal) and isinstance(b, Literal)
+                        and _literal_type(a) != _literal_type(b)):
+                    raise ValueError(
+                        f"Cannot paginate on ?{key}: it has literals of different "
+                        f"types ({a.n3()} and {b.n3()})"
+                    )
+                break
+        previous = row
+
+
+def _can_filter_body(body: str, keys: List[str]) -> bool:
+    """Whether a FILTER can be added at the end of the query's WHERE clause."""
+    if not body.endswith("}"):
+        return False
+    if _GROUPED_PATTERN.search(body) or _VALUES_PATTERN.search(body):
+        return False
+    # Keys which are expressions in the SELECT clause are not in scope
+    return not any(re.search(rf"\bAS\s+\?{k}\b", body, re.IGNORECASE) for k in keys)
+
+
+def page_query(prologue: str,
+               body: str,
+               keys: List[str],
+               page_size: int,
+               variables: Optional[List[str]] = None,
+               last_row: Optional[Mapping] = None) -> str:
+    """Return the query for the page following `last_row`.
+
+    :param prologue: PREFIX declarations, from :py:func:`split_ordered_query`
+    :param body: query without ORDER BY, from :py:func:`split_ordered_query`
+    :param keys: ORDER BY variables, from :py:func:`split_ordered_query`
+    :param page_size: maximum number of rows in the page
+    :param variables: variables projected by the query, needed after the
+        first page to keep the same column order.
+    :param last_row: dict of rdflib terms from the last row of the previous
+        page, or None for the first page.
+
+    """
+    order_by = "ORDER BY " + " ".join(f"?{k}" for k in keys)
+    if last_row is None:
+        return f"{prologue}{body}\n{order_by}\nLIMIT {int(page_size)}\n"
+
+    if variables is None:
+        raise ValueError("variables are needed after the first page")
+    missing = set(keys) - set(variables)
+    if missing:
+        raise ValueError("ORDER BY variables are not in the results: %s" % ", ".join(missing))
+
+    # Lexicographic comparison over the keys
+    alternatives = []
+    for i, key in enumerate(keys):
+        conditions = [_same(k, last_row.get(k)) for k in keys[:i]]
+        conditions.append(_after(key, last_row.get(key)))
+        alternatives.append("(" + " && ".join(conditions) + ")")
+    condition = "\n        || ".join(alternatives)
+
+    if _can_filter_body(body, keys):
+        return (
+            f"{prologue}{body[:-1].rstrip()}\n"
+            f"    FILTER ({condition})\n"
+            f"}}\n"
+            f"{order_by}\n"
+            f"LIMIT {int(page_size)}\n"
+        )
+
+    projection = " ".join(f"?{v}" for v in variables)
+    return (
+        f"{prologue}SELECT {projection}\n"
+        f"WHERE {{\n"
+        f"    {{ {body} }}\n"
+        f"    FILTER ({condition})\n"
+        f"}}\n"
+        f"{order_by}\n"
+        f"LIMIT {int(page_size)}\n"
+    )
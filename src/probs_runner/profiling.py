@@ -0,0 +1,133 @@
+"""Opt-in profiling of the queries sent to an endpoint.
+
+Set :py:attr:`PRObsEndpoint.profiler` to a :py:class:`QueryProfiler` to record
+every query answered by the endpoint::
+
+    rdfox.profiler = QueryProfiler()
+    ...
+    print(rdfox.profiler.report())
+
+Queries are grouped by template: the query text with any trailing VALUES
+bindings removed, string literals replaced by "?" and whitespace collapsed.
+See :py:class:`QueryRecord` for what is measured for each query.
+
+"""
+
+import math
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Any
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+HISTOGRAM_BUCKETS = (0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1.0, 3.0, 10.0, 30.0, 100.0, math.inf)
+
+_VALUES_PATTERN = re.compile(r"\s*VALUES\s*\([^)]*\)\s*\{.*\}\s*$", re.DOTALL | re.IGNORECASE)
+_STRING_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"')
+_SPACE_PATTERN = re.compile(r"\s+")
+
+
+def query_template(query: str) -> str:
+    """Normalise `query` so that queries differing only in values match."""
+    query = _VALUES_PATTERN.sub("", query)
+    query = _STRING_PATTERN.sub("?", query)
+    return _SPACE_PATTERN.sub(" ", query).strip()
+
+
+@dataclass
+class QueryRecord:
+    """Measurements for one query.
+
+    :param query: query text
+    :param template: normalised query text, see :py:func:`query_template`
+    :param wall_time: seconds from sending the query to reading the last result
+    :param first_byte_time: seconds from sending the query until the response
+        headers arrived (time to first byte), if known. This includes RDFox's
+        time to start answering, but not to send the rest of the result.
+    :param rows: number of result rows, if known
+    :param bytes: size of the response in bytes, if known
+
+    `first_byte_time` and `bytes` are only known for queries whose response
+    is streamed (e.g. :py:meth:`PRObsEndpoint.iter_records` and
+    :py:meth:`PRObsEndpoint.query_frame`). Queries answered through rdflib
+    (:py:meth:`PRObsEndpoint.query` and :py:meth:`PRObsEndpoint.query_records`)
+    only record the wall time and rows, since rdflib does not expose the
+    response.
+    """
+
+    query: str
+    template: str
+    wall_time: float
+    first_byte_time: Optional[float] = None
+    rows: Optional[int] = None
+    bytes: Optional[int] = None
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+
+class QueryProfiler:
+    """Collect :py:class:`QueryRecord` measurements for queries."""
+
+    def __init__(self):
+        self.records: List[QueryRecord] = []
+        self._lock = threading.Lock()
+
+    def record(self, query: str, wall_time: float, first_byte_time: Optional[float] = None,
+               rows: Optional[int] = None, bytes: Optional[int] = None):
+        """Add a measurement for `query`."""
+        record = QueryRecord(query, query_template(query), wall_time, first_byte_time, rows, bytes)
+        with self._lock:
+            self.records.append(record)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Summarise the measurements for each query template.
+
+        :returns: dict of {template: summary}, where the summary has the
+            number of queries (`count`), `total_time`, `mean_time`,
+            `median_time`, `p90_time` and `max_time` in seconds, total `rows`
+            and `bytes`, and a `histogram` of {bucket upper bound: count}.
+
+        """
+        with self._lock:
+            records = list(self.records)
+        by_template: Dict[str, List[QueryRecord]] = {}
+        for record in records:
+            by_template.setdefault(record.template, []).append(record)
+
+        result = {}
+        for template, group in by_template.items():
+            times = sorted(r.wall_time for r in group)
+            histogram = {bound: 0 for bound in HISTOGRAM_BUCKETS}
+            for t in times:
+                histogram[next(b for b in HISTOGRAM_BUCKETS if t <= b)] += 1
+            result[template] = {
+                "count": len(group),
+                "total_time": sum(times),
+                "mean_time": sum(times) / len(times),
+                "median_time": _percentile(times, 0.5),
+                "p90_time": _percentile(times, 0.9),
+                "max_time": times[-1],
+                "rows": sum(r.rows or 0 for r in group),
+                "bytes": sum(r.bytes or 0 for r in group),
+                "histogram": histogram,
+            }
+        return result
+
+    def slowest(self, n: int = 10) -> List[QueryRecord]:
+        """Return the `n` slowest queries."""
+        with self._lock:
+            return sorted(self.records, key=lambda r: r.wall_time, reverse=True)[:n]
+
+    def report(self, n: int = 10) -> str:
+        """Return a text table of the `n` slowest queries."""
+        lines = [f"{'wall (s)':>9} {'ttfb (s)':>10} {'rows':>9} {'bytes':>11}  query"]
+        for r in self.slowest(n):
+            ttfb = f"{r.first_byte_time:10.3f}" if r.first_byte_time is not None else f"{'-':>10}"
+            rows = f"{r.rows:9d}" if r.rows is not None else f"{'-':>9}"
+            nbytes = f"{r.bytes:11d}" if r.bytes is not None else f"{'-':>11}"
+            lines.append(f"{r.wall_time:9.3f} {ttfb} {rows} {nbytes}  {r.template[:100]}")
+        return "\n".join(lines)
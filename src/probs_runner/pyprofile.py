@@ -0,0 +1,185 @@
+"""Profiling of the Python side of a probs-runner run.
+
+A :py:class:`RunProfiler` runs the code in its block under :py:mod:`cProfile`,
+and at the same time samples the stack of the same thread at a fixed interval::
+
+    with RunProfiler() as profiler:
+        ...
+    profiler.write("run")   # writes run.prof and run.collapsed
+    print(profiler.report())
+
+The samples are labelled by what the thread was doing, so that time spent in
+probs_runner itself can be told apart from time spent waiting for RDFox:
+
+- ``RDFox``: blocked (on a socket, lock, or subprocess) while inside
+  probs_runner or rdfox_runner code, i.e. waiting for RDFox to start, finish,
+  or answer a query;
+- ``Waiting``: blocked anywhere else;
+- ``Python``: running Python code.
+
+The samples are written in the "collapsed stack" format used by
+`flamegraph.pl` and `speedscope`, with the label as the root frame. Only the
+thread the profiler was started in is sampled; work done in other threads
+(e.g. concurrent queries) shows up as that thread waiting for them. Blocking
+calls in C extensions other than the standard library ones listed in
+:py:data:`WAIT_MODULES` count as Python time.
+
+The command line enables this with `probs-runner --profile PATH`.
+
+"""
+
+import cProfile
+import os
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+LABELS = ("Python", "RDFox", "Waiting")
+
+# Standard library modules whose functions block (in C) waiting for I/O,
+# locks or other processes
+WAIT_MODULES = {"socket", "ssl", "selectors", "threading", "subprocess", "queue"}
+
+# Packages whose code only waits for RDFox when it blocks, apart from the
+# command line itself
+RDFOX_PACKAGES = ("probs_runner", "rdfox_runner")
+_NOT_RDFOX_MODULES = {"cli", "pyprofile"}
+
+
+def _module_name(filename: str) -> str:
+    return Path(filename).stem
+
+
+def _short_path(filename: str) -> str:
+    parts = Path(filename).parts
+    return "/".join(parts[-2:])
+
+
+def _frame_name(code) -> str:
+    name = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+    return name.replace(";", ":")
+
+
+def classify_stack(filenames: List[str]) -> str:
+    """Label a stack, given the filenames of its frames from outermost to innermost."""
+    if not filenames or _module_name(filenames[-1]) not in WAIT_MODULES:
+        return "Python"
+    for filename in filenames:
+        path = Path(filename)
+        if (any(package in path.parts for package in RDFOX_PACKAGES)
+                and path.stem not in _NOT_RDFOX_MODULES):
+            return "RDFox"
+    return "Waiting"
+
+
+class RunProfiler:
+    """Profile the current thread with cProfile and stack sampling.
+
+    :param sample_interval: seconds between stack samples, or None to only
+        use cProfile (then no collapsed stacks or labels are recorded).
+    """
+
+    def __init__(self, sample_interval: Optional[float] = DEFAULT_SAMPLE_INTERVAL):
+        self.sample_interval = sample_interval
+        self.profile = cProfile.Profile()
+        self.samples: Counter = Counter()
+        self.wall_time = 0.0
+        self._start = 0.0
+        self._stop_sampling = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def _sample(self, thread_id: int):
+        own_code = {RunProfiler._sample.__code__, RunProfiler.stop.__code__}
+        while not self._stop_sampling.wait(self.sample_interval):
+            frame = sys._current_frames().get(thread_id)
+            codes = []
+            while frame is not None:
+                if frame.f_code not in own_code:
+                    codes.append(frame.f_code)
+                frame = frame.f_back
+            codes.reverse()
+            if not codes:
+                continue
+            label = classify_stack([code.co_filename for code in codes])
+            self.samples[(label, *(_frame_name(code) for code in codes))] += 1
+
+    def start(self):
+        """Start profiling the current thread."""
+        self._start = perf_counter()
+        if self.sample_interval:
+            self._stop_sampling.clear()
+            self._sampler = threading.Thread(target=self._sample,
+                                             args=(threading.get_ident(),),
+                                             daemon=True)
+            self._sampler.start()
+        self.profile.enable()
+
+    def stop(self):
+        """Stop profiling."""
+        self.profile.disable()
+        if self._sampler is not None:
+            self._stop_sampling.set()
+            self._sampler.join()
+            self._sampler = None
+        self.wall_time = perf_counter() - self._start
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def label_times(self) -> Dict[str, float]:
+        """Estimated wall time (seconds) for each label, from the samples."""
+        totals = Counter()
+        for stack, count in self.samples.items():
+            totals[stack[0]] += count
+        num_samples = sum(totals.values())
+        return {
+            label: self.wall_time * totals[label] / num_samples if num_samples else 0.0
+            for label in LABELS
+        }
+
+    def write(self, path) -> Tuple[Path, ...]:
+        """Write the cProfile stats to `{path}.prof`, and the samples to
+        `{path}.collapsed` (if sampling). A `.prof` suffix on `path` is ignored.
+
+        :returns: the paths written
+        """
+        path = Path(path)
+        if path.suffix == ".prof":
+            path = path.with_suffix("")
+        if path.parent != Path(""):
+            path.parent.mkdir(parents=True, exist_ok=True)
+        prof_path = path.with_name(path.name + ".prof")
+        self.profile.dump_stats(os.fspath(prof_path))
+        if not self.sample_interval:
+            return (prof_path,)
+
+        collapsed_path = path.with_name(path.name + ".collapsed")
+        with open(collapsed_path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(";".join(stack) + f" {count}\n")
+        return (prof_path, collapsed_path)
+
+    def report(self) -> str:
+        """Summarise where the time went."""
+        lines = [f"Wall time: {self.wall_time:.2f} s"]
+        if self.sample_interval:
+            times = self.label_times()
+            descriptions = {
+                "Python": "running Python code",
+                "RDFox": "waiting for RDFox",
+                "Waiting": "waiting for something else",
+            }
+            for label in LABELS:
+                fraction = times[label] / self.wall_time if self.wall_time else 0.0
+                lines.append(f"  {times[label]:8.2f} s ({fraction:4.0%}) {descriptions[label]}")
+        return "\n".join(lines)
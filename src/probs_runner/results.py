@@ -0,0 +1,128 @@
+"""Fast decoding of SPARQL TSV results into typed columns.
+
+Converting every cell of a large result into an rdflib term and then into a
+Python value is slow. Here each column is decoded in one pass instead:
+
+- columns of numeric literals become float64 arrays (NaN where unbound);
+- columns of IRIs become pandas Categoricals of the IRI strings, so each
+  distinct IRI is stored only once;
+- anything else falls back to rdflib, giving an object array of Python values.
+
+:py:func:`tsv_term` does the reverse, formatting a term as a TSV cell.
+
+"""
+
+from typing import Iterable, List
+
+import numpy as np
+import pandas as pd
+from rdflib import Literal
+from rdflib.namespace import XSD
+from rdflib.util import from_n3
+
+
+_NUMERIC_DATATYPES = {
+    str(dt) for dt in (
+        XSD.double, XSD.float, XSD.decimal, XSD.integer, XSD.int, XSD.long,
+        XSD.short, XSD.byte, XSD.nonNegativeInteger, XSD.nonPositiveInteger,
+        XSD.positiveInteger, XSD.negativeInteger, XSD.unsignedLong,
+        XSD.unsignedInt, XSD.unsignedShort, XSD.unsignedByte,
+    )
+}
+
+
+# Escapes for the lexical form of literals in N-Triples (and so SPARQL TSV)
+_LITERAL_ESCAPES = str.maketrans({
+    "\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r", "\t": "\\t",
+})
+
+
+def tsv_term(term) -> str:
+    """Format an rdflib term (or None if unbound) as a SPARQL TSV cell.
+
+    Literals are written in N-Triples form, as RDFox does, so that tabs and
+    newlines in them are escaped. (`term.n3()` can write a raw tab, or a
+    multi-line string in triple quotes.)
+    """
+    if term is None:
+        return ""
+    if isinstance(term, Literal):
+        quoted = '"' + str(term).translate(_LITERAL_ESCAPES) + '"'
+        if term.language:
+            return f"{quoted}@{term.language}"
+        if term.datatype is not None and term.datatype != XSD.string:
+            return f"{quoted}^^<{term.datatype}>"
+        return quoted
+    return term.n3()
+
+
+def _numeric_value(cell: str) -> float:
+    """Return the value of a numeric literal, or raise ValueError."""
+    if not cell:
+        return np.nan
+    if cell[0] == '"':
+        lexical, sep, datatype = cell[1:].partition('"^^')
+        if not sep or datatype[1:-1] not in _NUMERIC_DATATYPES:
+            raise ValueError(cell)
+        return float(lexical)
+    if cell[0] in "<_":
+        raise ValueError(cell)
+    # Turtle shorthand for integers, decimals and doubles
+    return float(cell)
+
+
+def _decode_numeric(cells: List[str]) -> np.ndarray:
+    return np.fromiter((_numeric_value(cell) for cell in cells),
+                       dtype=np.float64, count=len(cells))
+
+
+def _decode_iris(cells: List[str]) -> pd.Categorical:
+    index: dict = {}
+    codes = np.empty(len(cells), dtype=np.int32)
+    for i, cell in enumerate(cells):
+        if not cell:
+            codes[i] = -1
+        elif cell[0] == "<" and cell[-1] == ">":
+            codes[i] = index.setdefault(cell, len(index))
+        else:
+            raise ValueError(cell)
+    categories = [iri[1:-1] for iri in index]
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def _decode_generic(cells: List[str]) -> np.ndarray:
+    values = np.empty(len(cells), dtype=object)
+    for i, cell in enumerate(cells):
+        values[i] = from_n3(cell).toPython() if cell else None
+    return values
+
+
+def decode_column(cells: List[str]):
+    """Decode one column of TSV cells, choosing the most compact type."""
+    for decoder in (_decode_numeric, _decode_iris):
+        try:
+            return decoder(cells)
+        except ValueError:
+            pass
+    return _decode_generic(cells)
+
+
+def decode_tsv_columns(lines: Iterable[bytes]) -> pd.DataFrame:
+    """Decode SPARQL TSV results into a DataFrame with typed columns.
+
+    :param lines: lines of the response, including the header line.
+
+    """
+    lines = iter(lines)
+    header = next(lines, None)
+    if header is None:
+        return pd.DataFrame()
+    variables = [v.lstrip("?") for v in header.decode("utf-8").split("\t")]
+    columns: List[List[str]] = [[] for _ in variables]
+    for line in lines:
+        cells = line.decode("utf-8").split("\t")
+        for column, cell in zip(columns, cells):
+            column.append(cell)
+    return pd.DataFrame({
+        var: decode_column(cells) for var, cells in zip(variables, columns)
+    })
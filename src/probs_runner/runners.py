@@ -19,12 +19,20 @@ All of these functions accept some common options:
 - working_dir
 - script_source_dir
 
+The RDFox executable to run can be set with the `PROBS_RDFOX_EXECUTABLE`
+environment variable, for example to use the stub RDFox from
+:py:mod:`probs_runner.stub`.
+
 """
 
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
 from contextlib import contextmanager
 import logging
-from typing import List, Dict, Iterable, Iterator, Union, Optional
+from typing import List, Dict, Iterable, Iterator, Mapping, Union, Optional
 from io import StringIO
 from pathlib import Path
 from hashlib import md5
@@ -37,14 +45,15 @@ except (ImportError, AttributeError):
     from importlib.resources import files as importlib_resources_files
     from importlib.abc import Traversable
 
-import pandas as pd
-
 from rdfox_runner import RDFoxRunner
+from rdfox_runner.command_runner import copy_files
 
 from .datasource import Datasource
 from .namespace import NAMESPACES
 from .endpoint import PRObsEndpoint
-from .utils import prepare_file_for_rdfox, copy_from_rdfox
+from .cache import AnswerCache, input_fingerprint, DEFAULT_MAX_BYTES
+from .export import EXPORT_FORMATS, FILE_EXTENSIONS, DEFAULT_ROW_GROUP_SIZE, write_tsv_lines
+from .utils import prepare_file_for_rdfox, copy_from_rdfox, find_free_port
 
 logger = logging.getLogger(__name__)
 
@@ -176,6 +185,169 @@ def _prepare_datasources_arg(datasources: AllowableDataInputs) -> List[Datasourc
     return [_convert(ds) for ds in ds_list]
 
 
+def _removal_script(script: str) -> str:
+    """Turn a load_data or load_rules script into one that removes what it loaded.
+
+    `import` commands are changed to `import -`, and `set` and `prefix`
+    commands are kept so that paths and names resolve the same way. Other
+    commands (e.g. registering data sources) are dropped, since they cannot
+    be undone in general.
+    """
+    # Join continuation lines so each command is on one line
+    commands = script.replace("\\\n", " ").splitlines()
+    result = []
+    for command in commands:
+        words = command.split(None, 1)
+        if not words:
+            continue
+        if words[0] == "import":
+            if len(words) < 2 or words[1][0] in "+-":
+                raise ValueError(f"Cannot reverse import command: {command}")
+            result.append("import - " + words[1])
+        elif words[0] in ("set", "prefix"):
+            result.append(command)
+        elif not words[0].startswith("#"):
+            logger.warning("Ignoring command when removing datasource: %s", command)
+    return "\n".join(result)
+
+
+class _PRObsRunner(RDFoxRunner):
+    """RDFoxRunner which can run further commands once the endpoint is running.
+
+    Commands are sent to the RDFox shell's standard input, as
+    :py:meth:`RDFoxRunner.send_quit` does. This relies on internals of
+    RDFoxRunner (the RDFox process and its error parsing), which is why
+    rdfox_runner is pinned to 0.6.x in setup.cfg.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._markers: Dict[str, threading.Event] = {}
+
+    @property
+    def pid(self) -> Optional[int]:
+        """Process ID of RDFox, or None if it is not running."""
+        runner = getattr(self, "_runner", None)
+        process = runner._process if runner is not None else None
+        if process is None or process.poll() is not None:
+            return None
+        return process.pid
+
+    def _check_for_errors(self, line):
+        # Pass the marker on too, so that a multi-line error from the last
+        # command is finished and recorded before the marker is signalled
+        super()._check_for_errors(line)
+        event = self._markers.get(line.strip())
+        if event is not None:
+            event.set()
+
+    def run_commands(self, commands: List[str], timeout: Optional[float] = None):
+        """Run RDFox shell `commands` and wait for them to finish.
+
+        :raises RuntimeError: if RDFox reports errors while running them.
+        """
+        process = self._runner._process
+        if process is None or process.poll() is not None:
+            raise RuntimeError("RDFox is not running")
+
+        marker = f"probs-runner commands finished {uuid4().hex}"
+        done = self._markers[marker] = threading.Event()
+        num_errors = len(self.errors)
+        script = [
+            # Don't let an error in these commands stop the endpoint
+            "set on-error continue",
+            *commands,
+            "set on-error stop",
+            f'echo "{marker}"',
+        ]
+        logger.debug("Sending commands to RDFox: %s", script)
+        try:
+            process.stdin.write(("\n".join(script) + "\n").encode())
+            process.stdin.flush()
+            if not done.wait(timeout):
+                raise TimeoutError("Timed out waiting for RDFox commands to finish")
+        finally:
+            del self._markers[marker]
+
+        errors = self.errors[num_errors:]
+        if errors:
+            raise RuntimeError("RDFox errors:\n  " + "\n  ".join(errors))
+
+    def _clear_pending_error(self):
+        """Forget any multi-line error message still being read.
+
+        After a timeout, the output of the unfinished commands would otherwise
+        be joined to (and reported as) errors from the next commands.
+        """
+        self._multiline_error = False
+
+    def update_datasources(self,
+                           datastore: str,
+                           datasources: AllowableDataInputs,
+                           remove: bool = False,
+                           timeout: Optional[float] = None):
+        """Load (or remove) `datasources` in the running `datastore`.
+
+        The datasource files are copied into the working directory, and their
+        scripts are run in a single transaction, so RDFox updates the
+        materialisation incrementally. If RDFox reports any errors, the
+        transaction is rolled back, so the data store is left unchanged.
+
+        :returns: dict of the files used, {target path: source}, including
+            the generated scripts.
+        """
+        update_dir = f"updates/{uuid4().hex}"
+        load_data_file = StringIO()
+        load_rules_file = StringIO()
+        input_files: Dict = {}
+        for datasource in _prepare_datasources_arg(datasources):
+            _add_datasource_to_input_files(
+                input_files, load_data_file, load_rules_file, datasource
+            )
+
+        load_data_script = load_data_file.getvalue()
+        load_rules_script = load_rules_file.getvalue()
+        if remove:
+            load_data_script = _removal_script(load_data_script)
+            load_rules_script = _removal_script(load_rules_script)
+        else:
+            # Always copy, in case a file has changed since it was last loaded
+            for tgt, src in input_files.items():
+                if hasattr(src, "seek"):
+                    src.seek(0)
+                copy_files(src, self.files(tgt))
+
+        script_dir = self.files("scripts/endpoint") / update_dir
+        script_dir.mkdir(parents=True)
+        (script_dir / "load_data.rdfox").write_text(load_data_script)
+        (script_dir / "load_rules.rdfox").write_text(load_rules_script)
+
+        # The RDFox shell cannot stop a script on error without stopping the
+        # endpoint, so check for errors before deciding whether to commit.
+        try:
+            self.run_commands([
+                f"active {datastore}",
+                "begin",
+                f"exec {update_dir}/load_data",
+                f"exec {update_dir}/load_rules",
+            ], timeout=timeout)
+        except Exception:
+            self._clear_pending_error()
+            try:
+                self.run_commands(["rollback"], timeout=timeout)
+            except (RuntimeError, TimeoutError) as err:
+                # Report the original error, not this one
+                logger.error("Error rolling back update of %s: %s", datastore, err)
+            raise
+        self.run_commands(["commit"], timeout=timeout)
+
+        return {
+            **input_files,
+            "load_data.rdfox": StringIO(load_data_script),
+            "load_rules.rdfox": StringIO(load_rules_script),
+        }
+
+
 def _setup_script_parameters(*args, **kwargs):
 
     # FIXME This is abusing the RDFox arguments, but it turns out that it
@@ -193,12 +365,34 @@ def _setup_script_parameters(*args, **kwargs):
     return setup_script 
 
     
+def _module_paths(script_source_dir) -> List[Path]:
+    """Paths to look for module scripts in, from `script_source_dir` or the
+    `PROBS_MODULE_PATH` environment variable."""
+    # Backwards compatibility
+    if script_source_dir is None:
+        if "PROBS_MODULE_PATH" in os.environ:
+            script_source_dir = os.environ["PROBS_MODULE_PATH"].split(os.pathsep)
+        else:
+            script_source_dir = []
+    if isinstance(script_source_dir, (Path, str)):
+        return [Path(script_source_dir)]
+    else:
+        return [Path(p) for p in script_source_dir]
+
+
+def _rdfox_executable() -> Optional[str]:
+    """RDFox executable to run, from the `PROBS_RDFOX_EXECUTABLE` environment
+    variable, or None for the default (`RDFox` on the path)."""
+    return os.environ.get("PROBS_RDFOX_EXECUTABLE") or None
+
+
 def probs_run_module(
     module: str,
     datasources: AllowableDataInputs,
     setup_script: Optional[Union[List[str], str]] = None,
     working_dir=None,
     script_source_dir=None,
+    runner_class=RDFoxRunner,
     **kwargs,
 ) -> RDFoxRunner:
     """Set up RDFox to load `datasources` and run `module`.
@@ -216,6 +410,11 @@ def probs_run_module(
 
     :param script_source_dir: Path to copy scripts from
 
+    :param runner_class: RDFoxRunner (sub)class to use
+
+    Other keyword arguments are passed to `runner_class`; `rdfox_executable`
+    defaults to the `PROBS_RDFOX_EXECUTABLE` environment variable if set.
+
     """
 
     if setup_script is None:
@@ -227,17 +426,7 @@ def probs_run_module(
 
     logger.debug("Running PRObs module %s (%s)", module, kwargs)
 
-    # Backwards compatibility
-    if script_source_dir is None:
-        if "PROBS_MODULE_PATH" in os.environ:
-            script_source_dir = os.environ["PROBS_MODULE_PATH"].split(os.pathsep)
-        else:
-            script_source_dir = []
-    if isinstance(script_source_dir, (Path, str)):
-        module_paths = [Path(script_source_dir)]
-    else:
-        module_paths = [Path(p) for p in script_source_dir]
-    input_files = _standard_input_files(module_paths, module)
+    input_files = _standard_input_files(_module_paths(script_source_dir), module)
 
     # TODO: case where we want to pass multiple paths to load modules
 
@@ -257,7 +446,8 @@ def probs_run_module(
 
     script = setup_script + [f"exec scripts/{module}/master"]
 
-    runner = RDFoxRunner(input_files, script, working_dir=working_dir, **kwargs)
+    kwargs.setdefault("rdfox_executable", _rdfox_executable())
+    runner = runner_class(input_files, script, working_dir=working_dir, **kwargs)
     return runner
 
 
@@ -431,9 +621,12 @@ def probs_endpoint(
     datasources: AllowableDataInputs,
     working_dir: Optional[Union[os.PathLike, str]] = None,
     script_source_dir: Optional[Union[os.PathLike, str]] = None,
-    port: Optional[int] = DEFAULT_PORT,
+    port: Optional[Union[int, str]] = DEFAULT_PORT,
     namespaces: Optional[dict] = None,
     use_default_namespaces: bool = True,
+    use_code_index: bool = False,
+    answer_cache: Optional[Union[os.PathLike, str]] = None,
+    answer_cache_max_bytes: int = DEFAULT_MAX_BYTES,
 ) -> Iterator:
     """Load data sources, and start endpoint.
 
@@ -446,14 +639,24 @@ def probs_endpoint(
     inputs, or paths to individual input files.
     :param working_dir: Path to setup rdfox in, defaults to a temporary directory
     :param script_source_dir: Path to copy scripts from
-    :param port: Port number to listen on
+    :param port: Port number to listen on. If 0 or "auto", a free port is
+    chosen; the endpoint URL including the port is available as
+    `endpoint.server`.
     :param namespaces: dict of namespace mappings
     :param use_default_namespaces: whether to use the default namespaces.
+    :param use_code_index: whether to look up classification codes in an
+    index, see :py:class:`PRObsEndpoint`.
+    :param answer_cache: directory to cache query answers in, so that they
+    can be reused if the endpoint is started again with the same inputs. See
+    :py:mod:`probs_runner.cache`.
+    :param answer_cache_max_bytes: maximum size of the answer cache.
 
     """
 
     if port is None:
         port = DEFAULT_PORT
+    elif port == 0 or port == "auto":
+        port = find_free_port()
 
     ns = NAMESPACES.copy() if use_default_namespaces else {}
     if namespaces is not None:
@@ -463,24 +666,153 @@ def probs_endpoint(
         f'set endpoint.port "{int(port)}"',
     ]
 
-    endpoint = PRObsEndpoint(ns)
+    endpoint = PRObsEndpoint(ns, use_code_index=use_code_index)
     runner = probs_run_module(
         "endpoint",
         datasources,
         setup_script,
         working_dir=working_dir,
         script_source_dir=script_source_dir,
+        runner_class=_PRObsRunner,
         wait="endpoint",
         endpoint=endpoint,
     )
+    if answer_cache is not None:
+        # The master script only sets the port, which doesn't affect answers
+        inputs = {k: v for k, v in runner.input_files.items() if k != runner.MASTER_KEY}
+        endpoint.cache = AnswerCache(answer_cache, input_fingerprint(inputs),
+                                     max_bytes=answer_cache_max_bytes)
     with runner:
+        endpoint.runner = runner
         yield endpoint
 
 
+# Load each data store in the same way as the endpoint module's master script,
+# which only creates the "default" data store.
+STORE_SCRIPT_TEMPLATE = """
+dstore create {name} type parallel-nn
+active {name}
+exec prefixes.rdfox
+begin
+exec stores/{name}/load_data
+exec stores/{name}/load_rules
+exec process
+commit
+"""
+
+STORE_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+@contextmanager
+def probs_endpoints(
+    stores: Mapping[str, AllowableDataInputs],
+    working_dir: Optional[Union[os.PathLike, str]] = None,
+    script_source_dir: Optional[Union[os.PathLike, str]] = None,
+    port: Optional[Union[int, str]] = DEFAULT_PORT,
+    namespaces: Optional[dict] = None,
+    use_default_namespaces: bool = True,
+    use_code_index: bool = False,
+) -> Iterator[Dict[str, PRObsEndpoint]]:
+    """Load several sets of data sources into separate data stores of one
+    RDFox server, and start the endpoint.
+
+    This is like :py:func:`probs_endpoint`, but starts only one RDFox process
+    for all the data stores. The module scripts and ontology files are staged
+    once and shared by all the stores. RDFox data stores cannot share facts,
+    though, so each store still imports the ontology into its own memory: the
+    saving is the extra processes and their overhead, not the ontology. Use
+    it as::
+
+        with probs_endpoints({"gbr": "gbr.nt.gz", "fra": "fra.nt.gz"}) as stores:
+            results = stores["gbr"].query(...)
+
+    :param stores: dict of {store name: datasources}, where the datasources
+    are as for :py:func:`probs_endpoint`. Store names may contain letters,
+    digits, "_" and "-".
+    :param working_dir: Path to setup rdfox in, defaults to a temporary directory
+    :param script_source_dir: Path to copy scripts from
+    :param port: Port number to listen on, or 0 or "auto" to choose a free port.
+    :param namespaces: dict of namespace mappings
+    :param use_default_namespaces: whether to use the default namespaces.
+    :param use_code_index: see :py:func:`probs_endpoint`.
+
+    :returns: dict of {store name: :py:class:`PRObsEndpoint`}
+
+    """
+
+    if not stores:
+        raise ValueError("No data stores given")
+    for name in stores:
+        if not STORE_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid data store name: '{name}'")
+
+    if port is None:
+        port = DEFAULT_PORT
+    elif port == 0 or port == "auto":
+        port = find_free_port()
+
+    ns = NAMESPACES.copy() if use_default_namespaces else {}
+    if namespaces is not None:
+        ns.update(namespaces)
+
+    input_files = _standard_input_files(_module_paths(script_source_dir), "endpoint")
+    module_files = set(input_files)
+    script = [
+        "set on-error stop",
+        'set dir.facts "$(dir.root)/data"',
+        'set dir.output "$(dir.root)/data/"',
+        'set dir.scripts "$(dir.root)/scripts/endpoint"',
+        'set dir.dlog "$(dir.root)/scripts/endpoint"',
+        'set dir.queries "$(dir.root)/scripts/endpoint"',
+        "set output out",
+    ]
+    for name, datasources in stores.items():
+        load_data_file = StringIO()
+        load_rules_file = StringIO()
+        # The same datasource may be used by several stores, but only needs
+        # to be staged once.
+        store_files: Dict = {}
+        for datasource in _prepare_datasources_arg(datasources):
+            logger.debug("Adding datasource to store %s: %s", name, datasource)
+            _add_datasource_to_input_files(
+                store_files, load_data_file, load_rules_file, datasource
+            )
+        for tgt, src in store_files.items():
+            if tgt in module_files:
+                raise ValueError(f"Duplicate entry in input_files for '{tgt}'")
+            input_files.setdefault(tgt, src)
+        load_data_file.seek(0)
+        load_rules_file.seek(0)
+        input_files[f"scripts/endpoint/stores/{name}/load_data.rdfox"] = load_data_file
+        input_files[f"scripts/endpoint/stores/{name}/load_rules.rdfox"] = load_rules_file
+        script.append(STORE_SCRIPT_TEMPLATE.format(name=name))
+    script += [
+        f'set endpoint.port "{int(port)}"',
+        "endpoint start",
+    ]
+
+    endpoints = {
+        name: PRObsEndpoint(ns, use_code_index=use_code_index, datastore=name)
+        for name in stores
+    }
+    first, *others = endpoints.values()
+    runner = _PRObsRunner(input_files, script, working_dir=working_dir,
+                          wait="endpoint", endpoint=first,
+                          rdfox_executable=_rdfox_executable())
+    with runner:
+        for endpoint in others:
+            endpoint.connect(first.server)
+        for endpoint in endpoints.values():
+            endpoint.runner = runner
+        yield endpoints
+
+
 def connect_to_endpoint(
     url,
     namespaces=None,
     use_default_namespaces=True,
+    use_code_index=False,
+    datastore="default",
 ) -> PRObsEndpoint:
     """Connect to an existing endpoint."""
 
@@ -488,33 +820,79 @@ def connect_to_endpoint(
     if namespaces is not None:
         ns.update(namespaces)
 
-    endpoint = PRObsEndpoint(ns)
+    endpoint = PRObsEndpoint(ns, use_code_index=use_code_index, datastore=datastore)
     endpoint.connect(url)
     return endpoint
 
 
-def answer_queries(rdfox, queries) -> Dict:
+def answer_queries(rdfox,
+                   queries,
+                   parallel: Union[bool, int] = False,
+                   output_dir: Optional[Union[os.PathLike, str]] = None,
+                   output_format: str = "parquet",
+                   row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> Dict:
     """Answer queries from RDFox endpoint.
 
     :param rdfox: RDFox endpoint
     :param queries: Dict of {query_name: query_text}, or list of [query_text].
-    :return: Dict of {query_name: result}
+    :param parallel: whether to answer the queries concurrently, using
+    :py:meth:`PRObsEndpoint.query_many`. If an int, the number of queries to run
+    at once. Ignored if `rdfox` has no `query_many` method (e.g. a plain
+    `RDFoxEndpoint`).
+    :param output_dir: if given, stream each answer to a file
+    `{query_name}.parquet` (or `.arrow`) in this directory instead of
+    returning it. See :py:mod:`probs_runner.export`; this needs `pyarrow`.
+    :param output_format: "parquet" or "arrow" (Arrow IPC stream), used with
+    `output_dir`.
+    :param row_group_size: number of rows per row group, used with `output_dir`.
+    :return: Dict of {query_name: result}, or {query_name: output path} if
+    `output_dir` is given.
     """
     if isinstance(queries, list):
         queries = {i: query_text for i, query_text in enumerate(queries)}
     elif not isinstance(queries, dict):
         raise ValueError("query should be list or dict")
 
-    answers_df = {
-        query_name: rdfox.query_records(query_text)
-        for query_name, query_text in queries.items()
-    }
-
-    with pd.option_context(
-        "display.max_rows", 100, "display.max_columns", 10, "display.max_colwidth", 200
-    ):
-        for k, v in answers_df.items():
-            logger.info("Results from query %s:", k)
-            logger.info("\n%s", pd.DataFrame.from_records(v))
+    max_workers = None if parallel is True else int(parallel)
+
+    if output_dir is not None:
+        if output_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}', expected one of: "
+                             + ", ".join(EXPORT_FORMATS))
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        def _export(query_name):
+            path = output_dir / f"{query_name}{FILE_EXTENSIONS[output_format]}"
+            response = rdfox.query_raw(queries[query_name], answer_format="tsv")
+            with response:
+                num_rows = write_tsv_lines(response.iter_lines(), path,
+                                           output_format, row_group_size)
+            logger.info("Wrote %d rows from query %s to %s", num_rows, query_name, path)
+            return path
+
+        if parallel:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                return dict(zip(queries, executor.map(_export, queries)))
+        return {query_name: _export(query_name) for query_name in queries}
+
+    if parallel and hasattr(rdfox, "query_many"):
+        results = rdfox.query_many(list(queries.values()), max_workers=max_workers)
+        answers_df = dict(zip(queries.keys(), results))
+    else:
+        answers_df = {
+            query_name: rdfox.query_records(query_text)
+            for query_name, query_text in queries.items()
+        }
+
+    # Building the DataFrames is only worthwhile if they will be logged
+    if logger.isEnabledFor(logging.INFO):
+        import pandas as pd
+        with pd.option_context(
+            "display.max_rows", 100, "display.max_columns", 10, "display.max_colwidth", 200
+        ):
+            for k, v in answers_df.items():
+                logger.info("Results from query %s:", k)
+                logger.info("\n%s", pd.DataFrame.from_records(v))
 
     return answers_df
@@ -0,0 +1,522 @@
+"""Stub SPARQL endpoint, for testing and benchmarking without RDFox.
+
+A :py:class:`StubSPARQLServer` listens on a local HTTP port and answers the
+requests that :py:class:`PRObsEndpoint` makes of RDFox: the server info at
+`/`, and SELECT queries at `/datastores/{datastore}/sparql`, in TSV, CSV, JSON
+or XML depending on the `Accept` header. If it is given the Graph, it also
+serves and adds to the data at `/datastores/{datastore}/content`. Queries are answered by a function
+returning an rdflib query Result; :py:func:`graph_answerer` makes one which
+queries a local rdflib Graph::
+
+    graph = Graph()
+    graph.parse("observations.ttl")
+    with StubSPARQLServer(graph_answerer(graph)) as server:
+        rdfox = connect_to_endpoint(server.url)
+        ...
+
+Answering from rdflib is much slower than RDFox for large data, so for timing
+the Python side of queries, pass `cache=True` to the server and send each query
+once before timing it.
+
+Stub RDFox executable
+---------------------
+
+:py:func:`write_stub_executable` writes a fake `RDFox` executable, which can be
+used instead of RDFox by setting the `PROBS_RDFOX_EXECUTABLE` environment
+variable (or passing `rdfox_executable` to :py:func:`probs_run_module`). It is
+run in the same way as RDFox, runs the generated master script, and writes the
+output files that each module is expected to produce, so that the staging,
+copying and result-parsing done by probs_runner can be tested and timed
+without RDFox:
+
+- the datasources are loaded by running the module's `load_data` script, but
+  only `import` of RDF files (.ttl and .nt, maybe gzipped) has any effect;
+  CSV data sources and Datalog rules are ignored;
+- `data-conversion` and `kbc-hierarchy` write the loaded data unchanged as
+  `probs_original_data.nt.gz` and `probs_enhanced_data.nt.gz`;
+- `ontology-conversion` writes an empty `probs_ontology_rules.dlog`, and
+  `data-validation` writes a `valid.log` reporting that the data is valid;
+- `endpoint` answers queries on the loaded data with a
+  :py:class:`StubSPARQLServer`, and runs commands sent to it (so that
+  datasources can be added and removed). All data stores share the same data;
+- `begin`, `commit` and `rollback` work on the loaded data;
+- errors (such as unparseable data) are reported in the same way as by RDFox.
+
+The module scripts themselves are not run, but they must still be found as
+usual (see `script_source_dir`), since probs_runner copies them.
+
+"""
+
+import os
+import re
+import sys
+import gzip
+import shlex
+import logging
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from rdflib import Graph
+from rdflib.query import Result
+
+from .namespace import NAMESPACES
+
+logger = logging.getLogger(__name__)
+
+
+Answerer = Callable[[str], Result]
+
+DEFAULT_VERSION = "6.3.1"
+
+_PREFIX_PATTERN = re.compile(r"^\s*PREFIX\s+([\w-]*):\s*<([^>]*)>\s*$",
+                             re.IGNORECASE | re.MULTILINE)
+
+
+def _normalise_prefixes(query: str) -> str:
+    """Move PREFIX declarations to the start, declaring ':' last.
+
+    rdflib only keeps one prefix per namespace, so if the same namespace is
+    declared as both ':' and 'probs:' (as :py:class:`PRObsEndpoint` does),
+    ':' must come last to still be usable.
+    """
+    prefixes = dict(_PREFIX_PATTERN.findall(query))
+    body = _PREFIX_PATTERN.sub("", query)
+    prologue = "".join(
+        f"PREFIX {k}: <{v}>\n"
+        for k, v in sorted(prefixes.items(), key=lambda kv: kv[0] == "")
+    )
+    return prologue + body
+
+
+def graph_answerer(graph: Graph) -> Answerer:
+    """Answer queries from a local rdflib Graph."""
+    def _answer(query: str) -> Result:
+        return graph.query(_normalise_prefixes(query))
+    return _answer
+
+
+def _serialize_tsv(result: Result) -> bytes:
+    from .results import tsv_term
+    lines = ["\t".join(f"?{v}" for v in result.vars)]
+    for row in result:
+        lines.append("\t".join(tsv_term(x) for x in row))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def serialize_result(result: Result, accept: str):
+    """Serialise `result` for the `accept` header, as RDFox would.
+
+    :returns: tuple of (content type, body)
+    """
+    if "text/tab-separated-values" in accept:
+        return "text/tab-separated-values; charset=UTF-8", _serialize_tsv(result)
+    elif "text/csv" in accept:
+        return "text/csv; charset=UTF-8", result.serialize(format="csv")
+    elif "application/sparql-results+json" in accept:
+        return "application/sparql-results+json", result.serialize(format="json")
+    return "application/sparql-results+xml", result.serialize(format="xml")
+
+
+def _server_info(version: str) -> bytes:
+    return (
+        '{"head": {"vars": ["Property", "Value"]}, "results": {"bindings": ['
+        '{"Property": {"type": "literal", "value": "version"}, '
+        f'"Value": {{"type": "literal", "value": "{version}"}}}}'
+        ']}}'
+    ).encode("utf-8")
+
+
+class StubSPARQLServer:
+    """Local HTTP server answering SPARQL queries like RDFox.
+
+    :param answer: function from query text to an rdflib Result
+    :param port: port to listen on, defaults to any free port
+    :param version: RDFox version to report in the server info
+    :param cache: if True, remember the response to each query text and
+        format, so that repeating a query does not answer it again.
+    :param graph: the data, to serve at `/datastores/{datastore}/content`.
+    :param datastores: names of the data stores to answer for, defaults to
+        any name. Requests for other data stores get a 404 response.
+
+    The queries received are recorded in `queries`.
+    """
+
+    def __init__(self, answer: Answerer, port: int = 0,
+                 version: str = DEFAULT_VERSION, cache: bool = False,
+                 graph: Optional[Graph] = None,
+                 datastores: Optional[Sequence[str]] = None):
+        self.answer = answer
+        self.version = version
+        self.cache = cache
+        self.graph = graph
+        self.datastores = datastores
+        self.queries: List[str] = []
+        self._responses: Dict[Tuple[str, str], Tuple[int, str, bytes]] = {}
+        self._lock = threading.Lock()
+        self._port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server, to pass to `PRObsEndpoint.connect`."""
+        if self._server is None:
+            raise RuntimeError("Server is not running")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Start answering requests in a background thread."""
+        self._server = ThreadingHTTPServer(("127.0.0.1", self._port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.debug("Stub SPARQL server listening at %s", self.url)
+
+    def stop(self):
+        """Stop the server."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+    def clear_cache(self):
+        """Forget cached responses, e.g. after the data has changed."""
+        with self._lock:
+            self._responses.clear()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _handle_query(self, query: str, accept: str):
+        """Return (status, content type, body) for a query."""
+        with self._lock:
+            self.queries.append(query)
+            if (query, accept) in self._responses:
+                return self._responses[query, accept]
+        try:
+            result = self.answer(query)
+        except Exception as err:
+            # RDFox reports problems with the query text like this
+            return 400, "text/plain", f"ParsingException: {err}".encode("utf-8")
+        response = (200, *serialize_result(result, accept))
+        if self.cache:
+            with self._lock:
+                self._responses[query, accept] = response
+        return response
+
+    def _handle_content(self, method: str, accept: str, body: bytes):
+        """Return (status, content type, body) for a request for the data."""
+        if self.graph is None:
+            return 404, "text/plain", b"Not found"
+        if method == "GET":
+            format = "nt" if "n-triples" in accept else "turtle"
+            return 200, accept or "text/turtle", self.graph.serialize(format=format).encode("utf-8")
+        try:
+            with self._lock:
+                self.graph.parse(data=body.decode("utf-8"), format="turtle")
+                self._responses.clear()
+        except Exception as err:
+            return 400, "text/plain", f"ParsingException: {err}".encode("utf-8")
+        return 200, "text/plain", b""
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, status, content_type, body):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _query(self, query):
+                if query is None:
+                    self._respond(400, "text/plain", b"Missing query")
+                else:
+                    self._respond(*stub._handle_query(query, self.headers.get("Accept", "")))
+
+            def _route(self):
+                """Return the resource requested in the data store, or None
+                if there is no such data store."""
+                match = re.match(r"^/datastores/([^/]+)/(\w+)$", urlparse(self.path).path)
+                if match is None:
+                    return None
+                if stub.datastores is not None and match.group(1) not in stub.datastores:
+                    return None
+                return match.group(2)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/":
+                    self._respond(200, "application/sparql-results+json",
+                                  _server_info(stub.version))
+                    return
+                resource = self._route()
+                if resource == "sparql":
+                    self._query(parse_qs(url.query).get("query", [None])[0])
+                elif resource == "content":
+                    self._respond(*stub._handle_content("GET", self.headers.get("Accept", ""), b""))
+                else:
+                    self._respond(404, "text/plain", b"Not found")
+
+            def do_PATCH(self):
+                if self._route() != "content":
+                    self._respond(404, "text/plain", b"Not found")
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                self._respond(*stub._handle_content("PATCH", "", self.rfile.read(length)))
+
+            def do_POST(self):
+                if self._route() != "sparql":
+                    self._respond(404, "text/plain", b"Not found")
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length).decode("utf-8")
+                if self.headers.get("Content-Type", "").startswith("application/sparql-query"):
+                    self._query(body)
+                else:
+                    self._query(parse_qs(body).get("query", [None])[0])
+
+            def log_message(self, format, *args):
+                logger.debug("Stub SPARQL server: " + format, *args)
+
+        return Handler
+
+
+_VARIABLE_PATTERN = re.compile(r"\$\(([^)]+)\)")
+
+# Files the stub RDFox writes for each module, relative to the working directory
+MODULE_OUTPUTS = {
+    "data-conversion": "data/probs_original_data.nt.gz",
+    "kbc-hierarchy": "data/probs_enhanced_data.nt.gz",
+    "ontology-conversion": "data/probs_ontology_rules.dlog",
+    "data-validation": "data/valid.log",
+}
+
+
+def _rdf_format(path: Path) -> Optional[str]:
+    suffixes = [s for s in path.suffixes if s != ".gz"]
+    return {".nt": "nt", ".ttl": "turtle"}.get(suffixes[-1] if suffixes else "")
+
+
+class StubRDFox:
+    """Interpreter for the RDFox shell commands used by probs_runner.
+
+    See the module documentation for what is emulated.
+
+    :param root: the sandbox (working) directory
+    :param out: stream to write output to, like the RDFox shell
+    """
+
+    def __init__(self, root: Path, out=sys.stdout):
+        self.root = Path(root).resolve()
+        self.out = out
+        self.graph = Graph()
+        self.server: Optional[StubSPARQLServer] = None
+        # Copy of the data when the current transaction began
+        self.snapshot: Optional[Graph] = None
+        self.finished = False
+        # Stand-in for the module's prefixes.rdfox
+        self.prefixes = dict(NAMESPACES)
+        self.variables = {
+            "dir.root": f"{self.root}/",
+            "dir.facts": f"{self.root}/data",
+            "dir.scripts": f"{self.root}",
+            "version": DEFAULT_VERSION,
+        }
+
+    def _print(self, line: str):
+        print(line, file=self.out, flush=True)
+
+    def _substitute(self, text: str) -> str:
+        return _VARIABLE_PATTERN.sub(lambda m: self.variables.get(m.group(1), ""), text)
+
+    def _script_path(self, name: str) -> Optional[Path]:
+        for base in (Path(self.variables["dir.scripts"]), self.root):
+            for path in (base / name, base / f"{name}.rdfox"):
+                if path.is_file():
+                    return path
+        return None
+
+    def run_script(self, script: str):
+        """Run each command in `script`."""
+        for command in script.replace("\\\n", " ").splitlines():
+            if self.finished:
+                break
+            self.run_command(command)
+
+    def run_command(self, command: str):
+        """Run one RDFox shell command.
+
+        Errors are reported like RDFox, and stop the script if the `on-error`
+        variable is "stop".
+        """
+        try:
+            self._run_command(command)
+        except Exception as err:
+            self._print("An error occurred while executing the command:")
+            self._print(f"    {command.strip()}")
+            for line in str(err).splitlines():
+                self._print(f"    {line}")
+            if self.variables.get("on-error") == "stop":
+                self._print("Stopping shell evaluation due to 'on-error' policy")
+                self.finished = True
+
+    def _run_command(self, command: str):
+        try:
+            words = shlex.split(command, comments=True)
+        except ValueError:
+            words = command.split()
+        if not words:
+            return
+        name, args = words[0], [self._substitute(w) for w in words[1:]]
+
+        if name == "set" and len(args) >= 2:
+            self.variables[args[0]] = args[1]
+        elif name == "prefix" and len(args) >= 2:
+            self.prefixes[args[0].rstrip(":")] = args[1].strip("<>")
+        elif name == "echo":
+            self._print(" ".join(args))
+        elif name == "exec" and args:
+            match = re.fullmatch(r"scripts/([^/]+)/master(\.rdfox)?", args[0])
+            if match:
+                self.run_module(match.group(1))
+            else:
+                path = self._script_path(args[0])
+                if path is not None:
+                    self.run_script(path.read_text())
+        elif name == "import" and args:
+            remove = args[0] == "-"
+            for filename in args[1:] if args[0] in ("-", "+") else args:
+                self._import(Path(filename), remove)
+        elif name == "begin":
+            self.snapshot = Graph()
+            self.snapshot += self.graph
+        elif name == "commit":
+            self.snapshot = None
+        elif name == "rollback" and self.snapshot is not None:
+            # Restore in place, since the server answers from this graph
+            self.graph.remove((None, None, None))
+            self.graph += self.snapshot
+            self.snapshot = None
+            if self.server is not None:
+                self.server.clear_cache()
+        elif name == "endpoint" and args[:1] == ["start"]:
+            self.start_endpoint()
+        elif name == "quit":
+            self.finished = True
+        # Anything else (data sources, rules...) has no effect
+
+    def _import(self, path: Path, remove: bool):
+        if not path.is_absolute():
+            path = Path(self.variables["dir.facts"]) / path
+        format = _rdf_format(path)
+        if format is None:
+            return
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            data = f.read()
+        if format == "turtle":
+            data = "".join(f"@prefix {k}: <{v}> .\n" for k, v in self.prefixes.items()) + data
+        graph = Graph()
+        graph.parse(data=data, format=format)
+        if remove:
+            self.graph -= graph
+        else:
+            self.graph += graph
+        if self.server is not None:
+            self.server.clear_cache()
+
+    def run_module(self, module: str):
+        """Emulate the master script of `module`."""
+        self.variables["dir.scripts"] = str(self.root / "scripts" / module)
+        self.variables.setdefault("dir.output", f"{self.root}/data/")
+        load_data = self._script_path("load_data")
+        if load_data is not None:
+            self.run_script(load_data.read_text())
+
+        output = MODULE_OUTPUTS.get(module)
+        if output is not None:
+            path = self.root / output
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.name.endswith(".nt.gz"):
+                with gzip.open(path, "wb") as f:
+                    self.graph.serialize(f, format="nt", encoding="utf-8")
+            elif module == "data-validation":
+                path.write_text("Data validation (stub RDFox)\ntrue\n")
+            else:
+                path.write_text("")
+        elif module == "endpoint":
+            self.start_endpoint()
+
+    def start_endpoint(self):
+        """Start answering queries on the loaded data."""
+        if self.server is not None:
+            return
+        port = int(self.variables.get("endpoint.port", "12110"))
+        self.server = StubSPARQLServer(graph_answerer(self.graph), port=port, cache=True,
+                                       graph=self.graph)
+        self.server.start()
+        port = self.server.url.rpartition(":")[2]
+        self._print(f"The REST endpoint was successfully started at port number/service name {port}")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Run the stub RDFox, with the same arguments as `RDFox sandbox ROOT COMMAND...`."""
+    args = list(sys.argv[1:] if argv is None else argv)
+    if len(args) < 2 or args[0] != "sandbox":
+        print("Usage: stub-rdfox sandbox ROOT [COMMAND...]", file=sys.stderr)
+        return 2
+    rdfox = StubRDFox(Path(args[1]))
+    try:
+        for command in args[2:]:
+            if rdfox.finished:
+                break
+            rdfox.run_command(command)
+        if rdfox.server is not None:
+            # Keep answering queries, and run commands sent on stdin
+            for line in sys.stdin:
+                if rdfox.finished:
+                    break
+                rdfox.run_command(line)
+    finally:
+        rdfox.stop()
+    return 0
+
+
+def write_stub_executable(directory: os.PathLike) -> Path:
+    """Write an executable in `directory` which runs the stub RDFox.
+
+    Use the returned path as the RDFox executable, e.g. by setting the
+    `PROBS_RDFOX_EXECUTABLE` environment variable.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    if sys.platform == "win32":
+        path = directory / "stub-rdfox.cmd"
+        path.write_text(f'@"{sys.executable}" -m probs_runner.stub %*\r\n')
+    else:
+        path = directory / "stub-rdfox"
+        path.write_text(f"#!/bin/sh\nexec '{sys.executable}' -m probs_runner.stub \"$@\"\n")
+        path.chmod(0o755)
+    return path
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""Synthetic PRObs data for scaling tests and benchmarks.
+
+A :py:class:`SyntheticDataset` describes a dataset by its size and a random
+seed. The same description always produces the same data, and the data is
+generated as a stream, so that very large datasets can be written without
+holding them in memory::
+
+    dataset = SyntheticDataset(num_observations=10**7, seed=1)
+    dataset.write_ntriples("observations.nt.gz")
+    dataset.write_datasource("synthetic-datasource")
+
+The data includes:
+
+- observations with `:hasTime`, `:hasRegion`, `:hasMetric`, `:hasRole`,
+  `:hasBound` and `:measurement`, defined by an object and (for process inputs
+  and outputs) a process;
+- object and process hierarchies, as trees of `:objectComposedOf` and
+  `:processComposedOf`, with observations referring to the leaves. Each
+  object has a classification code (see :py:func:`classification_code`) and
+  each process is labelled with its name, so observations can be looked up by
+  `object_code` and `process_code`;
+- chains of observations linked by `prov:wasDerivedFrom`.
+
+:py:meth:`SyntheticDataset.write_datasource` writes the same observations
+(without the hierarchies) as a CSV file with a `load_data.rdfox` script and
+Datalog rules to map it to PRObs, like the sources used for data conversion.
+
+"""
+
+import csv
+import gzip
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from rdflib import Literal, Namespace, URIRef
+from rdflib.namespace import RDF, RDFS, XSD
+
+from .namespace import PROBS, PROV, QUANTITYKIND
+
+
+SYNTHETIC = Namespace("http://w3id.org/probs-lab/data/synthetic/")
+
+ROLES = (PROBS.ProcessOutput, PROBS.ProcessInput, PROBS.SoldProduction)
+
+CSV_COLUMNS = ("Id", "Year", "Region", "Role", "Object", "Process", "Value", "DerivedFrom")
+
+Triple = Tuple[URIRef, URIRef, object]
+
+
+def _tree(prefix: str, depth: int, branching: int) -> Iterator[Tuple[str, Optional[str]]]:
+    """Yield (node name, parent name) for a tree, breadth first."""
+    level = [prefix]
+    yield prefix, None
+    for _ in range(depth):
+        next_level = []
+        for parent in level:
+            for i in range(branching):
+                child = f"{parent}.{i}"
+                next_level.append(child)
+                yield child, parent
+        level = next_level
+
+
+def classification_code(name: str) -> str:
+    """The classification code of the object or process called `name`.
+
+    The code has two digits for each level below the root of the hierarchy,
+    e.g. "0103" for "Object.0.2", and "00" for the root.
+    """
+    return "".join(f"{int(i) + 1:02d}" for i in name.split(".")[1:]) or "00"
+
+
+def _leaves(prefix: str, depth: int, branching: int) -> List[str]:
+    leaves = [prefix]
+    for _ in range(depth):
+        leaves = [f"{parent}.{i}" for parent in leaves for i in range(branching)]
+    return leaves
+
+
+@dataclass
+class SyntheticDataset:
+    """Description of a synthetic PRObs dataset.
+
+    :param num_observations: number of observations
+    :param seed: random seed; the same seed always gives the same data
+    :param num_regions: number of distinct regions
+    :param num_years: number of distinct years, starting from 2000
+    :param hierarchy_depth: depth of the object and process hierarchies
+    :param hierarchy_branching: number of children of each object or process
+    :param derived_chain_length: observations are linked by
+        `prov:wasDerivedFrom` in chains of this length (1 for no links)
+
+    """
+
+    num_observations: int
+    seed: int = 0
+    num_regions: int = 50
+    num_years: int = 20
+    hierarchy_depth: int = 3
+    hierarchy_branching: int = 4
+    derived_chain_length: int = 5
+
+    @property
+    def objects(self) -> List[str]:
+        """Names of the objects observations refer to (the hierarchy leaves)."""
+        return _leaves("Object", self.hierarchy_depth, self.hierarchy_branching)
+
+    @property
+    def processes(self) -> List[str]:
+        """Names of the processes observations refer to (the hierarchy leaves)."""
+        return _leaves("Process", self.hierarchy_depth, self.hierarchy_branching)
+
+    def rows(self) -> Iterator[Tuple]:
+        """Yield the observations as tuples of values for :py:data:`CSV_COLUMNS`.
+
+        `Process` and `DerivedFrom` are None when not applicable.
+        """
+        rng = random.Random(self.seed)
+        objects = self.objects
+        processes = self.processes
+        chain_length = max(1, self.derived_chain_length)
+        for i in range(self.num_observations):
+            role = rng.choice(ROLES)
+            process = rng.choice(processes) if role != PROBS.SoldProduction else None
+            yield (
+                i,
+                2000 + rng.randrange(self.num_years),
+                f"Region-{rng.randrange(self.num_regions)}",
+                role[len(PROBS):],
+                rng.choice(objects),
+                process,
+                round(rng.uniform(0, 1000), 3),
+                i - 1 if i % chain_length else None,
+            )
+
+    def hierarchy_triples(self) -> Iterator[Triple]:
+        """Yield the triples describing the object and process hierarchies."""
+        for prefix, cls, composed_of in (("Object", PROBS.Object, PROBS.objectComposedOf),
+                                         ("Process", PROBS.Process, PROBS.processComposedOf)):
+            for name, parent in _tree(prefix, self.hierarchy_depth, self.hierarchy_branching):
+                node = SYNTHETIC[name]
+                yield node, RDF.type, cls
+                yield node, RDFS.label, Literal(name)
+                if cls == PROBS.Object:
+                    code = classification_code(name)
+                    yield node, PROBS.hasClassificationCode, SYNTHETIC[f"Code-{code}"]
+                    yield SYNTHETIC[f"Code-{code}"], RDFS.label, Literal(code)
+                if parent is not None:
+                    yield SYNTHETIC[parent], composed_of, node
+
+    def observation_triples(self) -> Iterator[Triple]:
+        """Yield the triples describing the observations."""
+        for i, year, region, role, object_, process, value, derived_from in self.rows():
+            obs = SYNTHETIC[f"Observation-{i}"]
+            yield obs, RDF.type, PROBS.Observation
+            yield obs, PROBS.hasTime, PROBS[f"TimePeriod_YearOf{year}"]
+            yield obs, PROBS.hasRegion, SYNTHETIC[region]
+            yield obs, PROBS.hasMetric, QUANTITYKIND.Mass
+            yield obs, PROBS.hasRole, PROBS[role]
+            yield obs, PROBS.objectDefinedBy, SYNTHETIC[object_]
+            if process is not None:
+                yield obs, PROBS.processDefinedBy, SYNTHETIC[process]
+            yield obs, PROBS.hasBound, PROBS.ExactBound
+            yield obs, PROBS.measurement, Literal(str(value), datatype=XSD.decimal)
+            if derived_from is not None:
+                yield obs, PROV.wasDerivedFrom, SYNTHETIC[f"Observation-{derived_from}"]
+
+    def triples(self) -> Iterator[Triple]:
+        """Yield all the triples of the dataset."""
+        yield from self.hierarchy_triples()
+        yield from self.observation_triples()
+
+    def write_ntriples(self, path) -> int:
+        """Write the dataset to an N-Triples file (gzipped if `path` ends in .gz).
+
+        :returns: the number of triples written
+        """
+        opener = gzip.open if str(path).endswith(".gz") else open
+        num_triples = 0
+        with opener(path, "wt", encoding="utf-8") as f:
+            for s, p, o in self.triples():
+                f.write(f"{s.n3()} {p.n3()} {o.n3()} .\n")
+                num_triples += 1
+        return num_triples
+
+    def write_datasource(self, directory) -> Path:
+        """Write the observations as a CSV datasource in `directory`.
+
+        The directory contains `data.csv`, `load_data.rdfox` and `map.dlog`,
+        and can be loaded with :py:func:`probs_runner.load_datasource`.
+
+        :returns: the path to the directory
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / "data.csv", "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_COLUMNS)
+            for row in self.rows():
+                writer.writerow(["" if x is None else x for x in row])
+        (directory / "load_data.rdfox").write_text(LOAD_DATA_SCRIPT)
+        (directory / "map.dlog").write_text(MAP_RULES)
+        return directory
+
+
+LOAD_DATA_SCRIPT = """\
+prefix synthetic: <http://w3id.org/probs-lab/data/synthetic/>
+
+dsource register "Synthetic"                                        \\
+    type    delimitedFile                                           \\
+    file    "$(dir.datasource)/data.csv"                            \\
+    header  true                                                    \\
+    quote   '"'
+
+tupletable create synthetic                                     \\
+    dataSourceName  "Synthetic"                                 \\
+    "columns"       8                                           \\
+    "1"             "{Id}"                                      \\
+    "1.datatype"    "string"                                    \\
+    "2"             "{Year}"                                    \\
+    "2.datatype"    "string"                                    \\
+    "3"             "{Region}"                                  \\
+    "3.datatype"    "string"                                    \\
+    "4"             "{Role}"                                    \\
+    "4.datatype"    "string"                                    \\
+    "5"             "{Object}"                                  \\
+    "5.datatype"    "string"                                    \\
+    "6"             "{Process}"                                 \\
+    "6.datatype"    "string"                                    \\
+    "6.if-empty"    "absent"                                    \\
+    "7"             "{Value}"                                   \\
+    "7.datatype"    "xsd:decimal"                               \\
+    "8"             "{DerivedFrom}"                             \\
+    "8.datatype"    "string"                                    \\
+    "8.if-empty"    "absent"
+"""
+
+MAP_RULES = """\
+# Map synthetic CSV rows to PRObs observations
+:Observation[?Obs] ,
+:hasTime[?Obs, ?Time] ,
+:hasRegion[?Obs, ?Region] ,
+:hasMetric[?Obs, <http://qudt.org/vocab/quantitykind/Mass>] ,
+:hasRole[?Obs, ?RoleID] ,
+:objectDefinedBy[?Obs, ?ObjectID] ,
+:hasBound[?Obs, :ExactBound] ,
+:measurement[?Obs, ?Value]
+    :- synthetic(?Id, ?Year, ?Region_, ?Role, ?Object, ?Process, ?Value, ?DerivedFrom),
+       BIND(IRI(CONCAT(STR(synthetic:), "Observation-", ?Id)) AS ?Obs),
+       BIND(IRI(CONCAT(STR(:), "TimePeriod_YearOf", ?Year)) AS ?Time),
+       BIND(IRI(CONCAT(STR(synthetic:), ?Region_)) AS ?Region),
+       BIND(IRI(CONCAT(STR(:), ?Role)) AS ?RoleID),
+       BIND(IRI(CONCAT(STR(synthetic:), ?Object)) AS ?ObjectID) .
+
+:processDefinedBy[?Obs, ?ProcessID]
+    :- synthetic(?Id, ?Year, ?Region, ?Role, ?Object, ?Process, ?Value, ?DerivedFrom),
+       BIND(IRI(CONCAT(STR(synthetic:), "Observation-", ?Id)) AS ?Obs),
+       BIND(IRI(CONCAT(STR(synthetic:), ?Process)) AS ?ProcessID) .
+
+<http://www.w3.org/ns/prov#wasDerivedFrom>[?Obs, ?Source]
+    :- synthetic(?Id, ?Year, ?Region, ?Role, ?Object, ?Process, ?Value, ?DerivedFrom),
+       BIND(IRI(CONCAT(STR(synthetic:), "Observation-", ?Id)) AS ?Obs),
+       BIND(IRI(CONCAT(STR(synthetic:), "Observation-", ?DerivedFrom)) AS ?Source) .
+"""
@@ -4,6 +4,7 @@ import sys
 import os
 import shutil
 import gzip
+import socket
 from tempfile import NamedTemporaryFile
 import logging
 
@@ -118,3 +119,15 @@ def copy_maybe_gzipped(
     else:
         # Just copy
         shutil.copy(source, target)
+
+
+def find_free_port() -> int:
+    """Return a TCP port number that is currently free on this host.
+
+    The port is found by binding to port 0 and letting the operating system
+    choose; it is released again before returning, so there is a small chance
+    that another process takes it first.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
@@ -9,3 +9,63 @@ from pathlib import Path
 def script_source_dir():
     script_source_dir = None
     return script_source_dir
+
+
+class _GraphResponse:
+    """Response with the answers to a query on a local rdflib Graph, in TSV
+    format as returned by RDFox."""
+
+    def __init__(self, graph, query):
+        self.result = graph.query(query)
+
+    def iter_lines(self):
+        from probs_runner.results import tsv_term
+        yield "\t".join(f"?{v}" for v in self.result.vars).encode()
+        for row in self.result:
+            yield "\t".join(tsv_term(x) for x in row).encode()
+
+    def iter_content(self, chunk_size=1):
+        for line in self.iter_lines():
+            yield line + b"\n"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+@pytest.fixture
+def graph_endpoint(monkeypatch):
+    """Make a PRObsEndpoint which answers queries from an rdflib Graph,
+    without needing RDFox. Raw queries sent are recorded in `sent_queries`."""
+    from probs_runner import PRObsEndpoint, NAMESPACES
+    from probs_runner.endpoint import _with_bindings
+
+    def _make(graph):
+        endpoint = PRObsEndpoint(NAMESPACES)
+        endpoint.sent_queries = []
+        # rdflib only keeps one prefix per namespace, so declare ":" last
+        prefixes = "".join(
+            f"PREFIX {k}: <{v}>\n"
+            for k, v in sorted(NAMESPACES.items(), key=lambda kv: kv[0] == "")
+        )
+
+        def query_raw(query, answer_format=None, idle_timeout=None):
+            endpoint.sent_queries.append(query)
+            return _GraphResponse(graph, prefixes + query)
+
+        def query_records(query, n3=False, initBindings=None):
+            # Bindings are sent to RDFox as a VALUES clause after the query,
+            # which (unlike rdflib's initBindings) is not in scope inside it
+            result = graph.query(prefixes + _with_bindings(query, initBindings))
+            return [
+                {str(c): endpoint._convert_value(v, n3) for c, v in zip(result.vars, row)}
+                for row in result
+            ]
+
+        monkeypatch.setattr(endpoint, "query_raw", query_raw)
+        monkeypatch.setattr(endpoint, "query_records", query_records)
+        return endpoint
+
+    return _make
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from click.testing import CliRunner
+
+from probs_runner import bench
+from probs_runner.bench import count_triples, run_benchmarks, compare_to_baseline
+from probs_runner.cli import cli
+
+
+def test_count_triples(tmp_path):
+    with gzip.open(tmp_path / "a.nt.gz", "wt") as f:
+        f.write("<a> <b> <c> .\n\n<a> <b> <d> .\n")
+    assert count_triples(tmp_path / "a.nt.gz") == 2
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/task"), reason="needs /proc")
+def test_child_peak_rss_is_measured_per_block():
+    def run_child(megabytes):
+        code = f"x = bytearray({megabytes} * 1024 * 1024); import time; time.sleep(0.5)"
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    with bench._ChildPeakRSS(interval=0.05) as big:
+        run_child(200)
+    with bench._ChildPeakRSS(interval=0.05) as small:
+        run_child(1)
+    assert big.peak_mb > 200
+    assert small.peak_mb < 100
+
+
+@pytest.fixture
+def fake_stages(monkeypatch):
+    """Replace the RDFox pipeline stages by copying the input."""
+    calls = []
+
+    def _fake(stage):
+        def run(input_path, output_dir, script_source_dir):
+            calls.append((stage, input_path.name))
+            if stage == "endpoint":
+                return None, 12.0
+            output = output_dir / f"{stage}.nt.gz"
+            output.write_bytes(input_path.read_bytes())
+            return output, 10.0
+        return run
+
+    monkeypatch.setattr(bench, "STAGES", {stage: _fake(stage) for stage in bench.STAGE_NAMES})
+    return calls
+
+
+def test_run_benchmarks(fake_stages):
+    results = run_benchmarks([5, 10], stages=["endpoint", "kbc"], repeats=2)
+
+    assert [(r["stage"], r["size"]) for r in results["results"]] == [
+        ("kbc", 5), ("endpoint", 5), ("kbc", 10), ("endpoint", 10)
+    ]
+    # Each stage runs on the output of the previous stage
+    assert fake_stages[:4] == [
+        ("kbc", "observations.nt.gz"), ("kbc", "observations.nt.gz"),
+        ("endpoint", "kbc.nt.gz"), ("endpoint", "kbc.nt.gz"),
+    ]
+    kbc, endpoint = results["results"][:2]
+    assert len(kbc["wall_time"]) == 2
+    assert kbc["input_triples"] == kbc["output_triples"] > 5 * 8
+    assert kbc["output_bytes"] > 0
+    assert endpoint["peak_rss_mb"] == 12.0
+    assert endpoint["output_bytes"] is None
+    json.dumps(results)
+
+    with pytest.raises(ValueError):
+        run_benchmarks([5], stages=["unknown"])
+
+
+def test_compare_to_baseline():
+    baseline = {"results": [
+        {"stage": "convert", "size": 10, "median_time": 1.0},
+        {"stage": "kbc", "size": 10, "median_time": 2.0},
+    ]}
+    results = {"results": [
+        {"stage": "convert", "size": 10, "median_time": 1.05},
+        {"stage": "kbc", "size": 10, "median_time": 3.0},
+        {"stage": "endpoint", "size": 10, "median_time": 3.0},
+    ]}
+    comparisons = compare_to_baseline(results, baseline, tolerance=0.1)
+    assert [(c["stage"], c["regression"]) for c in comparisons] == [
+        ("convert", False), ("kbc", True)
+    ]
+    assert comparisons[1]["ratio"] == 1.5
+
+
+def test_bench_command_fails_on_regression(fake_stages, tmp_path):
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"results": [
+        {"stage": "kbc", "size": 5, "median_time": 1e-9},
+    ]}))
+    output = tmp_path / "results.json"
+    result = CliRunner().invoke(cli, ["bench", "--size", "5", "--stage", "kbc", "-n", "1",
+                                      "-o", str(output), "--baseline", str(baseline)])
+    assert result.exit_code == 1
+    assert "REGRESSION" in result.output
+    results = json.loads(output.read_text())
+    assert results["baseline"]["comparisons"][0]["regression"]
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+import os
+from io import StringIO
+
+import pytest
+from rdflib import Graph, Literal, Namespace, URIRef, BNode, XSD
+
+from probs_runner import PRObsEndpoint, NAMESPACES, answer_queries
+from probs_runner.cache import AnswerCache, input_fingerprint
+
+
+EX = Namespace("http://example.org/")
+
+
+def test_answer_roundtrip(tmp_path):
+    cache = AnswerCache(tmp_path, "fp")
+    rows = [
+        {"s": EX.a, "v": Literal(1.5), "label": Literal("tab\tand\nnewline")},
+        {"s": EX.b, "v": None, "label": Literal("b", lang="en")},
+        {"s": EX.a, "v": Literal("2018", datatype=XSD.gYear), "label": None},
+    ]
+    assert cache.get("SELECT * WHERE {}") is None
+    cache.put("SELECT * WHERE {}", None, rows)
+    assert cache.get("SELECT  *\n  WHERE {}") == rows
+    assert cache.get("SELECT * WHERE {}", {"s": EX.a}) is None
+
+    cache.put("SELECT ?x WHERE {}", {"s": EX.a}, [])
+    assert cache.get("SELECT ?x WHERE {}", {"s": EX.a}) == []
+
+
+def test_fingerprint_differs_between_caches(tmp_path):
+    AnswerCache(tmp_path, "fp1").put("q", None, [{"x": EX.a}])
+    assert AnswerCache(tmp_path, "fp2").get("q") is None
+    assert AnswerCache(tmp_path, "fp1").get("q") == [{"x": EX.a}]
+
+
+def test_least_recently_used_answers_are_evicted(tmp_path):
+    cache = AnswerCache(tmp_path, "fp")
+    rows = [{"x": EX[f"item{i}"]} for i in range(20)]
+    for i, q in enumerate(["q1", "q2"]):
+        cache.put(q, None, rows)
+        path = cache._path(q, None)
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+    size = cache._path("q1", None).stat().st_size
+
+    # Reading q1 makes it the most recently used
+    assert cache.get("q1") is not None
+    cache.max_bytes = 2 * size + size // 2
+    cache.put("q3", None, rows)
+    assert cache.get("q2") is None
+    assert cache.get("q1") is not None
+    assert cache.get("q3") is not None
+
+
+def test_directory_is_only_scanned_when_over_the_limit(tmp_path, monkeypatch):
+    cache = AnswerCache(tmp_path, "fp")
+    scans = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: scans.append(1) or evict())
+    rows = [{"x": EX[f"item{i}"]} for i in range(20)]
+    for q in ["q1", "q2", "q3"]:
+        cache.put(q, None, rows)
+    assert len(scans) == 1
+
+    cache.max_bytes = 1
+    cache.put("q4", None, rows)
+    assert len(scans) == 2
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_concurrent_puts_of_the_same_answer(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    cache = AnswerCache(tmp_path, "fp")
+    rows = [{"x": EX[f"item{i}"]} for i in range(1000)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: cache.put("q", None, rows), range(32)))
+    assert cache.get("q") == rows
+    assert [p.suffix for p in tmp_path.iterdir()] == [".npz"]
+
+
+def test_input_fingerprint(tmp_path):
+    data = tmp_path / "data.csv"
+    data.write_text("a,b\n")
+    inputs = {"data/data.csv": data, "scripts/load_data.rdfox": StringIO("import data.csv")}
+    fp = input_fingerprint(inputs)
+    assert input_fingerprint(dict(reversed(list(inputs.items())))) == fp
+
+    assert input_fingerprint({**inputs, "scripts/load_data.rdfox": StringIO("")}) != fp
+    data.write_text("a,b,c\n")
+    assert input_fingerprint(inputs) != fp
+
+    # Small files are fingerprinted by content, not modification time
+    fp = input_fingerprint(inputs)
+    os.utime(data, ns=(0, 0))
+    assert input_fingerprint(inputs) == fp
+    data.write_text("a,b,d\n")
+    os.utime(data, ns=(0, 0))
+    assert input_fingerprint(inputs) != fp
+
+    # Directories are fingerprinted by their contents
+    (tmp_path / "scripts").mkdir()
+    fp = input_fingerprint({"scripts": tmp_path / "scripts"})
+    (tmp_path / "scripts" / "master.rdfox").write_text("")
+    assert input_fingerprint({"scripts": tmp_path / "scripts"}) != fp
+
+
+@pytest.fixture
+def cached_endpoint(tmp_path, monkeypatch):
+    graph = Graph()
+    graph.add((EX.a, EX.value, Literal(1)))
+    graph.add((EX.b, EX.value, Literal(2)))
+    prefixes = "".join(
+        f"PREFIX {k}: <{v}>\n"
+        for k, v in sorted(NAMESPACES.items(), key=lambda kv: kv[0] == "")
+    )
+    endpoint = PRObsEndpoint(NAMESPACES, cache=AnswerCache(tmp_path, "fp"))
+    endpoint.sent_queries = []
+
+    def query(query_object, initBindings=None):
+        endpoint.sent_queries.append(query_object)
+        return graph.query(prefixes + query_object, initBindings=initBindings)
+
+    monkeypatch.setattr(endpoint, "query", query)
+    return endpoint
+
+
+def test_query_records_uses_cache(cached_endpoint):
+    query = "SELECT ?s ?v WHERE { ?s <http://example.org/value> ?v } ORDER BY ?s"
+    expected = [{"s": EX.a, "v": 1}, {"s": EX.b, "v": 2}]
+    assert cached_endpoint.query_records(query) == expected
+    assert cached_endpoint.query_records(query) == expected
+    assert len(cached_endpoint.sent_queries) == 1
+
+    bindings = {"s": EX.b}
+    assert cached_endpoint.query_records(query, initBindings=bindings) == expected[1:]
+    assert cached_endpoint.query_records(query, initBindings=bindings) == expected[1:]
+    assert len(cached_endpoint.sent_queries) == 2
+
+
+def test_answer_queries_uses_cache(cached_endpoint):
+    queries = {"values": "SELECT ?v WHERE { ?s <http://example.org/value> ?v } ORDER BY ?v"}
+    first = answer_queries(cached_endpoint, queries)
+    assert answer_queries(cached_endpoint, queries) == first == {"values": [{"v": 1}, {"v": 2}]}
+    assert len(cached_endpoint.sent_queries) == 1
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+from pathlib import Path
+
+import click
+import pytest
+from click.testing import CliRunner
+from rdflib import Graph, Literal, Namespace, RDF, RDFS
+
+from probs_runner import PROBS, PROV
+from probs_runner.cli import (
+    cli,
+    _inspect_observations_data,
+    _inspect_observation_graphviz,
+    _inspect,
+    _SubjectCache,
+    _write_state,
+    _connect_url,
+)
+
+
+EX = Namespace("http://example.org/")
+
+
+def _observations_graph(n):
+    graph = Graph()
+    for i in range(n):
+        obs = EX[f"Obs{i}"]
+        graph.add((obs, RDF.type, PROBS.Observation))
+        graph.add((obs, PROBS.hasRegion, PROBS.RegionGBR))
+        graph.add((obs, PROBS.hasTime, PROBS.TimePeriod_YearOf2018))
+        graph.add((obs, PROBS.hasRole, PROBS.SoldProduction))
+        graph.add((obs, PROBS.measurement, Literal(float(i))))
+        graph.add((obs, PROBS.objectDirectlyDefinedBy, EX.Bread))
+        if i > 0:
+            graph.add((obs, PROV.wasDerivedFrom, EX[f"Obs{i - 1}"]))
+    graph.add((EX.Bread, RDFS.label, Literal("Bread")))
+    return graph
+
+
+def test_inspect_observations_data_uses_one_query(graph_endpoint):
+    endpoint = graph_endpoint(_observations_graph(5))
+    data = {s: (values, labels) for s, values, labels in _inspect_observations_data(endpoint)}
+
+    assert len(endpoint.sent_queries) == 1
+    assert set(data) == {f"<http://example.org/Obs{i}>" for i in range(5)}
+    values, labels = data["<http://example.org/Obs3>"]
+    assert values["probs:hasRegion"] == {"probs:RegionGBR"}
+    assert values["probs:measurement"] == {3.0}
+    assert labels == {"<http://example.org/Bread>": "Bread"}
+
+
+def test_inspect_observation_graphviz(graph_endpoint, capsys):
+    endpoint = graph_endpoint(_observations_graph(2))
+    for s, values, labels in _inspect_observations_data(endpoint):
+        _inspect_observation_graphviz(s, values, labels)
+
+    out = capsys.readouterr().out
+    assert '"<http://example.org/Obs1>" [shape=record' in out
+    assert "Bread" in out
+    assert '-> "<http://example.org/Obs1>" [dir=back' in out
+
+
+def test_inspect_subject_cache_prefetches_neighbours(graph_endpoint, capsys):
+    endpoint = graph_endpoint(_observations_graph(5))
+    with _SubjectCache(endpoint, prefetch_hops=2) as cache:
+        _inspect(endpoint, "http://example.org/Obs4", cache)
+        cache.close()  # wait for prefetching to finish
+
+        # One query for Obs4, then one per hop: {Obs3, Bread}, {Obs2}
+        assert len(endpoint.sent_queries) == 3
+        assert "VALUES" in endpoint.sent_queries[1]
+
+        # Prefetched subjects, and prefixed names, need no more queries
+        cache.prefetch_hops = 0
+        _inspect(endpoint, "<http://example.org/Obs3>", cache)
+        _inspect(endpoint, "http://example.org/Obs2", cache)
+        _inspect(endpoint, "http://example.org/Bread", cache)
+        assert len(endpoint.sent_queries) == 3
+
+    out = capsys.readouterr().out
+    assert "prov:wasDerivedFrom\n   <http://example.org/Obs1>" in out
+    assert "rdfs:label\n   Bread" in out
+
+
+def test_inspect_subject_not_found(graph_endpoint, capsys):
+    endpoint = graph_endpoint(_observations_graph(1))
+    _inspect(endpoint, "probs:Missing")
+    assert "** Nothing found!" in capsys.readouterr().out
+
+
+def test_connect_url_from_state_file(tmp_path):
+    state_file = tmp_path / "state.json"
+    _write_state(state_file, "http://localhost:12345", [Path("data.nt.gz")])
+    state = json.loads(state_file.read_text())
+    assert state["pid"] == os.getpid()
+    assert state["inputs"] == ["data.nt.gz"]
+
+    assert _connect_url(str(state_file)) == "http://localhost:12345"
+    assert _connect_url("http://localhost:1/") == "http://localhost:1"
+    with pytest.raises(click.ClickException, match="serve"):
+        _connect_url(str(tmp_path / "missing.json"))
+
+
+def test_connect_excludes_inputs(tmp_path):
+    data = tmp_path / "data.nt"
+    data.write_text("")
+    result = CliRunner().invoke(cli, ["query", str(data), "--connect", "http://localhost:1",
+                                      "-q", "SELECT * WHERE {}"])
+    assert result.exit_code != 0
+    assert "Cannot pass both INPUTS and --connect" in result.output
+
+
+def test_query_answers_many_queries(graph_endpoint, monkeypatch, tmp_path):
+    endpoint = graph_endpoint(_observations_graph(3))
+    monkeypatch.setattr("probs_runner.runners.connect_to_endpoint", lambda url: endpoint)
+
+    queries = tmp_path / "queries"
+    queries.mkdir()
+    (queries / "count.rq").write_text("SELECT (COUNT(*) AS ?n) WHERE { ?s a :Observation }")
+    (queries / "values.rq").write_text(
+        "SELECT ?s ?v WHERE { ?s :measurement ?v } ORDER BY ?s"
+    )
+    (queries / "notes.txt").write_text("not a query")
+    extra = tmp_path / "labels.rq"
+    extra.write_text("SELECT ?label WHERE { ?x rdfs:label ?label } ORDER BY ?label")
+
+    output_dir = tmp_path / "out"
+    result = CliRunner().invoke(cli, [
+        "query", "--connect", "http://localhost:1",
+        "-Q", str(queries), "-Q", str(extra),
+        "-f", "tsv", "-o", str(output_dir), "-j", "2",
+    ])
+    assert result.exit_code == 0, result.output
+    assert sorted(p.name for p in output_dir.iterdir()) == ["count.tsv", "labels.tsv", "values.tsv"]
+    assert (output_dir / "count.tsv").read_text().splitlines()[1].startswith('"3"')
+    assert (output_dir / "labels.tsv").read_text().splitlines() == ["?label", '"Bread"']
+    assert len(endpoint.sent_queries) == 3
+
+
+def test_query_file_from_stdin(graph_endpoint, monkeypatch, tmp_path):
+    endpoint = graph_endpoint(_observations_graph(3))
+    monkeypatch.setattr("probs_runner.runners.connect_to_endpoint", lambda url: endpoint)
+    output_dir = tmp_path / "out"
+    result = CliRunner().invoke(cli, [
+        "query", "--connect", "http://localhost:1", "-Q", "-", "-f", "tsv", "-o", str(output_dir),
+    ], input="SELECT ?label WHERE { ?x rdfs:label ?label }")
+    assert result.exit_code == 0, result.output
+    assert (output_dir / "query.tsv").read_text().splitlines() == ["?label", '"Bread"']
+
+
+@pytest.mark.parametrize("output_format, header", [("tsv", "?s\t?o"), ("csv", "s,o")])
+def test_query_pages_writes_header_for_empty_result(graph_endpoint, monkeypatch, tmp_path,
+                                                    output_format, header):
+    endpoint = graph_endpoint(_observations_graph(3))
+    monkeypatch.setattr("probs_runner.runners.connect_to_endpoint", lambda url: endpoint)
+    output_dir = tmp_path / "out"
+    result = CliRunner().invoke(cli, [
+        "query", "--connect", "http://localhost:1", "-o", str(output_dir),
+        "-q", "SELECT ?s ?o WHERE { ?s <http://example.org/missing> ?o } ORDER BY ?s",
+        "-f", output_format, "--page-size", "2",
+    ])
+    assert result.exit_code == 0, result.output
+    assert (output_dir / f"query.{output_format}").read_text().splitlines() == [header]
+
+
+def test_query_pages_escapes_tsv_literals(graph_endpoint, monkeypatch, tmp_path):
+    graph = Graph()
+    graph.add((EX.a, RDFS.label, Literal("tab\there")))
+    graph.add((EX.b, RDFS.label, Literal("two\nlines")))
+    endpoint = graph_endpoint(graph)
+    monkeypatch.setattr("probs_runner.runners.connect_to_endpoint", lambda url: endpoint)
+    output_dir = tmp_path / "out"
+    result = CliRunner().invoke(cli, [
+        "query", "--connect", "http://localhost:1", "-o", str(output_dir),
+        "-q", "SELECT ?s ?label WHERE { ?s rdfs:label ?label } ORDER BY ?s",
+        "-f", "tsv", "--page-size", "1",
+    ])
+    assert result.exit_code == 0, result.output
+    lines = (output_dir / "query.tsv").read_text().splitlines()
+    assert lines == [
+        "?s\t?label",
+        '<http://example.org/a>\t"tab\\there"',
+        '<http://example.org/b>\t"two\\nlines"',
+    ]
+
+
+def test_query_needs_output_dir_for_many_queries(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / f"{name}.rq").write_text("SELECT * WHERE {}")
+    result = CliRunner().invoke(cli, ["query", "-Q", str(tmp_path)])
+    assert result.exit_code != 0
+    assert "--output-dir" in result.output
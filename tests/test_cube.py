@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from rdflib import Graph, Literal, Namespace, RDF, RDFS
+
+from probs_runner import PROBS, QUANTITYKIND, ObservationCube
+
+
+EX = Namespace("http://example.org/")
+
+
+@pytest.fixture
+def endpoint(graph_endpoint):
+    graph = Graph()
+    rows = [
+        ("Obs1", PROBS.RegionGBR, PROBS.ProcessOutput, EX.Bread, EX.Baking, 1.0),
+        ("Obs2", PROBS.RegionGBR, PROBS.ProcessOutput, EX.Cake, EX.Baking, 2.0),
+        ("Obs3", PROBS.RegionGBR, PROBS.ProcessInput, EX.Flour, EX.Baking, 4.0),
+        ("Obs4", PROBS.RegionFRA, PROBS.ProcessOutput, EX.Bread, EX.Baking, 8.0),
+        ("Obs5", PROBS.RegionGBR, PROBS.SoldProduction, EX.Bread, None, 16.0),
+    ]
+    for name, region, role, object_, process, value in rows:
+        obs = EX[name]
+        graph.add((obs, RDF.type, PROBS.Observation))
+        graph.add((obs, PROBS.hasTime, PROBS.TimePeriod_YearOf2018))
+        graph.add((obs, PROBS.hasRegion, region))
+        graph.add((obs, PROBS.hasMetric, QUANTITYKIND.Mass))
+        graph.add((obs, PROBS.hasRole, role))
+        graph.add((obs, PROBS.hasBound, PROBS.ExactBound))
+        graph.add((obs, PROBS.objectDefinedBy, object_))
+        if process is not None:
+            graph.add((obs, PROBS.processDefinedBy, process))
+        graph.add((obs, PROBS.measurement, Literal(value)))
+    graph.add((EX.Bread, PROBS.hasClassificationCode, EX.Code1234))
+    graph.add((EX.Code1234, RDFS.label, Literal("1234")))
+    graph.add((EX.Baking, RDFS.label, Literal("B1")))
+    return graph_endpoint(graph)
+
+
+LOOKUPS = [
+    dict(role=PROBS.ProcessOutput),
+    dict(role=PROBS.ProcessOutput, object_=EX.Bread),
+    dict(role=PROBS.ProcessOutput, object_=EX.Bread, process=EX.Baking),
+    dict(role=PROBS.ProcessInput, process=EX.Baking),
+    dict(role=PROBS.SoldProduction, object_code="1234"),
+    dict(role=PROBS.ProcessOutput, object_code="1234", process_code="B1"),
+    dict(role=PROBS.ProcessOutput, object_code="9999"),
+    dict(role=PROBS.ProcessOutput, object_=EX.Missing),
+]
+
+
+@pytest.mark.parametrize("lookup", LOOKUPS)
+def test_cube_matches_endpoint(endpoint, lookup):
+    cube = endpoint.load_cube()
+    assert len(cube) == 5
+    dims = dict(time=PROBS.TimePeriod_YearOf2018, region=PROBS.RegionGBR,
+                metric=QUANTITYKIND.Mass)
+    expected = endpoint.get_observations(**dims, **lookup)
+    key = lambda obs: obs.uri
+    assert sorted(cube.get_observations(**dims, **lookup), key=key) == sorted(expected, key=key)
+
+
+def test_cube_save_and_load(endpoint, tmp_path):
+    cube = endpoint.load_cube()
+    cube.save(tmp_path / "cube.npz")
+    loaded = ObservationCube.load(tmp_path / "cube.npz")
+
+    dims = dict(time=PROBS.TimePeriod_YearOf2018, region=PROBS.RegionGBR,
+                metric=QUANTITYKIND.Mass, role=PROBS.SoldProduction)
+    assert loaded.get_observations(**dims, object_code="1234") == \
+        cube.get_observations(**dims, object_code="1234")
+    assert len(loaded.get_observations(**dims, object_code="1234")) == 1
+
+
+def test_code_lookup_ignores_label_language_and_datatype(graph_endpoint):
+    from rdflib.namespace import XSD
+    graph = Graph()
+    obs = EX.Obs1
+    graph.add((obs, RDF.type, PROBS.Observation))
+    graph.add((obs, PROBS.hasTime, PROBS.TimePeriod_YearOf2018))
+    graph.add((obs, PROBS.hasRegion, PROBS.RegionGBR))
+    graph.add((obs, PROBS.hasMetric, QUANTITYKIND.Mass))
+    graph.add((obs, PROBS.hasRole, PROBS.ProcessOutput))
+    graph.add((obs, PROBS.hasBound, PROBS.ExactBound))
+    graph.add((obs, PROBS.objectDefinedBy, EX.Bread))
+    graph.add((obs, PROBS.processDefinedBy, EX.Baking))
+    graph.add((obs, PROBS.measurement, Literal(1.0)))
+    graph.add((EX.Bread, PROBS.hasClassificationCode, EX.Code1234))
+    graph.add((EX.Code1234, RDFS.label, Literal("1234", lang="en")))
+    graph.add((EX.Baking, RDFS.label, Literal("B1", datatype=XSD.token)))
+    endpoint = graph_endpoint(graph)
+
+    dims = dict(time=PROBS.TimePeriod_YearOf2018, region=PROBS.RegionGBR,
+                metric=QUANTITYKIND.Mass, role=PROBS.ProcessOutput)
+    lookup = dict(object_code="1234", process_code="B1")
+    assert [o.uri for o in endpoint.get_observations(**dims, **lookup)] == [obs]
+    assert [o.uri for o in endpoint.load_cube().get_observations(**dims, **lookup)] == [obs]
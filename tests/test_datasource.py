@@ -192,3 +192,73 @@ def test_datasource_accepts_file_objects_in_dict(tmp_path):
     p.write_text(":Farming a :Process .\n")
     with open(p) as f:
         a = Datasource.from_files({"data.ttl": f})
+
+
+def _triples(n):
+    from rdflib import Literal, Namespace, RDF
+    from probs_runner import PROBS
+    ex = Namespace("http://example.org/")
+    for i in range(n):
+        yield ex[f"Obs{i}"], RDF.type, PROBS.Observation
+        yield ex[f"Obs{i}"], PROBS.measurement, Literal(f"line {i}\n\"quoted\"")
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_datasource_from_triples_streams_to_file(compress, monkeypatch):
+    from rdflib import Graph
+    monkeypatch.setattr("probs_runner.datasource.TRIPLES_BATCH_SIZE", 4)
+    ds = Datasource.from_triples(_triples(3), compress=compress)
+    [(target, path)] = ds.input_files.items()
+    assert re.fullmatch(r"data/[0-9a-f]{32}\.nt" + (r"\.gz" if compress else ""),
+                        str(target))
+    assert f'import "$(dir.datasource){target.name}"' in ds.load_data_script
+
+    opener = gzip.open if compress else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        graph = Graph().parse(data=f.read(), format="nt")
+    assert set(graph) == set(_triples(3))
+
+
+def test_datasource_from_graph_is_named_by_content():
+    from rdflib import Graph
+    graph = Graph()
+    for triple in _triples(2):
+        graph.add(triple)
+    a = Datasource.from_graph(graph)
+    b = Datasource.from_graph(graph)
+    c = Datasource.from_triples(_triples(1))
+    assert list(a.input_files) == list(b.input_files)
+    assert list(a.input_files) != list(c.input_files)
+
+
+def test_datasource_from_triples_removes_file_when_collected():
+    import gc
+    ds = Datasource.from_triples(_triples(1))
+    [path] = ds.input_files.values()
+    assert path.exists()
+    del ds
+    gc.collect()
+    assert not path.exists()
+
+
+def test_datasource_close_removes_file():
+    with Datasource.from_triples(_triples(1)) as ds:
+        [path] = ds.input_files.values()
+        assert path.exists()
+    assert not path.exists()
+    # Closing again, or a datasource without temporary files, does nothing
+    ds.close()
+    Datasource().close()
+
+
+def test_datasource_from_dataframe_writes_csv_in_chunks(monkeypatch):
+    import pandas as pd
+    monkeypatch.setattr("probs_runner.datasource.DATAFRAME_CHUNK_SIZE", 2)
+    df = pd.DataFrame({"Object": ["a", "b", "c", "d", "e"], "Value": [1, 2, 3, 4, 5]})
+    ds = Datasource.from_dataframe(df, StringIO("import data"))
+    [(target, path)] = ds.input_files.items()
+    assert re.fullmatch(r"data/[0-9a-f]{32}/data\.csv", target.as_posix())
+    assert ds.load_data_script.startswith(
+        f'set dir.datasource "$(dir.facts)/{target.parent.name}/"\n')
+    assert pd.read_csv(path).equals(df)
+
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from probs_runner.export import column_kind, decode_batch, write_tsv_lines
+
+
+TSV = b"""?obj\t?value\t?label
+<http://example.org/Bread>\t6.0\t"Bread"
+<http://example.org/Cake>\t\t"Cake"@en
+<http://example.org/Bread>\t"3"^^<http://www.w3.org/2001/XMLSchema#integer>\t
+"""
+
+
+def test_column_kind():
+    assert column_kind(["<http://example.org/a>", ""]) == "iri"
+    assert column_kind(["1.5", ""]) == "numeric"
+    assert column_kind(['"a"', "<http://example.org/a>"]) == "string"
+    assert column_kind(["", ""]) == "string"
+
+
+def test_decode_batch_checks_kinds():
+    decoded = decode_batch(["x"], [['"a"', ""]], {"x": "string"})
+    assert decoded == {"x": ["a", None]}
+    with pytest.raises(ValueError, match="same type"):
+        decode_batch(["x"], [["<http://example.org/a>"]], {"x": "numeric"})
+
+
+def test_write_parquet_in_row_groups(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "result.parquet"
+    assert write_tsv_lines(TSV.splitlines(), path, row_group_size=2) == 3
+
+    f = pq.ParquetFile(path)
+    assert f.num_row_groups == 2
+    table = f.read()
+    assert table.column("obj").to_pylist() == [
+        "http://example.org/Bread", "http://example.org/Cake", "http://example.org/Bread"
+    ]
+    assert table.column("value").to_pylist() == [6.0, None, 3.0]
+    assert table.column("label").to_pylist() == ["Bread", "Cake", None]
+
+
+def test_write_arrow_stream(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+    path = tmp_path / "result.arrow"
+    write_tsv_lines(TSV.splitlines(), path, format="arrow", row_group_size=2)
+    with open(path, "rb") as f:
+        table = pa.ipc.open_stream(f).read_all()
+    assert table.column("value").to_pylist() == [6.0, None, 3.0]
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_write_widens_column_to_strings(tmp_path, format):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+    import pyarrow.parquet
+    lines = TSV.splitlines() + [b'<http://example.org/Pie>\t<http://example.org/x>\t"Pie"']
+    path = tmp_path / "result"
+    assert write_tsv_lines(iter(lines), path, format=format, row_group_size=2) == 4
+
+    if format == "parquet":
+        table = pyarrow.parquet.read_table(path)
+    else:
+        with open(path, "rb") as f:
+            table = pa.ipc.open_stream(f).read_all()
+    assert table.column("value").type == pa.string()
+    assert table.column("value").to_pylist() == ["6.0", None, "3", "http://example.org/x"]
+    assert table.column("obj").to_pylist()[-1] == "http://example.org/Pie"
+
+
+def test_write_to_file_object(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "result.parquet"
+    with open(path, "wb") as f:
+        assert write_tsv_lines(TSV.splitlines(), f, row_group_size=2) == 3
+    assert pq.read_table(path).num_rows == 3
+
+
+def test_write_removes_partial_file_on_error(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "result.parquet"
+
+    def lines():
+        yield from TSV.splitlines()
+        raise ConnectionError("response ended early")
+
+    with pytest.raises(ConnectionError):
+        write_tsv_lines(lines(), path, row_group_size=2)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,66 @@
+"""Check that the command line starts quickly.
+
+Each check runs in a fresh Python process, since modules imported by other
+tests would otherwise already be loaded.
+"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+
+# Modules which take a long time to import, and are not needed to parse the
+# command line
+HEAVY_MODULES = ["pandas", "numpy", "rdflib", "rdfox_runner", "requests", "pyarrow"]
+
+# Generous budget for importing the command line module (seconds), to catch
+# heavy imports being added back without failing on slow machines. Importing
+# pandas alone takes longer than this.
+IMPORT_TIME_BUDGET = 0.3
+
+
+def _run_python(code):
+    result = subprocess.run([sys.executable, "-c", code],
+                            capture_output=True, text=True, check=True)
+    return result
+
+
+@pytest.mark.parametrize("args", [["--help"], ["query", "--help"], ["inspect", "--help"]])
+def test_cli_help_does_not_import_heavy_modules(args):
+    code = f"""
+import json, sys
+from probs_runner.cli import cli
+cli.main({args!r}, standalone_mode=False)
+print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))
+"""
+    output = _run_python(code).stdout
+    assert json.loads(output.splitlines()[-1]) == []
+
+
+def test_cli_import_time():
+    # -X importtime reports the cumulative time (in microseconds) for each
+    # module on stderr
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import probs_runner.cli"],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative) / 1e6
+    assert times["probs_runner.cli"] < IMPORT_TIME_BUDGET
+
+
+def test_package_names_are_imported_when_used():
+    code = """
+import sys
+import probs_runner
+assert "probs_runner.runners" not in sys.modules
+from probs_runner import probs_endpoint, PROBS
+assert "probs_runner.runners" in sys.modules
+assert probs_runner.PROBS is PROBS
+print("ok")
+"""
+    assert _run_python(code).stdout.strip() == "ok"
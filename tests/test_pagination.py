@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from rdflib import Graph, Literal, Namespace, URIRef, XSD
+
+from probs_runner.pagination import split_ordered_query, page_query
+
+
+EX = Namespace("http://example.org/")
+
+
+def test_split_ordered_query():
+    prologue, body, keys = split_ordered_query("""
+        PREFIX ex: <http://example.org/>
+        SELECT ?s ?o WHERE { ?s ex:p ?o } ORDER BY ?s ASC(?o)
+    """)
+    assert prologue.strip() == "PREFIX ex: <http://example.org/>"
+    assert body == "SELECT ?s ?o WHERE { ?s ex:p ?o }"
+    assert keys == ["s", "o"]
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT ?s WHERE { ?s ?p ?o }",
+    "SELECT ?s WHERE { ?s ?p ?o } ORDER BY DESC(?s)",
+    "SELECT ?s WHERE { ?s ?p ?o } ORDER BY ?s LIMIT 10",
+])
+def test_split_ordered_query_rejects_unsupported_queries(query):
+    with pytest.raises(ValueError):
+        split_ordered_query(query)
+
+
+@pytest.fixture
+def endpoint(graph_endpoint):
+    graph = Graph()
+    for i in range(25):
+        graph.add((EX[f"s{i:02d}"], EX.value, Literal(i % 7)))
+        graph.add((EX[f"s{i:02d}"], EX.other, EX[f"o{i % 3}"]))
+    graph.add((EX.s00, EX.label, Literal("zero")))
+    return graph_endpoint(graph)
+
+
+def test_iter_pages_matches_unpaginated_query(endpoint):
+    query = "SELECT ?s ?p ?o WHERE { ?s ?p ?o } ORDER BY ?s ?p ?o"
+    expected = list(endpoint.iter_records(query))
+    assert len(expected) == 51
+
+    pages = list(endpoint.iter_pages(query, page_size=10))
+    assert [len(page) for page in pages] == [10, 10, 10, 10, 10, 1]
+    assert [row for page in pages for row in page] == expected
+
+
+def test_iter_pages_with_unbound_keys(endpoint):
+    query = """
+        SELECT ?s ?label WHERE { ?s <http://example.org/value> ?v OPTIONAL { ?s <http://example.org/label> ?label } }
+        ORDER BY ?label ?s
+    """
+    expected = list(endpoint.iter_records(query))
+    pages = list(endpoint.iter_pages(query, page_size=4))
+    assert [row for page in pages for row in page] == expected
+    assert pages[-1][-1] == {"s": EX.s00, "label": "zero"}
+
+
+def test_iter_pages_with_variables_yields_empty_first_page(endpoint):
+    query = "SELECT ?s ?o WHERE { ?s <http://example.org/missing> ?o } ORDER BY ?s"
+    pages = list(endpoint.iter_pages(query, page_size=10, with_variables=True))
+    assert pages == [(["s", "o"], [])]
+
+
+def test_iter_pages_rejects_mixed_key_types(graph_endpoint):
+    graph = Graph()
+    for i in range(5):
+        graph.add((EX[f"s{i}"], EX.value, Literal(i)))
+    graph.add((EX.s5, EX.value, Literal("2.5", datatype=XSD.decimal)))
+    endpoint = graph_endpoint(graph)
+    query = "SELECT ?v ?s WHERE { ?s <http://example.org/value> ?v } ORDER BY ?v ?s"
+    with pytest.raises(ValueError, match="different types"):
+        list(endpoint.iter_pages(query, page_size=2))
+
+
+def test_page_query_filters_inside_where_clause():
+    query = page_query("", "SELECT ?s ?o WHERE { ?s ?p ?o }", ["s"], 5,
+                       ["s", "o"], {"s": URIRef("http://example.org/s1"), "o": Literal(1)})
+    assert query.startswith("SELECT ?s ?o WHERE { ?s ?p ?o\n    FILTER")
+    assert Graph().query(query) is not None
+
+
+def test_page_query_wraps_grouped_query():
+    body = "SELECT ?s (COUNT(?o) AS ?n) WHERE { ?s ?p ?o } GROUP BY ?s"
+    query = page_query("", body, ["s"], 5, ["s", "n"], {"s": URIRef("http://example.org/s1")})
+    assert "{ " + body + " }" in query
+
+
+def test_page_query_uses_last_row():
+    query = page_query("", "SELECT ?s ?o WHERE { ?s ?p ?o }", ["s"], 5,
+                       ["s", "o"], {"s": URIRef("http://example.org/s1"), "o": Literal(1)})
+    assert '"http://example.org/s1"' in query
+    assert "LIMIT 5" in query
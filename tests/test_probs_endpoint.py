@@ -2,15 +2,22 @@
 
 from pathlib import Path
 import gzip
+import logging
+import pandas as pd
+import pytest
 
-from rdflib import Namespace, Graph, Literal, URIRef
+from rdflib import Namespace, Graph, Literal, URIRef, RDF
+from rdflib.plugins.sparql import prepareQuery
 
 from probs_runner import (
     PROBS, QUANTITYKIND,
     load_datasource,
     probs_endpoint,
+    probs_endpoints,
     answer_queries,
     Observation,
+    PRObsEndpoint,
+    NAMESPACES,
 )
 
 
@@ -42,6 +49,13 @@ def test_probs_endpoint(tmp_path, script_source_dir):
         result2 = answer_queries(rdfox, {"q1": query})
         assert result2["q1"] == result
 
+        # Streamed results are the same
+        assert list(rdfox.iter_records(query)) == result
+
+        # Answering concurrently gives the same results, in order
+        result3 = answer_queries(rdfox, [query, query], parallel=2)
+        assert result3 == {0: result, 1: result}
+
 
 def test_probs_endpoint_get_observations(tmp_path, script_source_dir):
     output_filename = tmp_path / "output.nt.gz"
@@ -164,7 +178,8 @@ def test_probs_endpoint_get_observations_by_process_code(tmp_path, script_source
 
 
 
-def test_probs_endpoint_get_observations_by_object_code(tmp_path, script_source_dir):
+@pytest.mark.parametrize("use_code_index", [False, True])
+def test_probs_endpoint_get_observations_by_object_code(tmp_path, script_source_dir, use_code_index):
     output_filename = tmp_path / "output.nt.gz"
     with gzip.open(output_filename, "wt") as f:
         f.write("""
@@ -189,7 +204,8 @@ def test_probs_endpoint_get_observations_by_object_code(tmp_path, script_source_
 
 
     with probs_endpoint(
-        output_filename, tmp_path, script_source_dir, port=12159
+        output_filename, tmp_path, script_source_dir, port=12159,
+        use_code_index=use_code_index,
     ) as rdfox:
         result = rdfox.get_observations(
             time=PROBS.TimePeriod_YearOf2016,
@@ -223,4 +239,269 @@ def test_probs_endpoint_get_observations_by_object_code(tmp_path, script_source_
         assert result2 == []
 
 
+def test_get_observations_queries_are_valid_sparql():
+    # One fixed query for each object/process variant; the values are all
+    # passed as bindings.
+    # rdflib only keeps one prefix per namespace, so declare ":" last
+    prefixes = "".join(
+        f"PREFIX {k}: <{v}>\n" for k, v in sorted(NAMESPACES.items(), key=lambda kv: kv[0] == "")
+    )
+    assert len(PRObsEndpoint.obs_queries) == 9
+    for query in PRObsEndpoint.obs_queries.values():
+        prepareQuery(prefixes + query)
+        assert "%" not in query
+
+
+def test_get_observations_uses_code_index(monkeypatch):
+    endpoint = PRObsEndpoint(NAMESPACES, use_code_index=True)
+    obj = URIRef("http://example.org/prodcom/Object-1234")
+    queries = []
+
+    def query_records(query, initBindings=None):
+        queries.append((query, initBindings))
+        if query == endpoint.query_object_codes:
+            return [{"code": "1234", "uri": obj}]
+        if query == endpoint.query_process_codes:
+            return []
+        return [{"obs": URIRef("http://example.org/Obs"), "measurement": 3.0,
+                 "bound": PROBS.ExactBound, "object": obj, "process": None}]
+
+    monkeypatch.setattr(endpoint, "query_records", query_records)
+
+    dims = dict(time=PROBS.TimePeriod_YearOf2016, region=PROBS.RegionGBR,
+                metric=QUANTITYKIND.Mass, role=PROBS.SoldProduction)
+    result = endpoint.get_observations(**dims, object_code="1234")
+    assert [obs.object_ for obs in result] == [obj]
+    assert endpoint.get_observations(**dims, object_code="2345") == []
+
+    # Index built once, and the code is bound as a URI
+    observation_queries = [(q, b) for q, b in queries if b is not None]
+    assert len(queries) == 3
+    assert observation_queries == [(endpoint.obs_queries["uri", None], {**dims, "object": obj})]
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def iter_lines(self):
+        return iter(self.text.encode("utf-8").splitlines())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def test_iter_records_parses_tsv_incrementally(monkeypatch):
+    endpoint = PRObsEndpoint(NAMESPACES)
+    tsv = (
+        "?obj\t?value\n"
+        "<http://w3id.org/probs-lab/ontology/data/simple/Object-Bread>\t"
+        "\"6\"^^<http://www.w3.org/2001/XMLSchema#double>\n"
+        "<http://w3id.org/probs-lab/ontology/data/simple/Object-Cake>\t\n"
+        "<http://w3id.org/probs-lab/ontology/data/simple/Object-Milk>\t3\n"
+    )
+    monkeypatch.setattr(endpoint, "query_raw",
+                        lambda query, answer_format, idle_timeout: _FakeResponse(tsv))
+
+    SIMPLE = Namespace("http://w3id.org/probs-lab/ontology/data/simple/")
+    expected = [
+        {"obj": SIMPLE["Object-Bread"], "value": 6.0},
+        {"obj": SIMPLE["Object-Cake"], "value": None},
+        {"obj": SIMPLE["Object-Milk"], "value": 3},
+    ]
+    assert list(endpoint.iter_records("query")) == expected
+    assert list(endpoint.iter_records("query", batch_size=2)) == [expected[:2], expected[2:]]
+
+
+def test_answer_queries_parallel_preserves_order(monkeypatch):
+    endpoint = PRObsEndpoint(NAMESPACES)
+    answers = {f"q{i}": f"?x\n{i}\n" for i in range(10)}
+    monkeypatch.setattr(endpoint, "query_raw",
+                        lambda query, answer_format, idle_timeout: _FakeResponse(answers[query]))
+
+    result = answer_queries(endpoint, {k: k for k in answers}, parallel=4)
+    assert list(result) == list(answers)
+    assert result == {f"q{i}": [{"x": i}] for i in range(10)}
+
+
+def test_answer_queries_parallel_without_query_many():
+    class Endpoint:
+        def query_records(self, query):
+            return [{"x": query}]
+
+    result = answer_queries(Endpoint(), {"a": "q1", "b": "q2"}, parallel=True)
+    assert result == {"a": [{"x": "q1"}], "b": [{"x": "q2"}]}
+
+
+def test_get_observations_frame(monkeypatch):
+    endpoint = PRObsEndpoint(NAMESPACES)
+    sent = []
+    tsv = (
+        "?obs\t?measurement\t?bound\t?process\t?object\n"
+        f"<http://example.org/Obs>\t8551330.0\t<{PROBS.ExactBound}>\t\t<http://example.org/unfccc/N2O>\n"
+    )
+
+    def query_raw(query, answer_format, idle_timeout):
+        sent.append(query)
+        return _FakeResponse(tsv)
+
+    monkeypatch.setattr(endpoint, "query_raw", query_raw)
+
+    df = endpoint.get_observations_frame(
+        time=PROBS.TimePeriod_YearOf2018,
+        region=PROBS.RegionGBR,
+        metric=QUANTITYKIND.Mass,
+        role=PROBS.ProcessOutput,
+        object_=URIRef("http://example.org/unfccc/N2O"),
+    )
+    assert list(df["obs"]) == ["http://example.org/Obs"]
+    assert list(df["measurement"]) == [8551330.0]
+    assert list(df["object"]) == ["http://example.org/unfccc/N2O"]
+    assert "VALUES" in sent[0] and "<http://example.org/unfccc/N2O>" in sent[0]
+
+
+def _observations_graph():
+    graph = Graph()
+    EX = Namespace("http://example.org/")
+    rows = [
+        ("Obs1", PROBS.RegionGBR, PROBS.ProcessOutput, 1.0),
+        ("Obs2", PROBS.RegionGBR, PROBS.ProcessOutput, 2.0),
+        ("Obs3", PROBS.RegionGBR, PROBS.ProcessInput, 4.0),
+        ("Obs4", PROBS.RegionFRA, PROBS.ProcessOutput, 8.0),
+    ]
+    for name, region, role, value in rows:
+        obs = EX[name]
+        graph.add((obs, RDF.type, PROBS.Observation))
+        graph.add((obs, PROBS.hasTime, PROBS.TimePeriod_YearOf2018))
+        graph.add((obs, PROBS.hasRegion, region))
+        graph.add((obs, PROBS.hasMetric, QUANTITYKIND.Mass))
+        graph.add((obs, PROBS.hasRole, role))
+        graph.add((obs, PROBS.measurement, Literal(value)))
+    return graph
+
+
+def test_aggregate_observations(graph_endpoint):
+    endpoint = graph_endpoint(_observations_graph())
+
+    df = endpoint.aggregate_observations(group_by=["region"],
+                                         filters={"role": PROBS.ProcessOutput})
+    assert list(df["region"]) == [str(PROBS.RegionFRA), str(PROBS.RegionGBR)]
+    assert list(df["value"]) == [8.0, 3.0]
+
+    df = endpoint.aggregate_observations(agg="count")
+    assert list(df["value"]) == [4]
+
+    df = endpoint.aggregate_observations(
+        group_by=["role"], filters={"region": [PROBS.RegionGBR, PROBS.RegionFRA]}, agg="max"
+    )
+    assert dict(zip(df["role"], df["value"])) == {
+        str(PROBS.ProcessInput): 4.0,
+        str(PROBS.ProcessOutput): 8.0,
+    }
+
+
+def test_aggregate_observations_checks_arguments():
+    endpoint = PRObsEndpoint(NAMESPACES)
+    with pytest.raises(ValueError):
+        endpoint.aggregate_observations(group_by=["colour"])
+    with pytest.raises(ValueError):
+        endpoint.aggregate_observations(agg="median")
+
+
+def test_probs_endpoint_auto_port(tmp_path, script_source_dir):
+    output_filename = tmp_path / "output.nt.gz"
+    with gzip.open(output_filename, "wt") as f:
+        f.write('<http://example.org/a> <http://example.org/b> <http://example.org/c> .\n')
+
+    # Two endpoints can run at once without choosing ports
+    with probs_endpoint(output_filename, tmp_path / "w1", script_source_dir, port="auto") as rdfox1, \
+         probs_endpoint(output_filename, tmp_path / "w2", script_source_dir, port=0) as rdfox2:
+        assert rdfox1.server != rdfox2.server
+        assert rdfox1.query_records("SELECT ?s WHERE { ?s ?p ?o }") == \
+            rdfox2.query_records("SELECT ?s WHERE { ?s ?p ?o }")
+
+
+def test_probs_endpoints_separate_stores(tmp_path, script_source_dir):
+    for name in ("a", "b"):
+        with gzip.open(tmp_path / f"{name}.nt.gz", "wt") as f:
+            f.write(f'<http://example.org/{name}> <http://example.org/p> "{name}" .\n')
+
+    query = "SELECT ?s WHERE { ?s <http://example.org/p> ?o }"
+    with probs_endpoints(
+        {"a": tmp_path / "a.nt.gz", "b": [tmp_path / "b.nt.gz"]},
+        tmp_path / "working", script_source_dir, port="auto",
+    ) as stores:
+        assert stores["a"].server == stores["b"].server
+        assert stores["a"].query_records(query) == [{"s": URIRef("http://example.org/a")}]
+        assert list(stores["b"].iter_records(query)) == [{"s": URIRef("http://example.org/b")}]
+
+
+def test_probs_endpoints_checks_store_names(tmp_path):
+    with pytest.raises(ValueError, match="Invalid data store name"):
+        with probs_endpoints({"not/valid": tmp_path / "a.nt.gz"}):
+            pass
+
+
+def test_probs_endpoint_add_and_remove_datasources(tmp_path, script_source_dir):
+    for name in ("a", "b"):
+        with gzip.open(tmp_path / f"{name}.nt.gz", "wt") as f:
+            f.write(f'<http://example.org/{name}> <http://example.org/p> "{name}" .\n')
+
+    query = "SELECT ?s WHERE { ?s <http://example.org/p> ?o } ORDER BY ?s"
+    with probs_endpoint(
+        tmp_path / "a.nt.gz", tmp_path / "working", script_source_dir, port="auto"
+    ) as rdfox:
+        assert rdfox.query_records(query) == [{"s": URIRef("http://example.org/a")}]
+
+        rdfox.add_datasources(tmp_path / "b.nt.gz", timeout=30)
+        assert rdfox.query_records(query) == [
+            {"s": URIRef("http://example.org/a")},
+            {"s": URIRef("http://example.org/b")},
+        ]
+
+        rdfox.remove_datasources(tmp_path / "a.nt.gz", timeout=30)
+        assert rdfox.query_records(query) == [{"s": URIRef("http://example.org/b")}]
+
+
+def test_add_datasources_needs_runner():
+    with pytest.raises(RuntimeError):
+        PRObsEndpoint(NAMESPACES).add_datasources([])
+
+
+def test_profiling_records_streamed_queries(monkeypatch):
+    endpoint = PRObsEndpoint(NAMESPACES, profile_queries=True)
+    tsv = "?x\n1\n2\n3\n"
+    monkeypatch.setattr(endpoint, "query_raw",
+                        lambda query, answer_format, idle_timeout: _FakeResponse(tsv))
+
+    assert len(list(endpoint.iter_records("SELECT ?x WHERE {}"))) == 3
+    assert len(endpoint.query_frame("SELECT ?x WHERE {}")) == 3
+
+    [record, _] = endpoint.profiler.records
+    assert record.rows == 3
+    assert record.bytes == len(tsv)
+    assert record.first_byte_time is None
+    assert endpoint.stats()["SELECT ?x WHERE {}"]["count"] == 2
+
+
+def test_stats_requires_profiling():
+    with pytest.raises(RuntimeError):
+        PRObsEndpoint(NAMESPACES).stats()
+
+
+def test_answer_queries_only_builds_dataframes_for_logging(monkeypatch, caplog):
+    endpoint = PRObsEndpoint(NAMESPACES)
+    monkeypatch.setattr(endpoint, "query_records", lambda query: [{"x": 1}])
+    built = []
+    monkeypatch.setattr(pd.DataFrame, "from_records",
+                        classmethod(lambda cls, v: built.append(v) or pd.DataFrame(v)))
 
+    with caplog.at_level(logging.WARNING, logger="probs_runner.runners"):
+        answer_queries(endpoint, ["q"])
+    assert built == []
+    with caplog.at_level(logging.INFO, logger="probs_runner.runners"):
+        answer_queries(endpoint, ["q"])
+    assert built == [[{"x": 1}]]
@@ -164,3 +164,48 @@ def test_enhance_data_string_path(tmp_path, script_source_dir):
         tmp_path / "working_enhanced",
         script_source_dir,
     )
+
+
+def test_removal_script():
+    from probs_runner.runners import _removal_script
+
+    script = (
+        'set dir.datasource "$(dir.facts)/abc/"\n'
+        '# Auto generated to load data files\n'
+        'import "$(dir.datasource)data.ttl"\n'
+        'dsource register "Simple"    \\\n'
+        '    type delimitedFile\n'
+    )
+    assert _removal_script(script) == (
+        'set dir.datasource "$(dir.facts)/abc/"\n'
+        'import - "$(dir.datasource)data.ttl"'
+    )
+
+
+def test_runner_records_multiline_error_before_marker():
+    import threading
+    from probs_runner.runners import _PRObsRunner
+
+    runner = _PRObsRunner({}, "")
+    done = runner._markers["marker"] = threading.Event()
+    for line in ["An error occurred while executing the command:",
+                 "    import foo.ttl",
+                 "    File foo.ttl cannot be parsed",
+                 "marker"]:
+        runner._check_for_errors(line)
+    assert done.is_set()
+    assert runner.errors == ["import foo.ttl\nFile foo.ttl cannot be parsed"]
+
+
+def test_runner_forgets_pending_error():
+    from probs_runner.runners import _PRObsRunner
+
+    runner = _PRObsRunner({}, "")
+    for line in ["An error occurred while executing the command:",
+                 "    import foo.ttl"]:
+        runner._check_for_errors(line)
+    # e.g. after timing out waiting for the commands
+    runner._clear_pending_error()
+    for line in ["Error: rollback failed", "done"]:
+        runner._check_for_errors(line)
+    assert runner.errors == ["Error: rollback failed"]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+from probs_runner.profiling import QueryProfiler, query_template
+
+
+def test_query_template_ignores_bindings_and_literals():
+    query = """
+        SELECT ?obs WHERE { ?obs rdfs:label "Bread" }
+        VALUES ( ?time ?region )
+        { ( <http://example.org/2018> <http://example.org/GBR> ) }
+    """
+    assert query_template(query) == 'SELECT ?obs WHERE { ?obs rdfs:label ? }'
+    assert query_template(query.replace("Bread", "Cake")) == query_template(query)
+
+
+def test_stats_grouped_by_template():
+    profiler = QueryProfiler()
+    profiler.record('SELECT ?x WHERE { ?x ?p "a" }', 0.002, rows=1, bytes=10)
+    profiler.record('SELECT ?x WHERE { ?x ?p "b" }', 0.5, rows=3, bytes=30)
+    profiler.record("SELECT ?y WHERE { ?y ?p ?o }", 2.0, first_byte_time=1.5)
+
+    stats = profiler.stats()
+    assert set(stats) == {'SELECT ?x WHERE { ?x ?p ? }', "SELECT ?y WHERE { ?y ?p ?o }"}
+
+    x = stats['SELECT ?x WHERE { ?x ?p ? }']
+    assert x["count"] == 2
+    assert x["total_time"] == 0.502
+    assert x["max_time"] == 0.5
+    assert x["rows"] == 4
+    assert x["bytes"] == 40
+    assert x["histogram"][0.003] == 1
+    assert x["histogram"][1.0] == 1
+    assert sum(x["histogram"].values()) == 2
+
+
+def test_slowest_and_report():
+    profiler = QueryProfiler()
+    for i, t in enumerate([0.1, 3.0, 0.5]):
+        profiler.record(f"SELECT ?x{i} WHERE {{}}", t)
+
+    assert [r.wall_time for r in profiler.slowest(2)] == [3.0, 0.5]
+    lines = profiler.report(2).splitlines()
+    assert len(lines) == 3
+    assert "SELECT ?x1" in lines[1]
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import pstats
+import threading
+import time
+
+from click.testing import CliRunner
+
+from probs_runner.cli import cli
+from probs_runner.pyprofile import RunProfiler, classify_stack
+
+
+def test_classify_stack():
+    cli_frame = "/site-packages/probs_runner/cli.py"
+    endpoint_frame = "/site-packages/probs_runner/endpoint.py"
+    assert classify_stack([cli_frame, "/lib/python3/json/decoder.py"]) == "Python"
+    assert classify_stack([cli_frame, endpoint_frame, "/lib/python3/socket.py"]) == "RDFox"
+    assert classify_stack([cli_frame, "/site-packages/rdfox_runner/command_runner.py",
+                           "/lib/python3/subprocess.py"]) == "RDFox"
+    # Waiting, but not for RDFox
+    assert classify_stack([cli_frame, "/lib/python3/threading.py"]) == "Waiting"
+
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_run_profiler_labels_samples(tmp_path):
+    with RunProfiler(sample_interval=0.001) as profiler:
+        _busy(0.1)
+        threading.Event().wait(0.1)
+
+    times = profiler.label_times()
+    assert times["Python"] > 0
+    assert times["Waiting"] > 0
+    assert times["RDFox"] == 0
+    assert abs(sum(times.values()) - profiler.wall_time) < 1e-6
+
+    prof_path, collapsed_path = profiler.write(tmp_path / "run.prof")
+    assert prof_path == tmp_path / "run.prof"
+    assert collapsed_path == tmp_path / "run.collapsed"
+    stats = pstats.Stats(str(prof_path))
+    assert any(func[2] == "_busy" for func in stats.stats)
+    lines = collapsed_path.read_text().splitlines()
+    assert any(line.startswith("Python;") and "_busy" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_run_profiler_without_sampling(tmp_path):
+    with RunProfiler(sample_interval=None) as profiler:
+        _busy(0.01)
+    assert profiler.write(tmp_path / "run") == (tmp_path / "run.prof",)
+    assert "Wall time" in profiler.report()
+
+
+def test_profile_option(tmp_path):
+    output = tmp_path / "data.nt"
+    profile = tmp_path / "profile" / "run"
+    result = CliRunner().invoke(cli, ["--profile", str(profile),
+                                      "generate-data", str(output), "-n", "10"])
+    assert result.exit_code == 0, result.output
+    assert output.exists()
+    assert (tmp_path / "profile" / "run.prof").exists()
+    assert (tmp_path / "profile" / "run.collapsed").exists()
+    assert "waiting for RDFox" in result.output
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from probs_runner.results import decode_tsv_columns
+
+
+def _lines(text):
+    return text.encode("utf-8").splitlines()
+
+
+def test_decode_tsv_columns_types():
+    df = decode_tsv_columns(_lines(
+        "?obs\t?measurement\t?label\n"
+        "<http://example.org/Obs1>\t\"6\"^^<http://www.w3.org/2001/XMLSchema#double>\t\"a\"\n"
+        "<http://example.org/Obs2>\t3\t\"b\"@en\n"
+        "<http://example.org/Obs1>\t\t\n"
+    ))
+
+    assert list(df.columns) == ["obs", "measurement", "label"]
+
+    assert df["measurement"].dtype == np.float64
+    np.testing.assert_array_equal(df["measurement"], [6.0, 3.0, np.nan])
+
+    assert isinstance(df["obs"].dtype, pd.CategoricalDtype)
+    assert list(df["obs"].cat.categories) == ["http://example.org/Obs1", "http://example.org/Obs2"]
+    assert list(df["obs"].cat.codes) == [0, 1, 0]
+
+    assert list(df["label"][:2]) == ["a", "b"]
+    assert df["label"].isna()[2]
+
+
+def test_decode_tsv_columns_non_numeric_literals_are_not_floats():
+    df = decode_tsv_columns(_lines(
+        "?x\n"
+        "\"6\"\n"
+        "true\n"
+    ))
+    assert list(df["x"]) == ["6", True]
+
+
+def test_decode_tsv_columns_empty():
+    df = decode_tsv_columns(_lines("?a\t?b\n"))
+    assert list(df.columns) == ["a", "b"]
+    assert len(df) == 0
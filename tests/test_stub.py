@@ -0,0 +1,212 @@
+"""Tests for the stub SPARQL server used to test and benchmark without RDFox."""
+
+import gzip
+
+import pytest
+import requests
+from rdflib import Graph, Literal, URIRef
+
+from probs_runner import PRObsEndpoint, NAMESPACES, PROBS
+from probs_runner.stub import StubSPARQLServer, graph_answerer
+
+
+@pytest.fixture
+def graph():
+    g = Graph()
+    g.add((PROBS.Obs1, PROBS.measurement, Literal(3.5)))
+    g.add((PROBS.Obs2, PROBS.measurement, Literal(2)))
+    return g
+
+
+def test_endpoint_connects_and_queries(graph):
+    with StubSPARQLServer(graph_answerer(graph)) as server:
+        rdfox = PRObsEndpoint(NAMESPACES)
+        rdfox.connect(server.url)
+        assert str(rdfox.rdfox_version) == "6.3.1"
+
+        query = "SELECT ?obs ?value WHERE { ?obs :measurement ?value } ORDER BY ?obs"
+        # Parsed by rdflib from XML
+        assert rdfox.query_records(query) == [
+            {"obs": PROBS.Obs1, "value": 3.5},
+            {"obs": PROBS.Obs2, "value": 2},
+        ]
+        # Parsed from TSV
+        assert list(rdfox.query_frame(query)["value"]) == [3.5, 2.0]
+        assert len(server.queries) == 2
+
+
+def test_cache_reuses_responses(graph):
+    calls = []
+
+    def answer(query):
+        calls.append(query)
+        return graph.query(query)
+
+    query = "SELECT ?s WHERE { ?s ?p ?o }"
+    with StubSPARQLServer(answer, cache=True) as server:
+        for _ in range(2):
+            res = requests.get(f"{server.url}/datastores/default/sparql",
+                               params={"query": query},
+                               headers={"Accept": "text/tab-separated-values"})
+            assert res.text.splitlines()[0] == "?s"
+    assert calls == [query]
+    assert server.queries == [query, query]
+
+
+def test_tsv_escapes_literals():
+    g = Graph()
+    g.add((PROBS.Obs1, PROBS.label, Literal("tab\there")))
+    g.add((PROBS.Obs2, PROBS.label, Literal("two\nlines")))
+    query = "SELECT ?label WHERE { ?obs ?p ?label } ORDER BY ?obs"
+    with StubSPARQLServer(graph_answerer(g)) as server:
+        res = requests.get(f"{server.url}/datastores/default/sparql",
+                           params={"query": query},
+                           headers={"Accept": "text/tab-separated-values"})
+        rdfox = PRObsEndpoint(NAMESPACES)
+        rdfox.connect(server.url)
+        assert rdfox.query_frame(query)["label"].tolist() == ["tab\there", "two\nlines"]
+    assert res.text.splitlines() == ["?label", '"tab\\there"', '"two\\nlines"']
+
+
+def test_bad_query_is_a_parsing_error(graph):
+    with StubSPARQLServer(graph_answerer(graph)) as server:
+        res = requests.get(f"{server.url}/datastores/default/sparql",
+                           params={"query": "SELECT nonsense"})
+    assert res.status_code == 400
+    assert "ParsingException" in res.text
+
+
+def test_facts_and_add_triples_use_endpoint_datastore(graph):
+    server = StubSPARQLServer(graph_answerer(graph), graph=graph, datastores=["observations"])
+    with server:
+        rdfox = PRObsEndpoint(NAMESPACES, datastore="observations")
+        rdfox.connect(server.url)
+        rdfox.add_triples([(PROBS.Obs3, PROBS.measurement, Literal(5))])
+        facts = Graph().parse(data=rdfox.facts(), format="turtle")
+        assert (PROBS.Obs3, PROBS.measurement, Literal(5)) in facts
+        assert len(facts) == 3
+
+        default = PRObsEndpoint(NAMESPACES)
+        default.connect(server.url)
+        with pytest.raises(Exception, match="Failed to retrieve facts"):
+            default.facts()
+
+
+def test_url_needs_running_server(graph):
+    server = StubSPARQLServer(graph_answerer(graph))
+    with pytest.raises(RuntimeError):
+        server.url
+
+
+@pytest.fixture
+def stub_rdfox(tmp_path, monkeypatch):
+    """Use the stub RDFox, with empty module scripts, for the runner functions.
+
+    Returns the script source directory to use.
+    """
+    from probs_runner.stub import write_stub_executable
+    monkeypatch.setenv("PROBS_RDFOX_EXECUTABLE", str(write_stub_executable(tmp_path / "bin")))
+    script_source_dir = tmp_path / "modules"
+    for module in ("data-conversion", "data-validation", "kbc-hierarchy", "endpoint"):
+        d = script_source_dir / "scripts" / module
+        d.mkdir(parents=True)
+        (d / "master.rdfox").write_text("# not run by the stub RDFox\n")
+    return script_source_dir
+
+
+def _write_ntriples(path, triples):
+    g = Graph()
+    for triple in triples:
+        g.add(triple)
+    g.serialize(path, format="nt", encoding="utf-8")
+    return path
+
+
+def test_stub_rdfox_convert_data(stub_rdfox, tmp_path):
+    from probs_runner import probs_convert_data
+    data = _write_ntriples(tmp_path / "data.nt", [(PROBS.Obs1, PROBS.measurement, Literal(3))])
+    output = tmp_path / "converted.nt.gz"
+    probs_convert_data([data], output, script_source_dir=stub_rdfox)
+
+    result = Graph()
+    with gzip.open(output, "rb") as f:
+        result.parse(f, format="nt")
+    assert set(result) == {(PROBS.Obs1, PROBS.measurement, Literal(3))}
+
+
+def test_stub_rdfox_convert_data_from_triples(stub_rdfox, tmp_path):
+    from probs_runner import Datasource, probs_convert_data
+    triples = [(PROBS[f"Obs{i}"], PROBS.measurement, Literal(i)) for i in range(3)]
+    output = tmp_path / "converted.nt.gz"
+    probs_convert_data([Datasource.from_triples(iter(triples), compress=True)],
+                       output, script_source_dir=stub_rdfox)
+
+    result = Graph()
+    with gzip.open(output, "rb") as f:
+        result.parse(f, format="nt")
+    assert set(result) == set(triples)
+
+
+def test_stub_rdfox_validate_data(stub_rdfox, tmp_path):
+    from probs_runner import probs_validate_data
+    data = _write_ntriples(tmp_path / "data.nt", [(PROBS.Obs1, PROBS.measurement, Literal(3))])
+    assert probs_validate_data([data], script_source_dir=stub_rdfox) is True
+
+
+def test_stub_rdfox_endpoint(stub_rdfox, tmp_path):
+    from probs_runner import probs_endpoint
+    data1 = _write_ntriples(tmp_path / "data1.nt", [(PROBS.Obs1, PROBS.measurement, Literal(3))])
+    data2 = _write_ntriples(tmp_path / "data2.nt", [(PROBS.Obs2, PROBS.measurement, Literal(4))])
+    query = "SELECT ?obs WHERE { ?obs :measurement ?value } ORDER BY ?obs"
+
+    with probs_endpoint([data1], port="auto", script_source_dir=stub_rdfox) as rdfox:
+        assert rdfox.runner.pid is not None
+        assert rdfox.query_records(query) == [{"obs": PROBS.Obs1}]
+        rdfox.add_datasources([data2], timeout=10)
+        assert rdfox.query_records(query) == [{"obs": PROBS.Obs1}, {"obs": PROBS.Obs2}]
+        rdfox.remove_datasources([data1], timeout=10)
+        assert rdfox.query_records(query) == [{"obs": PROBS.Obs2}]
+
+
+def test_stub_rdfox_endpoint_rolls_back_failed_update(stub_rdfox, tmp_path):
+    from probs_runner import probs_endpoint
+    data1 = _write_ntriples(tmp_path / "data1.nt", [(PROBS.Obs1, PROBS.measurement, Literal(3))])
+    data2 = _write_ntriples(tmp_path / "data2.nt", [(PROBS.Obs2, PROBS.measurement, Literal(4))])
+    bad = tmp_path / "bad.nt"
+    bad.write_text("not N-Triples\n")
+    query = "SELECT ?obs WHERE { ?obs :measurement ?value } ORDER BY ?obs"
+
+    with probs_endpoint([data1], port="auto", script_source_dir=stub_rdfox) as rdfox:
+        # The error is the last output before the commands finish
+        with pytest.raises(RuntimeError, match="bad.nt"):
+            rdfox.add_datasources([data2, bad], timeout=10)
+        assert rdfox.query_records(query) == [{"obs": PROBS.Obs1}]
+
+
+def test_stub_rdfox_endpoint_recopies_changed_files(stub_rdfox, tmp_path):
+    from probs_runner import probs_endpoint
+    data1 = _write_ntriples(tmp_path / "data1.nt", [(PROBS.Obs1, PROBS.measurement, Literal(3))])
+    data2 = _write_ntriples(tmp_path / "data2.nt", [(PROBS.Obs2, PROBS.measurement, Literal(4))])
+    query = "SELECT ?obs WHERE { ?obs :measurement ?value } ORDER BY ?obs"
+
+    with probs_endpoint([data1], port="auto", script_source_dir=stub_rdfox) as rdfox:
+        rdfox.add_datasources([data2], timeout=10)
+        rdfox.remove_datasources([data2], timeout=10)
+        _write_ntriples(data2, [(PROBS.Obs3, PROBS.measurement, Literal(5))])
+        rdfox.add_datasources([data2], timeout=10)
+        assert rdfox.query_records(query) == [{"obs": PROBS.Obs1}, {"obs": PROBS.Obs3}]
+
+
+def test_stub_rdfox_version(stub_rdfox):
+    import os
+    from rdfox_runner.run_rdfox import get_rdfox_version
+    version = get_rdfox_version(os.environ["PROBS_RDFOX_EXECUTABLE"])
+    assert str(version) == "6.3.1"
+
+
+def test_stub_rdfox_reports_errors(stub_rdfox, tmp_path):
+    from probs_runner import probs_endpoints, Datasource
+    with pytest.raises(RuntimeError, match="RDFox errors"):
+        with probs_endpoints({"bad": Datasource.from_facts(":x :y")}, port="auto",
+                             script_source_dir=stub_rdfox):
+            pass
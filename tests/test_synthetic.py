@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import gzip
+from itertools import islice
+
+from click.testing import CliRunner
+from rdflib import Graph
+
+from probs_runner import PROBS, PROV, load_datasource
+from probs_runner.cli import cli
+from probs_runner.synthetic import (
+    SyntheticDataset, SYNTHETIC, CSV_COLUMNS, classification_code
+)
+
+
+def test_generation_is_deterministic():
+    a = list(SyntheticDataset(50, seed=1).triples())
+    assert a == list(SyntheticDataset(50, seed=1).triples())
+    assert a != list(SyntheticDataset(50, seed=2).triples())
+
+
+def test_triples_are_streamed():
+    # Taking the first triples of a huge dataset should be instant
+    triples = list(islice(SyntheticDataset(10**12).observation_triples(), 5))
+    assert len(triples) == 5
+
+
+def test_observations_and_hierarchies(tmp_path):
+    dataset = SyntheticDataset(20, hierarchy_depth=2, hierarchy_branching=3,
+                               derived_chain_length=4)
+    path = tmp_path / "data.nt.gz"
+    num_triples = dataset.write_ntriples(path)
+
+    graph = Graph()
+    with gzip.open(path) as f:
+        graph.parse(f, format="nt")
+    assert len(graph) == num_triples
+
+    observations = set(graph.subjects(predicate=PROBS.hasRole))
+    assert len(observations) == 20
+    for obs in observations:
+        for p in (PROBS.hasTime, PROBS.hasRegion, PROBS.hasMetric, PROBS.objectDefinedBy,
+                  PROBS.measurement):
+            assert graph.value(obs, p) is not None
+
+    # 1 + 3 + 9 objects, linked by 12 composition triples
+    assert len(set(graph.subjects(predicate=None, object=PROBS.Object))) == 13
+    assert len(list(graph.triples((None, PROBS.objectComposedOf, None)))) == 12
+    leaves = {SYNTHETIC[o] for o in dataset.objects}
+    assert set(graph.objects(predicate=PROBS.objectDefinedBy)) <= leaves
+
+    # Chains of 4: observations 1, 2, 3 derived from the one before, 4 is not
+    assert graph.value(SYNTHETIC["Observation-3"], PROV.wasDerivedFrom) == SYNTHETIC["Observation-2"]
+    assert graph.value(SYNTHETIC["Observation-4"], PROV.wasDerivedFrom) is None
+
+
+def test_objects_have_classification_codes(graph_endpoint):
+    dataset = SyntheticDataset(30, hierarchy_depth=2, hierarchy_branching=3)
+    graph = Graph()
+    for triple in dataset.triples():
+        graph.add(triple)
+    assert classification_code("Object") == "00"
+    assert classification_code("Object.0.2") == "0103"
+
+    endpoint = graph_endpoint(graph)
+    endpoint.refresh_code_index()
+    obj = dataset.objects[0]
+    assert endpoint.lookup_code("object", classification_code(obj)) == [SYNTHETIC[obj]]
+    process = next(row[5] for row in dataset.rows() if row[5] is not None)
+    assert endpoint.lookup_code("process", process) == [SYNTHETIC[process]]
+
+
+def test_write_datasource(tmp_path):
+    directory = SyntheticDataset(10).write_datasource(tmp_path / "ds")
+    with open(directory / "data.csv") as f:
+        rows = list(csv.reader(f))
+    assert tuple(rows[0]) == CSV_COLUMNS
+    assert len(rows) == 11
+
+    datasource = load_datasource(directory)
+    assert "dsource register" in datasource.load_data_script
+    assert "map.dlog" in datasource.load_rules_script
+
+
+def test_generate_data_command(tmp_path):
+    output = tmp_path / "data.nt"
+    result = CliRunner().invoke(cli, ["generate-data", str(output), "-n", "10", "--seed", "3"])
+    assert result.exit_code == 0, result.output
+    expected = tmp_path / "expected.nt"
+    SyntheticDataset(10, seed=3).write_ntriples(expected)
+    assert output.read_text() == expected.read_text()
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+import socket
+
+from probs_runner.utils import find_free_port
+
+
+def test_find_free_port_can_be_bound():
+    port = find_free_port()
+    assert port > 0
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("localhost", port))